@@ -8,6 +8,16 @@ import pendulum
 # =============================================
 # Paramètres du DAG
 # =============================================
+# Les étapes 05, 08, 09, 11 et 12 passent par stage_cache.py : ignorées lorsque
+# leurs entrées sont identiques à une exécution réussie (STAGE_CACHE=0 pour désactiver).
+#
+# bottleneck.duckdb n'accepte qu'un processus en écriture : les tâches qui l'ouvrent en
+# écriture passent par le pool 'duckdb_writer' (1 place, créé par airflow-init). Les
+# branches CA et Z-score écrivent dans leur propre base (DUCKDB_BRANCH, voir
+# scripts/duckdb_branches.py) et s'exécutent en parallèle ; fusion_branches les
+# recopie ensuite dans la base.
+DUCKDB_WRITER_POOL = 'duckdb_writer'
+
 default_args = {
     'owner': 'airflow',
     'retries': 2,
@@ -52,17 +62,14 @@ with DAG(
     # 🧹 Nettoyage des données
     nettoyage_donnees = BashOperator(
         task_id='nettoyage_donnees',
-        bash_command='python /opt/airflow/scripts/05_clean_data.py',
-    )
-
-    test_nettoyage = BashOperator(
-        task_id='test_nettoyage',
-        bash_command='python /opt/airflow/tests/test_05_clean_data.py',
+        bash_command='python /opt/airflow/scripts/stage_cache.py 05_clean_data',
+        pool=DUCKDB_WRITER_POOL,
     )
 
-    test_nulls = BashOperator(
-        task_id='test_nulls_post_nettoyage',
-        bash_command='python /opt/airflow/tests/test_05_nulls_clean_data.py',
+    # ✅ Contrôles déclarés dans scripts/checks/<étape>.json : une requête par table
+    validation_nettoyage = BashOperator(
+        task_id='validation_nettoyage',
+        bash_command='python /opt/airflow/scripts/validation_engine.py clean',
     )
 
     # 📅 Upload des fichiers nettoyés
@@ -72,67 +79,74 @@ with DAG(
     )
 
     # 🗒️ Dédoublonnage
-    with TaskGroup('dedoublonnage_group', tooltip="Dédoublonnage + tests") as dedoublonnage_group:
+    with TaskGroup('dedoublonnage_group', tooltip="Dédoublonnage + validation") as dedoublonnage_group:
         dedoublonnage = BashOperator(
             task_id='dedoublonnage',
-            bash_command='python /opt/airflow/scripts/08_dedoublonnage.py',
+            bash_command='python /opt/airflow/scripts/stage_cache.py 08_dedoublonnage',
+            pool=DUCKDB_WRITER_POOL,
         )
-        test_dedoublonnage = BashOperator(
-            task_id='test_08_presence_tables',
-            bash_command='python /opt/airflow/tests/test_08_dedoublonnage.py',
+        validation_dedoublonnage = BashOperator(
+            task_id='validation_dedoublonnage',
+            bash_command='python /opt/airflow/scripts/validation_engine.py dedup',
         )
-        test_08_doublons = BashOperator(
-            task_id='test_08_aucun_doublon',
-            bash_command='python /opt/airflow/tests/test_08_doublons.py',
-        )
-        dedoublonnage >> [test_dedoublonnage, test_08_doublons]
+        dedoublonnage >> validation_dedoublonnage
 
     # 🔗 Fusion
-    with TaskGroup('fusion_group', tooltip="Fusion + tests") as fusion_group:
+    with TaskGroup('fusion_group', tooltip="Fusion + validation") as fusion_group:
         fusion = BashOperator(
             task_id='fusion',
-            bash_command='python /opt/airflow/scripts/09_fusion.py',
+            bash_command='python /opt/airflow/scripts/stage_cache.py 09_fusion',
+            pool=DUCKDB_WRITER_POOL,
         )
-        tests_fusion = BashOperator(
-            task_id='tests_fusion',
-            bash_command='python /opt/airflow/tests/test_09_fusion.py',
+        validation_fusion = BashOperator(
+            task_id='validation_fusion',
+            bash_command='python /opt/airflow/scripts/validation_engine.py fusion',
         )
-        fusion >> tests_fusion
+        fusion >> validation_fusion
 
     # 💾 Snapshot de la base
     snapshot_base = BashOperator(
         task_id='snapshot_base',
         bash_command='python /opt/airflow/scripts/10_create_snapshot.py',
+        pool=DUCKDB_WRITER_POOL,
     )
 
-    # ✨ Calcul CA & Z-score parallèle
+    # ✨ Calcul CA & Z-score parallèle (une base de sortie par branche)
     with TaskGroup('calculs_parallel', tooltip="CA et Z-score") as calculs_parallel:
         with TaskGroup('ca_group', tooltip="Chiffre d\'affaires") as ca_group:
             calcul_ca = BashOperator(
                 task_id='calcul_ca',
-                bash_command='python /opt/airflow/scripts/11_calcul_ca.py',
+                bash_command='DUCKDB_BRANCH=ca python /opt/airflow/scripts/stage_cache.py 11_calcul_ca',
             )
-            test_ca = BashOperator(
-                task_id='test_ca',
-                bash_command='python /opt/airflow/tests/test_11_validate_ca.py',
+            validation_ca = BashOperator(
+                task_id='validation_ca',
+                bash_command='DUCKDB_BRANCH=ca python /opt/airflow/scripts/validation_engine.py ca',
             )
-            calcul_ca >> test_ca
+            calcul_ca >> validation_ca
 
         with TaskGroup('zscore_group', tooltip="Z-score") as zscore_group:
             calcul_zscore = BashOperator(
                 task_id='calcul_zscore',
-                bash_command='python /opt/airflow/scripts/12_calcul_zscore_upload.py',
+                bash_command='DUCKDB_BRANCH=zscore python /opt/airflow/scripts/stage_cache.py 12_calcul_zscore_upload',
             )
-            test_zscore = BashOperator(
-                task_id='test_zscore',
-                bash_command='python /opt/airflow/tests/test_12_validate_zscore.py',
+            validation_zscore = BashOperator(
+                task_id='validation_zscore',
+                bash_command='DUCKDB_BRANCH=zscore python /opt/airflow/scripts/validation_engine.py zscore',
             )
-            calcul_zscore >> test_zscore
+            calcul_zscore >> validation_zscore
+
+    # 🔀 Fusion des bases de branche dans bottleneck.duckdb
+    fusion_branches = BashOperator(
+        task_id='fusion_branches',
+        bash_command='python /opt/airflow/scripts/duckdb_branches.py ca zscore',
+        pool=DUCKDB_WRITER_POOL,
+    )
 
     # 📈 Rapport final
     rapport_final = BashOperator(
         task_id='rapport_final',
         bash_command='python /opt/airflow/scripts/13_generate_final_report.py',
+        pool=DUCKDB_WRITER_POOL,
     )
 
     # ☁️ Upload des logs
@@ -151,12 +165,13 @@ with DAG(
         >> upload_csv_bruts
         >> verification_upload
         >> nettoyage_donnees
-        >> [test_nettoyage, test_nulls]
+        >> validation_nettoyage
         >> upload_clean
         >> dedoublonnage_group
         >> fusion_group
         >> snapshot_base
         >> calculs_parallel
+        >> fusion_branches
         >> rapport_final
         >> upload_logs_final
     )
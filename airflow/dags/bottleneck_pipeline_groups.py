@@ -0,0 +1,68 @@
+from airflow import DAG
+from airflow.operators.bash import BashOperator
+from airflow.utils.trigger_rule import TriggerRule
+from datetime import timedelta
+import pendulum
+
+# =============================================
+# Variante du pipeline : une tâche par groupe d'étapes
+# =============================================
+# Chaque tâche lance scripts/pipeline_runner.py, qui exécute les étapes du groupe
+# et leur validation dans un seul processus avec une connexion DuckDB partagée.
+# Déclenchement manuel : la planification mensuelle reste portée par bottleneck_pipeline.
+# Comme dans bottleneck_pipeline, les groupes qui écrivent dans bottleneck.duckdb passent
+# par le pool 'duckdb_writer' ; CA et Z-score écrivent dans leur base de branche.
+DUCKDB_WRITER_POOL = 'duckdb_writer'
+
+default_args = {
+    'owner': 'airflow',
+    'retries': 2,
+    'retry_delay': timedelta(minutes=2),
+    'depends_on_past': False,
+}
+
+
+def runner_task(group, branch=None, **kwargs):
+    prefix = f'DUCKDB_BRANCH={branch} ' if branch else ''
+    return BashOperator(
+        task_id=group,
+        bash_command=f'{prefix}python /opt/airflow/scripts/pipeline_runner.py {group}',
+        **kwargs,
+    )
+
+
+with DAG(
+    dag_id='bottleneck_pipeline_groupes',
+    default_args=default_args,
+    description='Pipeline démonstrateur BottleNeck - une tâche par groupe d\'étapes',
+    schedule=None,
+    start_date=pendulum.today('UTC').add(days=-1),
+    catchup=False,
+    tags=['bottleneck', 'pipeline', 'airflow', 'runner'],
+) as dag:
+
+    ingestion = runner_task('ingestion')                                   # 📦 00 ➝ 03
+    nettoyage = runner_task('nettoyage', pool=DUCKDB_WRITER_POOL)          # 🧹 05 + validation ➝ 06
+    dedoublonnage = runner_task('dedoublonnage', pool=DUCKDB_WRITER_POOL)  # 🗒️ 08 + validation
+    fusion = runner_task('fusion', pool=DUCKDB_WRITER_POOL)                # 🔗 09 + validation
+    snapshot = runner_task('snapshot', pool=DUCKDB_WRITER_POOL)            # 💾 10
+    ca = runner_task('ca', branch='ca')                                    # ✨ 11 + validation
+    zscore = runner_task('zscore', branch='zscore')                        # ✨ 12 + validation
+    branches = runner_task('branches', pool=DUCKDB_WRITER_POOL)            # 🔀 fusion des branches
+    rapport = runner_task('rapport', pool=DUCKDB_WRITER_POOL)              # 📈 13
+    logs = runner_task('logs', trigger_rule=TriggerRule.ALL_DONE)          # ☁️ 14
+
+    # =============================================
+    # Orchestration des dépendances
+    # =============================================
+    (
+        ingestion
+        >> nettoyage
+        >> dedoublonnage
+        >> fusion
+        >> snapshot
+        >> [ca, zscore]
+        >> branches
+        >> rapport
+        >> logs
+    )
@@ -6,12 +6,16 @@
 import os
 import sys
 import re
+import json
+import time
+import hashlib
 import unicodedata
 import requests
 from zipfile import ZipFile
 from io import BytesIO
 from pathlib import Path
 from loguru import logger
+from fetch_cache import FetchCache, sha256_file, write_inputs_status, inputs_unchanged, write_json_atomic
 
 # ==============================================================================
 # 🔧 Configuration des chemins de logs
@@ -44,6 +48,21 @@ EXPECTED_FILES = [
     "fichier_liaison.xlsx",
 ]
 
+# ==============================================================================
+# ⚙️ Mode de téléchargement
+# ==============================================================================
+# "stream" : téléchargement par blocs vers un fichier temporaire (reprise HTTP Range)
+#            puis extraction membre par membre, mémoire constante.
+# "memory" : ancien comportement, archive entièrement chargée en mémoire.
+DOWNLOAD_MODE = os.getenv("DOWNLOAD_MODE", "stream")
+CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES", "5"))
+REQUEST_TIMEOUT = int(os.getenv("DOWNLOAD_TIMEOUT", "60"))
+DOWNLOAD_DIR = Path(os.getenv("DOWNLOAD_TMP_PATH", "/opt/airflow/data/tmp"))
+
+# Cache conditionnel (ETag / Last-Modified / SHA-256), désactivable avec FETCH_CACHE=0
+FETCH_CACHE_ENABLED = os.getenv("FETCH_CACHE", "1") == "1"
+
 # ==============================================================================
 # 🔤 Normalisation ASCII sécurisée des noms de fichiers
 # ==============================================================================
@@ -66,6 +85,136 @@ def download_zip(url: str) -> bytes:
         logger.error(f"❌ Erreur pendant le téléchargement : {e}")
         raise
 
+# ==============================================================================
+# 📏 Formatage du débit
+# ==============================================================================
+def format_throughput(nb_bytes: int, elapsed: float) -> str:
+    rate = nb_bytes / elapsed if elapsed > 0 else float(nb_bytes)
+    return f"{nb_bytes / 1024 / 1024:.2f} Mo en {elapsed:.2f}s ({rate / 1024 / 1024:.2f} Mo/s)"
+
+# ==============================================================================
+# 🔖 Validateur du fichier partiel (même version de l'archive à la reprise)
+# ==============================================================================
+def range_validator(headers) -> str:
+    """Valeur If-Range de la réponse : ETag fort, sinon Last-Modified (un ETag faible est refusé)."""
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def load_part_validator(validator_path: Path) -> str:
+    try:
+        return json.loads(validator_path.read_text(encoding="utf-8")).get("if_range")
+    except (OSError, ValueError):
+        return None
+
+
+def discard_part(part_path: Path, validator_path: Path):
+    part_path.unlink(missing_ok=True)
+    validator_path.unlink(missing_ok=True)
+
+# ==============================================================================
+# 📥 Téléchargement en streaming avec reprise (HTTP Range)
+# ==============================================================================
+def download_zip_stream(url: str, dest: Path, chunk_size: int = CHUNK_SIZE,
+                        max_retries: int = MAX_RETRIES, conditional_headers: dict = None):
+    """Télécharge l'archive par blocs dans un fichier '.part' puis le renomme en 'dest'.
+
+    Le validateur (ETag ou Last-Modified) de la réponse qui a commencé le '.part' est
+    enregistré à côté ('.part.json'). Après une coupure réseau, même lors d'un run
+    ultérieur, le téléchargement reprend à l'octet déjà écrit avec Range et If-Range :
+    si l'archive a changé, le serveur renvoie la nouvelle version complète (200).
+    Un '.part' sans validateur, une réponse 416 ou un Content-Range qui ne commence
+    pas à l'octet demandé font repartir de zéro.
+    Avec des en-têtes conditionnels, une réponse 304 renvoie (None, validateurs).
+    Retourne le chemin de l'archive et ses validateurs HTTP (ETag, Last-Modified).
+    """
+    logger.info(f"📦 Téléchargement en streaming de l'archive : {url}")
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    part_path = dest.with_name(dest.name + ".part")
+    validator_path = dest.with_name(dest.name + ".part.json")
+    conditional_headers = conditional_headers or {}
+
+    start = time.monotonic()
+    downloaded = 0
+    attempt = 0
+    validators = {"etag": None, "last_modified": None}
+
+    while True:
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        if_range = load_part_validator(validator_path) if offset else None
+        if offset and not if_range:
+            logger.warning("⚠️ Fichier partiel sans validateur : version inconnue, téléchargement complet.")
+            discard_part(part_path, validator_path)
+            offset = 0
+
+        if offset:
+            # If-Range : le serveur renvoie l'archive complète si elle a changé depuis le début du '.part'
+            headers = {"Range": f"bytes={offset}-", "If-Range": if_range}
+        else:
+            headers = dict(conditional_headers)
+
+        try:
+            with requests.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                validators["etag"] = response.headers.get("ETag", validators["etag"])
+                validators["last_modified"] = response.headers.get("Last-Modified", validators["last_modified"])
+
+                if response.status_code == 304:
+                    logger.info("ℹ️ Archive inchangée côté serveur (304 Not Modified).")
+                    return None, validators
+                if response.status_code == 416:
+                    logger.warning("⚠️ Plage refusée par le serveur (416), téléchargement complet.")
+                    discard_part(part_path, validator_path)
+                    continue
+                response.raise_for_status()
+
+                if offset and response.status_code == 206:
+                    content_range = response.headers.get("Content-Range", "")
+                    if not content_range.startswith(f"bytes {offset}-"):
+                        logger.warning(f"⚠️ Content-Range inattendu ({content_range or 'absent'}), téléchargement complet.")
+                        discard_part(part_path, validator_path)
+                        continue
+                    logger.info(f"↩️ Reprise du téléchargement à l'octet {offset}.")
+                    mode = "ab"
+                else:
+                    if offset:
+                        logger.warning("⚠️ Archive modifiée ou reprise non supportée par le serveur, téléchargement complet.")
+                    mode = "wb"
+                    # Nouveau '.part' : on mémorise la version qu'il contient
+                    validator = range_validator(response.headers)
+                    if validator:
+                        write_json_atomic(validator_path, {"if_range": validator})
+                    else:
+                        validator_path.unlink(missing_ok=True)
+
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            downloaded += len(chunk)
+            break
+
+        except (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            attempt += 1
+            if attempt > max_retries:
+                logger.error(f"❌ Téléchargement interrompu après {max_retries} tentatives : {e}")
+                raise
+            wait = min(2 ** attempt, 30)
+            logger.warning(f"⚠️ Connexion interrompue ({e}), nouvelle tentative {attempt}/{max_retries} dans {wait}s...")
+            time.sleep(wait)
+
+        except Exception as e:
+            logger.error(f"❌ Erreur pendant le téléchargement : {e}")
+            raise
+
+    part_path.replace(dest)
+    validator_path.unlink(missing_ok=True)
+    elapsed = time.monotonic() - start
+    logger.success(f"✅ Archive ZIP téléchargée : {format_throughput(downloaded, elapsed)}")
+    return dest, validators
+
 # ==============================================================================
 # 📂 Extraction et renommage sécurisé des fichiers
 # ==============================================================================
@@ -96,6 +245,96 @@ def extract_and_normalize(zip_content: bytes, output_dir: Path) -> list:
         logger.error(f"❌ Erreur pendant l'extraction : {e}")
         raise
 
+# ==============================================================================
+# 📂 Extraction en streaming (membre par membre, copie par blocs)
+# ==============================================================================
+def extract_and_normalize_stream(zip_path: Path, output_dir: Path,
+                                 chunk_size: int = CHUNK_SIZE) -> dict:
+    """Extrait chaque membre par blocs et retourne {nom_normalisé: sha256}.
+
+    Un fichier dont le contenu est identique à la version déjà présente n'est pas
+    réécrit (sa date de modification est conservée).
+    """
+    logger.info("📂 Début de l'extraction en streaming et du renommage des fichiers...")
+    extracted_files = {}
+    start = time.monotonic()
+    total_bytes = 0
+
+    try:
+        with ZipFile(zip_path) as zip_ref:
+            for member in zip_ref.infolist():
+                original_name = Path(member.filename).name
+                if not original_name:
+                    continue  # Ignore les dossiers
+
+                safe_name = normalize_filename(original_name)
+                target_path = output_dir / safe_name
+                tmp_path = target_path.with_name(target_path.name + ".tmp")
+
+                # Écriture dans un fichier temporaire (avec calcul du SHA-256 au fil de l'eau)
+                digest = hashlib.sha256()
+                with zip_ref.open(member) as src, open(tmp_path, "wb") as dst:
+                    for chunk in iter(lambda: src.read(chunk_size), b""):
+                        digest.update(chunk)
+                        dst.write(chunk)
+                member_sha = digest.hexdigest()
+
+                if target_path.exists() and sha256_file(target_path) == member_sha:
+                    tmp_path.unlink()
+                    logger.info(f"♻️ Fichier inchangé : {safe_name}")
+                else:
+                    tmp_path.replace(target_path)
+                    logger.info(f"✅ Fichier extrait : {safe_name} ({member.file_size} octets)")
+
+                total_bytes += member.file_size
+                extracted_files[safe_name] = member_sha
+
+        elapsed = time.monotonic() - start
+        logger.success(f"📁 Extraction terminée dans : {output_dir.resolve()} — {format_throughput(total_bytes, elapsed)}")
+        return extracted_files
+
+    except Exception as e:
+        logger.error(f"❌ Erreur pendant l'extraction : {e}")
+        raise
+
+# ==============================================================================
+# 🗃️ Téléchargement conditionnel avec cache local
+# ==============================================================================
+def fetch_inputs(url: str, output_dir: Path, cache: FetchCache, download_dir: Path = DOWNLOAD_DIR):
+    """Télécharge et extrait l'archive seulement si elle a changé.
+
+    Retourne (fichiers, changed, raison). Les en-têtes conditionnels ne sont
+    envoyés que si les fichiers extraits au dernier run sont toujours intacts.
+    La reprise d'un '.part' ne dépend pas de ce cache : son If-Range est le
+    validateur enregistré avec le '.part' lui-même (voir download_zip_stream).
+    """
+    entry = cache.get(url)
+    intact = cache.members_intact(url, output_dir)
+    headers = cache.conditional_headers(url) if intact else {}
+
+    zip_path, validators = download_zip_stream(url, download_dir / "bottleneck.zip",
+                                               conditional_headers=headers)
+    if zip_path is None:
+        return list(entry["members"]), False, "304 Not Modified"
+
+    try:
+        archive_sha = sha256_file(zip_path)
+        if intact and archive_sha == entry.get("archive_sha256"):
+            logger.info("♻️ Empreinte SHA-256 de l'archive identique au dernier run, extraction ignorée.")
+            members = entry["members"]
+            changed, reason = False, "archive sha256 identique"
+        else:
+            members = extract_and_normalize_stream(zip_path, output_dir)
+            changed = members != entry.get("members")
+            reason = "contenu modifié" if changed else "fichiers extraits identiques"
+    finally:
+        zip_path.unlink(missing_ok=True)
+
+    cache.update(url, etag=validators["etag"], last_modified=validators["last_modified"],
+                 archive_sha256=archive_sha, members=members)
+    cache.save()
+    return list(members), changed, reason
+
 # ==============================================================================
 # ✅ Validation des fichiers extraits
 # ==============================================================================
@@ -115,9 +354,26 @@ def validate_files(expected: list, actual: list, base_dir: Path):
 # 🚀 Point d’entrée principal
 # ==============================================================================
 def main():
-    zip_bytes = download_zip(ZIP_URL)
-    extracted = extract_and_normalize(zip_bytes, INPUTS_PATH)
+    changed, reason = True, "téléchargement complet"
+    if DOWNLOAD_MODE == "memory":
+        zip_bytes = download_zip(ZIP_URL)
+        extracted = extract_and_normalize(zip_bytes, INPUTS_PATH)
+    elif FETCH_CACHE_ENABLED:
+        extracted, changed, reason = fetch_inputs(ZIP_URL, INPUTS_PATH, FetchCache())
+    else:
+        zip_path, _ = download_zip_stream(ZIP_URL, DOWNLOAD_DIR / "bottleneck.zip")
+        try:
+            extracted = list(extract_and_normalize_stream(zip_path, INPUTS_PATH))
+        finally:
+            zip_path.unlink(missing_ok=True)
     validate_files(EXPECTED_FILES, extracted, INPUTS_PATH)
+
+    # 📣 Statut transmis aux tâches suivantes (fichier partagé + XCom via stdout)
+    write_inputs_status(changed, reason, extracted)
+    if changed:
+        logger.info(f"🔄 Entrées modifiées ({reason}).")
+    else:
+        logger.success(f"♻️ Entrées inchangées ({reason}), extraction ignorée.")
     logger.success("🎉 Téléchargement, extraction et validation terminés avec succès.")
     return 0
 
@@ -128,6 +384,8 @@ if __name__ == "__main__":
     try:
         main()
         print("✔️ Script terminé avec succès.")
+        # Dernière ligne de stdout = valeur XCom de la tâche BashOperator
+        print("INPUTS_UNCHANGED" if inputs_unchanged() else "INPUTS_CHANGED")
         sys.exit(0)
     except Exception as e:
         logger.error(f"💥 Erreur inattendue : {e}")
@@ -1,14 +1,24 @@
 # === Script 01 - Conversion Excel ➔ CSV (robuste et compatible Airflow) ===
 # Ce script convertit les fichiers Excel présents dans 'data/inputs/'
 # en fichiers CSV avec un nettoyage minimal (lignes/colonnes vides).
+# En mode DATA_FORMAT=parquet, il écrit directement des fichiers Parquet typés
+# (schéma déclaré par source, compression zstd) au lieu des CSV.
 # Il est conçu pour s'intégrer dans un pipeline Airflow.
 
 import os
 import sys
+import csv
+import json
+import time
 import warnings
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain
 from pathlib import Path
 import pandas as pd
 from loguru import logger
+from fetch_cache import sha256_file, write_json_atomic
+from data_formats import FILE_EXTENSION, PARQUET_COMPRESSION, SOURCE_SCHEMAS
 
 warnings.filterwarnings("ignore")
 
@@ -42,6 +52,22 @@ FILES_MAPPING = {
     "fichier_liaison.xlsx": "liaison.csv",
 }
 
+# Registre de la dernière conversion réussie : empreintes SHA-256 des classeurs convertis
+# et réglages de sortie, écrit à côté des fichiers produits
+CONVERSION_RECORD = ".conversion_01.json"
+
+# ==============================================================================
+# ⚙️ Mode de conversion et moteur de lecture
+# ==============================================================================
+# CONVERSION_MODE : "parallel" (un processus par classeur) ou "sequential"
+# EXCEL_ENGINE    : "openpyxl" (pd.read_excel, par défaut), "calamine", "openpyxl_readonly"
+#                   ou "auto" (calamine si installé, sinon openpyxl en lecture seule).
+#                   Hors "openpyxl", les valeurs gardent leur type Excel : un entier d'une
+#                   colonne incomplète s'écrit "1" et non "1.0" comme avec pd.read_excel.
+#                   En CSV, "openpyxl_readonly" écrit les lignes au fil de la lecture.
+CONVERSION_MODE = os.getenv("CONVERSION_MODE", "parallel")
+EXCEL_ENGINE = os.getenv("EXCEL_ENGINE", "openpyxl")
+
 # ==============================================================================
 # 🧹 Nettoyage minimal des DataFrames
 # ==============================================================================
@@ -50,41 +76,292 @@ def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     df = df.dropna(how="all", axis=1)  # Supprime les colonnes vides
     return df
 
+# ==============================================================================
+# 📖 Moteurs de lecture Excel
+# ==============================================================================
+def header_names(row) -> list:
+    return [str(col) if col not in (None, "") else f"Unnamed: {i}" for i, col in enumerate(row)]
+
+
+def rows_to_dataframe(rows: list) -> pd.DataFrame:
+    """Construit un DataFrame à partir de lignes brutes (la première = en-têtes)."""
+    if not rows:
+        return pd.DataFrame()
+    header = header_names(rows[0])
+    # dtype=object : les valeurs gardent leur type Python (1 reste "1" et non "1.0" en CSV)
+    df = pd.DataFrame(rows[1:], columns=header, dtype=object)
+    # Les cellules vides deviennent des valeurs manquantes, comme avec pd.read_excel
+    return df.replace({"": None})
+
+
+def read_with_openpyxl(path: Path) -> pd.DataFrame:
+    return pd.read_excel(path)
+
+
+def iter_openpyxl_readonly(path: Path):
+    """Lignes brutes de la première feuille, lues en flux sans charger tout le classeur."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_with_openpyxl_readonly(path: Path) -> pd.DataFrame:
+    return rows_to_dataframe(list(iter_openpyxl_readonly(path)))
+
+
+def read_with_calamine(path: Path) -> pd.DataFrame:
+    from python_calamine import CalamineWorkbook
+
+    workbook = CalamineWorkbook.from_path(str(path))
+    rows = workbook.get_sheet_by_index(0).to_python(skip_empty_area=False)
+    return rows_to_dataframe(rows)
+
+
+EXCEL_READERS = {
+    "openpyxl": read_with_openpyxl,
+    "openpyxl_readonly": read_with_openpyxl_readonly,
+    "calamine": read_with_calamine,
+}
+
+# Moteurs dont les lignes peuvent être écrites en CSV au fil de la lecture
+EXCEL_ROW_STREAMS = {
+    "openpyxl_readonly": iter_openpyxl_readonly,
+}
+
+
+def resolve_engine(engine: str) -> str:
+    if engine != "auto":
+        if engine not in EXCEL_READERS:
+            raise ValueError(f"Moteur Excel inconnu : {engine} (choix : auto, {', '.join(EXCEL_READERS)})")
+        return engine
+    if importlib.util.find_spec("python_calamine") is not None:
+        return "calamine"
+    return "openpyxl_readonly"
+
+# ==============================================================================
+# 🌊 Écriture CSV en flux (sans DataFrame)
+# ==============================================================================
+def _write_csv(path: Path, rows):
+    # Même rendu que df.to_csv sur un DataFrame de valeurs brutes (dtype=object)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f, lineterminator=os.linesep).writerows(rows)
+
+
+def stream_rows_to_csv(rows, output_path: Path) -> int:
+    """Écrit en CSV des lignes brutes (la première = en-têtes) et retourne le nombre de lignes.
+
+    Même nettoyage que clean_dataframe : les lignes vides sont écartées au passage ; les
+    colonnes restées vides ne sont connues qu'à la fin et, s'il y en a, retirées par une
+    relecture en flux du fichier écrit.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    header = header_names(first) if first is not None else []
+    width = len(header)
+    filled = [False] * width
+    nb_rows = 0
+
+    def data_rows():
+        nonlocal nb_rows
+        for row in rows:
+            values = [None if v == "" else v for v in row[:width]]
+            values += [None] * (width - len(values))
+            if all(v is None for v in values):
+                continue
+            for i, v in enumerate(values):
+                filled[i] = filled[i] or v is not None
+            nb_rows += 1
+            yield values
+
+    tmp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+    _write_csv(tmp_path, chain([header], data_rows()))
+    if all(filled):
+        os.replace(tmp_path, output_path)
+        return nb_rows
+
+    # 🧹 Colonnes vides : réécriture sans elles
+    kept = [i for i, is_filled in enumerate(filled) if is_filled]
+    with open(tmp_path, newline="", encoding="utf-8") as f:
+        _write_csv(output_path, ([row[i] for i in kept] for row in csv.reader(f)))
+    tmp_path.unlink()
+    return nb_rows
+
+# ==============================================================================
+# 🧱 Écriture Parquet typée selon le schéma déclaré de la source
+# ==============================================================================
+def write_parquet(df: pd.DataFrame, path: Path, schema: dict):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {
+        "BIGINT": pa.int64(),
+        "DOUBLE": pa.float64(),
+        "VARCHAR": pa.string(),
+        "TIMESTAMP": pa.timestamp("us"),
+    }
+
+    df = df.copy()
+    for col in df.columns:
+        # Texte déclaré, ou colonne non déclarée aux types mixtes : conversion en chaîne
+        if schema.get(col) == "VARCHAR" or (col not in schema and df[col].dtype == object):
+            df[col] = df[col].map(lambda v: None if pd.isna(v) else str(v))
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for col, col_type in schema.items():
+        if col not in table.column_names:
+            raise ValueError(f"Colonne déclarée absente du fichier source : {col}")
+        idx = table.column_names.index(col)
+        table = table.set_column(idx, col, table.column(idx).cast(arrow_types[col_type]))
+
+    pq.write_table(table, path, compression=PARQUET_COMPRESSION)
+
+# ==============================================================================
+# 🔄 Conversion d'un classeur (exécutable dans un processus séparé)
+# ==============================================================================
+def convert_workbook(excel_file: str, csv_file: str, engine: str, output_format: str = "csv") -> dict:
+    excel_path = INPUTS_PATH / excel_file
+    source = Path(csv_file).stem
+    output_file = f"{source}.{output_format}"
+    output_path = OUTPUTS_PATH / output_file
+
+    t0 = time.perf_counter()
+    if output_format == "csv" and engine in EXCEL_ROW_STREAMS:
+        # Lecture et écriture en flux : la durée de lecture est comprise dans l'écriture
+        t1 = t0
+        nb_rows = stream_rows_to_csv(EXCEL_ROW_STREAMS[engine](excel_path), output_path)
+    else:
+        df = EXCEL_READERS[engine](excel_path)
+        t1 = time.perf_counter()
+        df = clean_dataframe(df)
+        if output_format == "parquet":
+            write_parquet(df, output_path, SOURCE_SCHEMAS[source])
+        else:
+            df.to_csv(output_path, index=False)
+        nb_rows = len(df)
+    t2 = time.perf_counter()
+
+    # Contrôles post-export
+    if not output_path.exists():
+        raise FileNotFoundError(f"❌ Fichier {output_format.upper()} non généré : {output_path}")
+    if nb_rows == 0:
+        raise ValueError(f"❌ Fichier {output_format.upper()} vide généré : {output_file}")
+
+    return {
+        "excel_file": excel_file,
+        "output_file": output_file,
+        "engine": engine,
+        "rows": nb_rows,
+        "size_mb": excel_path.stat().st_size / 1024 / 1024,
+        "read_s": t1 - t0,
+        "write_s": t2 - t1,
+        "total_s": t2 - t0,
+    }
+
+# ==============================================================================
+# ♻️ Registre des conversions : ne reconvertir que des classeurs modifiés
+# ==============================================================================
+def conversion_signature(engine: str) -> dict:
+    """Empreintes des classeurs à convertir et réglages qui changent les fichiers produits."""
+    return {
+        "engine": engine,
+        "format": FILE_EXTENSION,
+        "members": {excel_file: sha256_file(INPUTS_PATH / excel_file) for excel_file in FILES_MAPPING},
+    }
+
+
+def outputs_up_to_date(signature: dict, outputs: list) -> bool:
+    """Vrai si les sorties existent et proviennent d'une conversion réussie des mêmes classeurs.
+
+    Le statut écrit par le script 00 ne suffit pas : après un échec de 01, une relance de 00
+    obtient un 304 et déclare les entrées inchangées alors qu'elles n'ont jamais été converties.
+    """
+    record_path = OUTPUTS_PATH / CONVERSION_RECORD
+    if not record_path.exists() or not all((OUTPUTS_PATH / f).exists() for f in outputs):
+        return False
+    try:
+        return json.loads(record_path.read_text(encoding="utf-8")) == signature
+    except (OSError, ValueError):
+        return False
+
+# ==============================================================================
+# ⏱️ Rapport de durée par fichier
+# ==============================================================================
+def log_timing_report(timings: list, wall_time: float):
+    logger.info("⏱️ Durées de conversion par fichier (du plus lent au plus rapide) :")
+    for t in sorted(timings, key=lambda t: t["total_s"], reverse=True):
+        logger.info(
+            f"   - {t['excel_file']:<22} {t['engine']:<18} {t['rows']:>8} lignes "
+            f"{t['size_mb']:>7.2f} Mo | lecture {t['read_s']:.2f}s | écriture {t['write_s']:.2f}s "
+            f"| total {t['total_s']:.2f}s"
+        )
+    cumulated = sum(t["total_s"] for t in timings)
+    logger.info(f"⏱️ Temps cumulé : {cumulated:.2f}s — temps réel : {wall_time:.2f}s ({CONVERSION_MODE})")
+
 # ==============================================================================
 # 🚀 Fonction principale
 # ==============================================================================
 def main():
     logger.info("🔄 Démarrage de la conversion des fichiers Excel vers CSV...")
 
-    for excel_file, csv_file in FILES_MAPPING.items():
+    # Vérification de l'existence des fichiers Excel
+    for excel_file in FILES_MAPPING:
         excel_path = INPUTS_PATH / excel_file
-        csv_path = OUTPUTS_PATH / csv_file
-
-        # Vérification de l'existence du fichier Excel
         if not excel_path.exists():
             logger.error(f"❌ Fichier manquant : {excel_path}")
             sys.exit(1)
 
-        try:
-            # Lecture et nettoyage
-            df = pd.read_excel(excel_path)
-            df = clean_dataframe(df)
-
-            # Export CSV
-            df.to_csv(csv_path, index=False)
+    try:
+        engine = resolve_engine(EXCEL_ENGINE)
+    except ValueError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
 
-            # Contrôles post-export
-            if not csv_path.exists():
-                raise FileNotFoundError(f"❌ Fichier CSV non généré : {csv_path}")
-            if df.empty:
-                raise ValueError(f"❌ Fichier CSV vide généré : {csv_file}")
+    # ♻️ Classeurs identiques à ceux de la dernière conversion réussie : sorties conservées
+    outputs = [f"{Path(f).stem}.{FILE_EXTENSION}" for f in FILES_MAPPING.values()]
+    signature = conversion_signature(engine)
+    if outputs_up_to_date(signature, outputs):
+        logger.success(f"♻️ Fichiers Excel déjà convertis, conversion ignorée ({FILE_EXTENSION.upper()} existants conservés).")
+        return
+    # Registre retiré pendant la conversion : un échec en cours de route force la suivante
+    (OUTPUTS_PATH / CONVERSION_RECORD).unlink(missing_ok=True)
+    logger.info(f"📖 Moteur de lecture Excel : {engine} — format de sortie : {FILE_EXTENSION}")
 
-            logger.success(f"✅ Conversion réussie : {excel_file} ➔ {csv_file} ({len(df)} lignes)")
+    timings = []
+    start = time.perf_counter()
 
-        except Exception as e:
-            logger.error(f"❌ Erreur lors de la conversion de {excel_file} : {e}")
-            sys.exit(1)
+    if CONVERSION_MODE == "parallel":
+        # Un processus par classeur : chaque lecture Excel occupe son propre cœur
+        max_workers = min(len(FILES_MAPPING), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(convert_workbook, excel_file, csv_file, engine, FILE_EXTENSION): excel_file
+                for excel_file, csv_file in FILES_MAPPING.items()
+            }
+            for future in as_completed(futures):
+                excel_file = futures[future]
+                try:
+                    timing = future.result()
+                except Exception as e:
+                    logger.error(f"❌ Erreur lors de la conversion de {excel_file} : {e}")
+                    sys.exit(1)
+                timings.append(timing)
+                logger.success(f"✅ Conversion réussie : {excel_file} ➔ {timing['output_file']} ({timing['rows']} lignes)")
+    else:
+        for excel_file, csv_file in FILES_MAPPING.items():
+            try:
+                timing = convert_workbook(excel_file, csv_file, engine, FILE_EXTENSION)
+            except Exception as e:
+                logger.error(f"❌ Erreur lors de la conversion de {excel_file} : {e}")
+                sys.exit(1)
+            timings.append(timing)
+            logger.success(f"✅ Conversion réussie : {excel_file} ➔ {timing['output_file']} ({timing['rows']} lignes)")
 
+    log_timing_report(timings, time.perf_counter() - start)
+    write_json_atomic(OUTPUTS_PATH / CONVERSION_RECORD, signature)
     logger.success("🎯 Tous les fichiers Excel ont été convertis avec succès.")
 
 # ==============================================================================
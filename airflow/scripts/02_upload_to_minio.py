@@ -7,8 +7,8 @@ import sys
 import warnings
 from pathlib import Path
 from loguru import logger
-import boto3
-from botocore.exceptions import ClientError
+from data_formats import data_file
+from minio_storage import BUCKET_NAME, MANIFEST_NAME, ensure_bucket, upload_many
 
 warnings.filterwarnings("ignore")
 
@@ -29,15 +29,11 @@ CSV_PATH = Path("/opt/airflow/data/inputs")
 CSV_PATH.mkdir(parents=True, exist_ok=True)
 
 # ==============================================================================
-# ☁️ Configuration MinIO
+# ☁️ Configuration MinIO (connexion : voir minio_storage.py)
 # ==============================================================================
-MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
 DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/inputs/")
 
-FILES_TO_UPLOAD = ["erp.csv", "web.csv", "liaison.csv"]
+FILES_TO_UPLOAD = [data_file("erp"), data_file("web"), data_file("liaison")]
 
 # ==============================================================================
 # 📤 Fonction d’upload vers MinIO
@@ -45,52 +41,29 @@ FILES_TO_UPLOAD = ["erp.csv", "web.csv", "liaison.csv"]
 def upload_to_minio():
     logger.info("🚀 Démarrage de l'upload des fichiers CSV vers MinIO...")
 
-    # Connexion MinIO
-    try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1",
-        )
-        logger.success("✅ Connexion à MinIO réussie.")
-    except Exception as e:
-        logger.error(f"❌ Connexion à MinIO échouée : {e}")
-        sys.exit(1)
-
     # Vérification ou création du bucket
     try:
-        s3_client.head_bucket(Bucket=BUCKET_NAME)
+        ensure_bucket(BUCKET_NAME, create=True)
         logger.success(f"✅ Bucket '{BUCKET_NAME}' disponible.")
-    except ClientError as e:
-        error_code = e.response["Error"]["Code"]
-        if error_code == "404":
-            try:
-                s3_client.create_bucket(Bucket=BUCKET_NAME)
-                logger.warning(f"📁 Bucket '{BUCKET_NAME}' créé automatiquement.")
-            except Exception as e2:
-                logger.error(f"❌ Erreur lors de la création du bucket : {e2}")
-                sys.exit(1)
-        else:
-            logger.error(f"❌ Accès refusé au bucket : {e}")
-            sys.exit(1)
+    except Exception as e:
+        logger.error(f"❌ Accès refusé au bucket : {e}")
+        sys.exit(1)
 
-    # Upload des fichiers
+    # Upload des fichiers (en parallèle)
+    files = []
     for filename in FILES_TO_UPLOAD:
         local_file = CSV_PATH / filename
-        s3_key = f"{DESTINATION_PREFIX}{filename}"
-
         if not local_file.exists():
             logger.error(f"❌ Fichier introuvable localement : {filename}")
             sys.exit(1)
+        files.append((local_file, f"{DESTINATION_PREFIX}{filename}"))
 
-        try:
-            s3_client.upload_file(str(local_file), BUCKET_NAME, s3_key)
-            logger.success(f"📤 Fichier uploadé : {filename} ➔ {s3_key}")
-        except Exception as e:
-            logger.error(f"❌ Échec de l'upload de {filename} : {e}")
-            sys.exit(1)
+    try:
+        # Manifeste (clés, tailles, empreintes) vérifié par l'étape 03
+        upload_many(files, manifest_key=f"{DESTINATION_PREFIX}{MANIFEST_NAME}")
+    except Exception as e:
+        logger.error(f"❌ Échec de l'upload : {e}")
+        sys.exit(1)
 
     logger.success("🎯 Tous les fichiers CSV ont été uploadés avec succès dans MinIO.")
 
@@ -1,14 +1,19 @@
 # === Script 03 - Vérification de la présence des fichiers dans MinIO ===
 # Ce script vérifie que les fichiers CSV attendus (erp, web, liaison)
 # sont bien présents dans le bucket MinIO après l’upload initial.
+# Le listing est paginé, et les tailles / ETags sont comparés au manifeste
+# écrit par l'étape 02 : un upload tronqué est détecté sans rien télécharger.
 
 import os
 import sys
 import warnings
 from pathlib import Path
 from loguru import logger
-import boto3
+from data_formats import data_file
 from botocore.exceptions import ClientError
+from minio_storage import (
+    BUCKET_NAME, MANIFEST_NAME, get_s3_client, list_remote_objects, read_manifest, verify_manifest,
+)
 
 warnings.filterwarnings("ignore")
 
@@ -25,18 +30,16 @@ logger.add(sys.stdout, level="INFO")
 logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 
 # ==============================================================================
-# ☁️ Configuration MinIO
+# ☁️ Configuration MinIO (connexion : voir minio_storage.py)
 # ==============================================================================
-MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
 DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/inputs/")
 
+MAX_LISTED_FILES = 20
+
 EXPECTED_FILES = {
-    f"{DESTINATION_PREFIX}erp.csv",
-    f"{DESTINATION_PREFIX}web.csv",
-    f"{DESTINATION_PREFIX}liaison.csv",
+    f"{DESTINATION_PREFIX}{data_file('erp')}",
+    f"{DESTINATION_PREFIX}{data_file('web')}",
+    f"{DESTINATION_PREFIX}{data_file('liaison')}",
 }
 
 # ==============================================================================
@@ -47,13 +50,7 @@ def verify_minio_upload():
 
     # Connexion MinIO
     try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1",
-        )
+        s3_client = get_s3_client()
         logger.success("✅ Connexion à MinIO réussie.")
     except Exception as e:
         logger.error(f"❌ Connexion à MinIO échouée : {e}")
@@ -67,19 +64,19 @@ def verify_minio_upload():
         logger.error(f"❌ Bucket inaccessible : {e}")
         sys.exit(1)
 
-    # Listing et contrôle des fichiers
+    # Listing paginé et contrôle de présence des fichiers
     try:
-        response = s3_client.list_objects_v2(Bucket=BUCKET_NAME, Prefix=DESTINATION_PREFIX)
-        contents = response.get("Contents", [])
+        found_files = set(list_remote_objects({DESTINATION_PREFIX}, bucket=BUCKET_NAME))
 
-        if not contents:
+        if not found_files:
             logger.error(f"❌ Aucun fichier trouvé dans {BUCKET_NAME}/{DESTINATION_PREFIX}")
             sys.exit(1)
 
-        found_files = {obj["Key"] for obj in contents}
         logger.info(f"📦 Fichiers trouvés : {len(found_files)}")
-        for f in found_files:
+        for f in sorted(found_files)[:MAX_LISTED_FILES]:
             logger.info(f"   - {f}")
+        if len(found_files) > MAX_LISTED_FILES:
+            logger.info(f"   ... et {len(found_files) - MAX_LISTED_FILES} autre(s)")
 
         missing = EXPECTED_FILES - found_files
         if missing:
@@ -92,6 +89,37 @@ def verify_minio_upload():
         logger.error(f"❌ Erreur lors du listing MinIO : {e}")
         sys.exit(1)
 
+    # Contrôle d'intégrité (tailles et ETags) à partir du manifeste d'upload
+    manifest_key = f"{DESTINATION_PREFIX}{MANIFEST_NAME}"
+    try:
+        manifest = read_manifest(manifest_key, bucket=BUCKET_NAME)
+        if manifest is None:
+            logger.error(f"❌ Manifeste d'upload introuvable : {manifest_key}")
+            sys.exit(1)
+
+        report = verify_manifest(manifest, bucket=BUCKET_NAME)
+        logger.info(
+            f"🧾 Manifeste : {len(report['ok'])} objet(s) intègre(s) sur {len(manifest['objects'])}"
+        )
+
+        failed = False
+        for status, label in [
+            ("missing", "absent"),
+            ("size_mismatch", "taille différente (upload tronqué ?)"),
+            ("checksum_mismatch", "empreinte différente"),
+        ]:
+            for key in report[status]:
+                logger.error(f"❌ {key} : {label}")
+                failed = True
+        if failed:
+            sys.exit(1)
+
+        logger.success("🎯 Intégrité des fichiers vérifiée (tailles et ETags conformes au manifeste).")
+
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de la vérification du manifeste : {e}")
+        sys.exit(1)
+
 # ==============================================================================
 # 🚀 Point d’entrée
 # ==============================================================================
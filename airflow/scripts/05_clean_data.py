@@ -1,15 +1,29 @@
 # === Script 05 - Nettoyage complet des fichiers bruts CSV avec DuckDB ===
 # Ce script lit les fichiers CSV bruts depuis 'data/inputs/', applique des règles métier
 # de nettoyage (valeurs nulles, seuils, cohérences), puis enregistre les résultats nettoyés
-# dans 'data/outputs/' au format CSV et en base DuckDB. Un résumé statistique est aussi généré.
+# en base DuckDB et, sauf CLEAN_EXPORT=lazy, dans 'data/outputs/' au format CSV.
+# Un résumé statistique est aussi généré.
+# En mode DATA_FORMAT=parquet, les sources et les exports sont des fichiers Parquet typés.
+# Chaque source est lue deux fois, sans pandas ni table intermédiaire : une agrégation
+# fournit le nombre de lignes initial et le détail des lignes exclues par règle, puis la
+# table nettoyée est écrite directement, sans les lignes rejetées.
+# Les règles d'exclusion sont déclarées dans 'rules/<source>.json' (voir rules_engine.py).
+# Avec STORAGE_BACKEND=s3, les fichiers bruts sont lus directement dans MinIO (voir storage_backend.py).
 
 import os
 import sys
+import time
+import csv
 import warnings
 from pathlib import Path
-import pandas as pd
-import duckdb
 from loguru import logger
+from duckdb_settings import connect_duckdb
+from run_metrics import record_metrics
+from data_formats import FILE_EXTENSION, CLEAN_EXPORT, CLEAN_TABLES, data_file, source_reader
+from table_export import export_tables
+from rules_engine import load_all_rules, compile_clean, compile_clean_counts
+from incremental import mark_tables
+from storage_backend import INPUTS_PREFIX, STORAGE_BACKEND, prepare_connection, source_exists, source_path, source_size
 
 # ==============================================================================
 # 🔧 Configuration des chemins et du logger
@@ -25,10 +39,66 @@ logger.remove()
 logger.add(sys.stdout, level="INFO")
 logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 
+# ==============================================================================
+# 🧼 Nettoyage d'une source : compteurs, puis table nettoyée
+# ==============================================================================
+def clean_source(con, source: str, source_path: Path, rules: dict) -> dict:
+    """Crée '<source>_clean' et retourne ses statistiques.
+
+    Une agrégation compte les lignes, les lignes vides et les rejets par règle
+    (rules_engine.compile_clean_counts), puis '<source>_clean' est créée par un CTAS filtré
+    (rules_engine.compile_clean) : les lignes rejetées ne sont jamais écrites. Le nombre de
+    lignes écrites doit correspondre aux compteurs, sans quoi la source a changé entre-temps.
+    """
+    reader = source_reader(source_path)
+    table = f"{source}_clean"
+    columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {reader}").fetchall()]
+
+    # Compteurs : total, lignes vides, rejets par règle (une ligne peut violer plusieurs règles)
+    row = con.execute(compile_clean_counts(rules, reader, columns)).fetchone()
+    nb_initial, nb_empty, rule_counts, nb_excluded = row[0], row[1], row[2:-1], row[-1]
+
+    nb_written = con.execute(f"CREATE OR REPLACE TABLE {table} AS {compile_clean(rules, reader)}").fetchone()[0]
+    if nb_written != nb_initial - nb_excluded:
+        raise ValueError(
+            f"{source} : {nb_written} lignes écrites pour {nb_initial - nb_excluded} attendues "
+            "(source modifiée pendant le nettoyage)"
+        )
+    mark_tables(con, [table])
+
+    return {
+        "source": source,
+        "nb_lignes_initiales": nb_initial,
+        "nb_lignes_vides": nb_empty,
+        "nb_apres_nettoyage": nb_initial - nb_excluded,
+        "nb_exclues": nb_excluded,
+        "regles": dict(zip([rule["name"] for rule in rules["clean"]], rule_counts)),
+    }
+
+# ==============================================================================
+# 📊 Export des résumés (global + détail par règle)
+# ==============================================================================
+def write_summaries(stats: list, outputs_path: Path):
+    with open(outputs_path / "resume_stats.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["source", "nb_lignes_initiales", "nb_apres_nettoyage", "nb_exclues", "nb_lignes_vides"])
+        for s in stats:
+            writer.writerow([s["source"], s["nb_lignes_initiales"], s["nb_apres_nettoyage"],
+                             s["nb_exclues"], s["nb_lignes_vides"]])
+
+    with open(outputs_path / "resume_exclusions.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["source", "regle", "nb_lignes_rejetees"])
+        for s in stats:
+            for rule, count in s["regles"].items():
+                writer.writerow([s["source"], rule, count])
+
 # ==============================================================================
 # 🧹 Fonction principale
 # ==============================================================================
 def main():
+    started = time.perf_counter()
+
     # 📁 Chemins absolus Airflow-friendly
     INPUTS_PATH = Path("/opt/airflow/data/inputs")
     OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
@@ -37,85 +107,80 @@ def main():
     INPUTS_PATH.mkdir(parents=True, exist_ok=True)
     OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
 
-    # 📥 Chargement des fichiers CSV bruts
+    # 📏 Règles de nettoyage déclarées dans rules/<source>.json
     try:
-        df_erp = pd.read_csv(INPUTS_PATH / "erp.csv")
-        df_web = pd.read_csv(INPUTS_PATH / "web.csv")
-        df_liaison = pd.read_csv(INPUTS_PATH / "liaison.csv")
-
-        logger.info(f"ERP     : {len(df_erp)} lignes (lignes vides : {df_erp.isnull().all(axis=1).sum()})")
-        logger.info(f"WEB     : {len(df_web)} lignes (lignes vides : {df_web.isnull().all(axis=1).sum()})")
-        logger.info(f"LIAISON : {len(df_liaison)} lignes (lignes vides : {df_liaison.isnull().all(axis=1).sum()})")
+        cleaning_rules = load_all_rules()
     except Exception as e:
-        logger.error(f"❌ Erreur lors du chargement initial des CSV : {e}")
+        logger.error(f"❌ Erreur lors du chargement des règles de nettoyage : {e}")
         sys.exit(1)
 
+    # 📥 Vérification des fichiers bruts (CSV ou Parquet selon DATA_FORMAT), locaux ou dans MinIO
+    raw_files = {source: (f"{INPUTS_PREFIX}{data_file(source)}", INPUTS_PATH / data_file(source)) for source in cleaning_rules}
+    for source, (key, local_path) in raw_files.items():
+        if not source_exists(key, local_path):
+            logger.error(f"❌ Fichier brut introuvable ({STORAGE_BACKEND}) : {key if STORAGE_BACKEND == 's3' else local_path}")
+            sys.exit(1)
+
     # 🦆 Connexion à DuckDB
     if not DUCKDB_PATH.exists():
         logger.info("ℹ️ Fichier DuckDB non trouvé, il sera créé.")
     try:
-        con = duckdb.connect(str(DUCKDB_PATH))
+        con = connect_duckdb(DUCKDB_PATH, stage="clean")
+        prepare_connection(con)
         logger.success("✅ Connexion à DuckDB établie.")
     except Exception as e:
         logger.error(f"❌ Erreur de connexion à DuckDB : {e}")
         sys.exit(1)
 
-    # 🧼 Nettoyage métier avec DuckDB (valeurs nulles, seuils, cohérence)
+    # 🧼 Nettoyage métier avec DuckDB (valeurs nulles, seuils, cohérence) — compteurs puis table nettoyée
+    stats = []
     try:
-        con.execute(f"""
-            CREATE OR REPLACE TABLE erp_clean AS
-            SELECT * FROM read_csv_auto('{INPUTS_PATH}/erp.csv')
-            WHERE product_id IS NOT NULL
-              AND onsale_web IS NOT NULL
-              AND price IS NOT NULL AND price > 0
-              AND stock_quantity IS NOT NULL
-              AND stock_status IS NOT NULL
-        """)
-        logger.success("✅ Table 'erp_clean' créée avec règles de filtrage.")
-
-        con.execute(f"""
-            CREATE OR REPLACE TABLE web_clean AS
-            SELECT * FROM read_csv_auto('{INPUTS_PATH}/web.csv')
-            WHERE sku IS NOT NULL
-        """)
-        logger.success("✅ Table 'web_clean' créée avec filtrage sur SKU.")
-
-        con.execute(f"""
-            CREATE OR REPLACE TABLE liaison_clean AS
-            SELECT * FROM read_csv_auto('{INPUTS_PATH}/liaison.csv')
-            WHERE product_id IS NOT NULL AND id_web IS NOT NULL
-        """)
-        logger.success("✅ Table 'liaison_clean' créée avec filtres de jointure.")
+        for source, rules in cleaning_rules.items():
+            s = clean_source(con, source, source_path(*raw_files[source]), rules)
+            stats.append(s)
+            logger.info(f"{source.upper():<8}: {s['nb_lignes_initiales']} lignes (lignes vides : {s['nb_lignes_vides']})")
+            details = ", ".join(f"{rule}={count}" for rule, count in s["regles"].items())
+            logger.success(
+                f"✅ Table '{source}_clean' créée : {s['nb_apres_nettoyage']} lignes conservées, "
+                f"{s['nb_exclues']} exclues ({details})"
+            )
     except Exception as e:
         logger.error(f"❌ Erreur lors de la création des tables nettoyées : {e}")
         sys.exit(1)
 
-    # 💾 Export des résultats nettoyés au format CSV
+    # 💾 Export des résultats nettoyés (CSV ou Parquet selon DATA_FORMAT)
+    # En mode CLEAN_EXPORT=lazy, les tables restent en base : 08 les lit directement
+    # et l'export n'est fait qu'au moment de l'upload vers MinIO (script 06).
+    if CLEAN_EXPORT == "lazy":
+        logger.info("⏭️ Export des fichiers nettoyés différé (CLEAN_EXPORT=lazy).")
+    else:
+        try:
+            export_tables(con, CLEAN_TABLES, OUTPUTS_PATH)
+            logger.success(f"✅ Données nettoyées exportées vers 'data/outputs/' ({FILE_EXTENSION}).")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de l'export des fichiers nettoyés : {e}")
+            sys.exit(1)
+
+    # 📊 Résumé statistique des exclusions
     try:
-        con.execute(f"COPY erp_clean TO '{OUTPUTS_PATH}/erp_clean.csv' (HEADER, DELIMITER ',')")
-        con.execute(f"COPY web_clean TO '{OUTPUTS_PATH}/web_clean.csv' (HEADER, DELIMITER ',')")
-        con.execute(f"COPY liaison_clean TO '{OUTPUTS_PATH}/liaison_clean.csv' (HEADER, DELIMITER ',')")
-        logger.success("✅ Données nettoyées exportées vers 'data/outputs/'.")
+        write_summaries(stats, OUTPUTS_PATH)
+        logger.success("📈 Statistiques sauvegardées dans resume_stats.csv et resume_exclusions.csv")
     except Exception as e:
-        logger.error(f"❌ Erreur lors de l'export des fichiers CSV : {e}")
+        logger.error(f"❌ Erreur lors de la génération du résumé : {e}")
         sys.exit(1)
 
-    # 📊 Résumé statistique des exclusions
+    # 🗂️ Catalogue des métriques de l'exécution (lu par le rapport final)
     try:
-        resume_df = pd.DataFrame({
-            "source": ["erp", "web", "liaison"],
-            "nb_lignes_initiales": [len(df_erp), len(df_web), len(df_liaison)],
-            "nb_apres_nettoyage": [
-                con.execute("SELECT COUNT(*) FROM erp_clean").fetchone()[0],
-                con.execute("SELECT COUNT(*) FROM web_clean").fetchone()[0],
-                con.execute("SELECT COUNT(*) FROM liaison_clean").fetchone()[0]
-            ]
+        record_metrics(con, "clean", {
+            **{f"{s['source']}.brut.lignes": s["nb_lignes_initiales"] for s in stats},
+            **{f"{s['source']}.nettoye.lignes": s["nb_apres_nettoyage"] for s in stats},
         })
-        resume_df["nb_exclues"] = resume_df["nb_lignes_initiales"] - resume_df["nb_apres_nettoyage"]
-        resume_df.to_csv(OUTPUTS_PATH / "resume_stats.csv", index=False)
-        logger.success("📈 Statistiques sauvegardées dans resume_stats.csv")
+        record_metrics(con, "clean", {
+            f"{source}.brut.octets": source_size(*raw_files[source]) for source in cleaning_rules
+        }, unit="octets")
+        record_metrics(con, "clean", {"clean.duree": time.perf_counter() - started}, unit="s")
     except Exception as e:
-        logger.error(f"❌ Erreur lors de la génération du résumé : {e}")
+        logger.error(f"❌ Erreur lors de l'enregistrement des métriques : {e}")
         sys.exit(1)
 
     logger.success("🎯 Nettoyage terminé avec succès.")
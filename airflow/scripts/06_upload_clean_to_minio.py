@@ -1,14 +1,17 @@
 # === Script 06 - Upload des fichiers nettoyés vers MinIO ===
 # Ce script envoie les fichiers CSV nettoyés depuis 'data/outputs/'
 # vers un bucket MinIO, dans le dossier 'data/outputs/'.
+# Avec CLEAN_EXPORT=lazy, les fichiers sont d'abord exportés depuis les tables *_clean.
 
 import os
 import sys
 import warnings
 from pathlib import Path
-import boto3
-from botocore.exceptions import ClientError
 from loguru import logger
+from duckdb_settings import connect_duckdb
+from data_formats import CLEAN_EXPORT, CLEAN_TABLES, data_file
+from table_export import export_tables
+from minio_storage import BUCKET_NAME, MANIFEST_NAME, ensure_bucket, upload_many
 
 # ==============================================================================
 # 🔧 Initialisation du logger et des chemins
@@ -28,62 +31,54 @@ logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 # 🚀 Fonction principale d’upload vers MinIO
 # ==============================================================================
 def main():
-    # 🌍 Paramètres de connexion MinIO
-    MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-    ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-    SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-    BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
+    # 🌍 Préfixe de destination (connexion MinIO : voir minio_storage.py)
     DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/outputs/")
 
     # 📁 Répertoire des fichiers à envoyer
     OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
     OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
 
-    files_to_upload = ["erp_clean.csv", "web_clean.csv", "liaison_clean.csv"]
+    DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
 
-    # 🔌 Connexion au client S3 (MinIO)
-    try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1"
-        )
-        logger.success("✅ Connexion à MinIO établie.")
-    except Exception as e:
-        logger.error(f"❌ Connexion à MinIO échouée : {e}")
-        sys.exit(1)
+    files_to_upload = [data_file(table) for table in CLEAN_TABLES]
+
+    # 💾 Export différé : 05 n'a pas écrit les fichiers (CLEAN_EXPORT=lazy),
+    # ils sont produits ici depuis les tables *_clean, juste avant l'envoi.
+    if CLEAN_EXPORT == "lazy":
+        try:
+            con = connect_duckdb(DUCKDB_PATH, stage="upload_clean", read_only=True)
+            export_tables(con, CLEAN_TABLES, OUTPUTS_PATH)
+            con.close()
+            logger.success("✅ Tables nettoyées exportées depuis DuckDB (export différé).")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de l'export différé des tables nettoyées : {e}")
+            sys.exit(1)
 
     # 📦 Vérification de l'existence du bucket
     try:
-        s3_client.head_bucket(Bucket=BUCKET_NAME)
+        ensure_bucket(BUCKET_NAME)
         logger.success(f"✅ Bucket '{BUCKET_NAME}' trouvé.")
-    except ClientError as e:
+    except Exception as e:
         logger.error(f"❌ Le bucket '{BUCKET_NAME}' est inaccessible ou inexistant : {e}")
         sys.exit(1)
 
-    # 📤 Envoi des fichiers
+    # 📤 Envoi des fichiers (en parallèle)
     logger.info("📤 Démarrage de l’upload des fichiers nettoyés vers MinIO...")
 
+    files = []
     for filename in files_to_upload:
         local_path = OUTPUTS_PATH / filename
-        s3_key = f"{DESTINATION_PREFIX}{filename}"
-
         if not local_path.exists():
             logger.error(f"❌ Fichier introuvable localement : {local_path}")
             sys.exit(1)
+        files.append((local_path, f"{DESTINATION_PREFIX}{filename}"))
 
-        try:
-            s3_client.upload_file(
-                Filename=str(local_path),
-                Bucket=BUCKET_NAME,
-                Key=s3_key
-            )
-            logger.success(f"✅ Upload réussi : {filename} ➔ {s3_key}")
-        except Exception as e:
-            logger.error(f"❌ Échec de l’upload de {filename} : {e}")
-            sys.exit(1)
+    try:
+        # Manifeste (clés, tailles, empreintes) pour la vérification d'intégrité
+        upload_many(files, manifest_key=f"{DESTINATION_PREFIX}{MANIFEST_NAME}")
+    except Exception as e:
+        logger.error(f"❌ Échec de l’upload des fichiers nettoyés : {e}")
+        sys.exit(1)
 
     logger.success("🎯 Tous les fichiers nettoyés ont été uploadés avec succès.")
 
@@ -1,14 +1,17 @@
 # === Script 07 - Téléchargement des fichiers nettoyés depuis MinIO ===
 # Ce script télécharge les fichiers nettoyés ('erp_clean.csv', 'web_clean.csv', 'liaison_clean.csv')
 # depuis le bucket MinIO (préfixe 'data/outputs/') et les enregistre dans '/opt/airflow/data/outputs/'.
+# Étape sans objet quand 08 lit directement les tables DuckDB (DEDUP_INPUT=table)
+# ou les fichiers nettoyés dans MinIO (STORAGE_BACKEND=s3).
 
 import os
 import sys
 import warnings
 from pathlib import Path
-import boto3
-from botocore.exceptions import ClientError
 from loguru import logger
+from data_formats import DEDUP_INPUT, CLEAN_TABLES, data_file
+from minio_storage import BUCKET_NAME, ensure_bucket, download_many
+from storage_backend import remote_reads
 
 # ==============================================================================
 # 🔧 Configuration des logs
@@ -28,58 +31,45 @@ logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 # 📥 Fonction principale de téléchargement depuis MinIO
 # ==============================================================================
 def main():
-    # 🌍 Paramètres de connexion MinIO
-    MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-    ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-    SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-    BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
+    # 🌍 Préfixe source (connexion MinIO : voir minio_storage.py)
     DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/outputs/")
 
     # 📁 Dossier local cible
     LOCAL_OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
     LOCAL_OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
 
-    files_to_download = ["erp_clean.csv", "web_clean.csv", "liaison_clean.csv"]
+    files_to_download = [data_file(table) for table in CLEAN_TABLES]
 
-    # 🔌 Connexion à MinIO
-    try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1"
-        )
-        logger.success("✅ Connexion à MinIO réussie.")
-    except Exception as e:
-        logger.error(f"❌ Échec de connexion à MinIO : {e}")
-        sys.exit(1)
+    # ⏭️ En mode DEDUP_INPUT=table, 08 lit les tables *_clean de la base : rien à restaurer
+    if DEDUP_INPUT == "table":
+        logger.info("⏭️ Téléchargement inutile : le dédoublonnage lit les tables DuckDB (DEDUP_INPUT=table).")
+        return
+
+    # ⏭️ En mode STORAGE_BACKEND=s3, 08 lit les fichiers nettoyés dans MinIO
+    if remote_reads():
+        logger.info("⏭️ Téléchargement inutile : le dédoublonnage lit les fichiers dans MinIO (STORAGE_BACKEND=s3).")
+        return
 
     # ✅ Vérification du bucket
     try:
-        s3_client.head_bucket(Bucket=BUCKET_NAME)
+        ensure_bucket(BUCKET_NAME)
         logger.success(f"✅ Bucket '{BUCKET_NAME}' disponible.")
-    except ClientError as e:
+    except Exception as e:
         logger.error(f"❌ Bucket inaccessible ou inexistant : {e}")
         sys.exit(1)
 
-    # 📥 Téléchargement des fichiers
+    # 📥 Téléchargement des fichiers (en parallèle)
     logger.info("📥 Démarrage du téléchargement des fichiers nettoyés depuis MinIO...")
 
-    for filename in files_to_download:
-        s3_key = f"{DESTINATION_PREFIX}{filename}"
-        local_path = LOCAL_OUTPUTS_PATH / filename
-
-        try:
-            s3_client.download_file(
-                Bucket=BUCKET_NAME,
-                Key=s3_key,
-                Filename=str(local_path)
-            )
-            logger.success(f"✅ Fichier téléchargé : {filename} ➔ {local_path}")
-        except ClientError as e:
-            logger.error(f"❌ Échec du téléchargement de {filename} : {e}")
-            sys.exit(1)
+    files = [
+        (f"{DESTINATION_PREFIX}{filename}", LOCAL_OUTPUTS_PATH / filename)
+        for filename in files_to_download
+    ]
+    try:
+        download_many(files)
+    except Exception as e:
+        logger.error(f"❌ Échec du téléchargement des fichiers nettoyés : {e}")
+        sys.exit(1)
 
     logger.success("🎯 Tous les fichiers ont été téléchargés avec succès depuis MinIO.")
 
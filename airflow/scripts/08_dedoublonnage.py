@@ -1,13 +1,23 @@
-# === Script 08 - Dédoublonnage des fichiers nettoyés avec DuckDB ===
-# Ce script applique des règles de dédoublonnage spécifiques sur les fichiers nettoyés.
+# === Script 08 - Dédoublonnage des données nettoyées avec DuckDB ===
+# Ce script applique des règles de dédoublonnage spécifiques sur les données nettoyées,
+# lues par défaut directement dans les tables *_clean de la base (DEDUP_INPUT).
+# Les règles sont déclarées dans 'rules/<source>.json' et compilées par rules_engine.py.
 # Il crée trois tables DuckDB (erp_dedup, web_dedup, liaison_dedup) et vérifie leur validité.
+# Les tables sont mises à jour en incrémental (voir incremental.py), FULL_REBUILD=1 les recrée.
 
 import os
 import sys
+import time
 import warnings
 from pathlib import Path
-import duckdb
 from loguru import logger
+from data_formats import DEDUP_INPUT, data_file, source_reader
+from storage_backend import INPUTS_PREFIX, OUTPUTS_PREFIX, prepare_connection, source_path
+from rules_engine import load_all_rules, compile_dedup, explain
+from incremental import FULL_REBUILD, refresh_dedup
+from fusion_engine import cluster_keys
+from duckdb_settings import connect_duckdb, describe_settings
+from run_metrics import record_metrics
 
 # ==============================================================================
 # 🔧 Initialisation des logs
@@ -23,12 +33,22 @@ logger.remove()
 logger.add(sys.stdout, level="INFO")
 logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+# Source du dédoublonnage : voir DEDUP_INPUT dans data_formats.py
+# EXPLAIN_PLANS=1 : journalise le plan DuckDB de chaque requête compilée
+EXPLAIN_PLANS = os.getenv("EXPLAIN_PLANS", "0") == "1"
+
 # ==============================================================================
 # 💼 Fonction principale
 # ==============================================================================
 def main():
+    started = time.perf_counter()
+
     # 📁 Définition des chemins
     DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
+    INPUTS_PATH = Path("/opt/airflow/data/inputs")
     OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
     OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
 
@@ -38,63 +58,47 @@ def main():
 
     # 🦆 Connexion à DuckDB
     try:
-        con = duckdb.connect(str(DUCKDB_PATH))
-        logger.success(f"✅ Connexion à DuckDB : {DUCKDB_PATH}")
+        con = connect_duckdb(DUCKDB_PATH, stage="dedup")
+        if DEDUP_INPUT != "table":
+            prepare_connection(con)
+        logger.success(f"✅ Connexion à DuckDB : {DUCKDB_PATH} ({describe_settings(con)})")
     except Exception as e:
         logger.error(f"❌ Erreur de connexion à DuckDB : {e}")
         sys.exit(1)
 
-    # 🧹 Dédoublonnage ERP
-    try:
-        con.execute(f"""
-            CREATE OR REPLACE TABLE erp_dedup AS
-            SELECT 
-                product_id,
-                MAX(onsale_web)     AS onsale_web,
-                MAX(price)          AS price,
-                MAX(stock_quantity) AS stock_quantity,
-                MAX(stock_status)   AS stock_status
-            FROM read_csv_auto('{OUTPUTS_PATH}/erp_clean.csv')
-            GROUP BY product_id
-        """)
-        logger.success("✅ Table erp_dedup créée avec regroupement par product_id.")
-    except Exception as e:
-        logger.error(f"❌ Erreur de dédoublonnage ERP : {e}")
-        sys.exit(1)
+    logger.info(f"📥 Source du dédoublonnage : {DEDUP_INPUT}" + (" — reconstruction complète (FULL_REBUILD=1)" if FULL_REBUILD else ""))
 
-    # 🔗 Dédoublonnage Liaison
+    # 📏 Règles déclarées dans rules/<source>.json
     try:
-        con.execute(f"""
-            CREATE OR REPLACE TABLE liaison_dedup AS
-            SELECT 
-                product_id,
-                MIN(id_web) AS id_web
-            FROM read_csv_auto('{OUTPUTS_PATH}/liaison_clean.csv')
-            GROUP BY product_id
-        """)
-        logger.success("✅ Table liaison_dedup créée avec MIN(id_web) par product_id.")
+        all_rules = load_all_rules()
     except Exception as e:
-        logger.error(f"❌ Erreur de dédoublonnage Liaison : {e}")
+        logger.error(f"❌ Erreur lors du chargement des règles de dédoublonnage : {e}")
         sys.exit(1)
 
-    # 🌐 Dédoublonnage Web
-    try:
-        con.execute(f"""
-            CREATE OR REPLACE TABLE web_dedup AS
-            SELECT * FROM (
-                SELECT *, ROW_NUMBER() OVER (
-                    PARTITION BY sku
-                    ORDER BY post_date DESC
-                ) AS rn
-                FROM read_csv_auto('{OUTPUTS_PATH}/web_clean.csv')
-                WHERE post_type = 'product'
+    # 🧹 Dédoublonnage ERP / Liaison / Web — une requête fusionnée (nettoyage + dédoublonnage) par table
+    for source, rules in all_rules.items():
+        try:
+            if DEDUP_INPUT == "table":
+                relation = f"{source}_clean"
+            elif DEDUP_INPUT == "raw":
+                relation = source_reader(source_path(f"{INPUTS_PREFIX}{data_file(source)}", INPUTS_PATH / data_file(source)))
+            else:
+                # Fichiers *_clean : sur le disque (restaurés par 07) ou lus dans MinIO (STORAGE_BACKEND=s3)
+                clean_file = data_file(f"{source}_clean")
+                relation = source_reader(source_path(f"{OUTPUTS_PREFIX}{clean_file}", OUTPUTS_PATH / clean_file))
+            if EXPLAIN_PLANS:
+                logger.info(f"🔎 Plan {source}_dedup :\n{explain(con, compile_dedup(rules, relation))}")
+            result = refresh_dedup(con, rules, relation, cluster_by=cluster_keys(f"{source}_dedup"))
+            strategy = rules["dedup"]["strategy"]
+            details = f" ({result['raison']})" if result["raison"] else ""
+            logger.success(
+                f"✅ Table {source}_dedup à jour — mode {result['mode']}{details} : "
+                f"{result['cles_modifiees']} clé(s) écrite(s), {result['lignes']} lignes "
+                f"(stratégie '{strategy}' sur {', '.join(rules['dedup']['key'])})."
             )
-            WHERE rn = 1
-        """)
-        logger.success("✅ Table web_dedup créée avec filtre post_type='product' et ROW_NUMBER.")
-    except Exception as e:
-        logger.error(f"❌ Erreur de dédoublonnage Web : {e}")
-        sys.exit(1)
+        except Exception as e:
+            logger.error(f"❌ Erreur de dédoublonnage {source} : {e}")
+            sys.exit(1)
 
     # ✅ Validation finale des données
     try:
@@ -107,6 +111,8 @@ def main():
         assert nb_liaison > 0, "❌ Table liaison_dedup vide"
 
         logger.info(f"✔️  Lignes dédoublonnées - ERP: {nb_erp}, Web: {nb_web}, Liaison: {nb_liaison}")
+        record_metrics(con, "dedup", {"erp.dedup.lignes": nb_erp, "web.dedup.lignes": nb_web, "liaison.dedup.lignes": nb_liaison})
+        record_metrics(con, "dedup", {"dedup.duree": time.perf_counter() - started}, unit="s")
         logger.success("🎯 Dédoublonnage terminé avec succès et validé.")
     except Exception as e:
         logger.error(f"❌ Validation des tables dédoublonnées échouée : {e}")
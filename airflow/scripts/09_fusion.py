@@ -1,14 +1,20 @@
 # === Script 09 - Fusion des tables dédoublonnées en une table finale ===
 # Ce script fusionne les tables erp_dedup, liaison_dedup et web_dedup dans DuckDB.
+# Seuls les produits touchés par le dernier dédoublonnage sont recalculés (voir incremental.py).
+# Les requêtes et le moteur de jointure (FUSION_ENGINE) sont définis dans fusion_engine.py.
 # Il vérifie que le nombre de lignes correspond à 714 et exporte la table fusionnée en CSV.
 
 import os
 import sys
+import time
 import warnings
 from pathlib import Path
-import duckdb
-import pandas as pd
 from loguru import logger
+from incremental import refresh_fusion
+from fusion_engine import FUSION_ENGINE, FUSION_AFFECTED_KEYS, DELTA_TABLES, fusion_query
+from duckdb_settings import connect_duckdb, describe_settings
+from table_export import export_table
+from run_metrics import record_metrics
 
 # ==============================================================================
 # 🔧 Initialisation des logs
@@ -28,6 +34,7 @@ logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 # 🔗 Fonction principale : fusion logique
 # ==============================================================================
 def main():
+    started = time.perf_counter()
     DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
     OUTPUT_PATH = Path("/opt/airflow/data/outputs/fusion.csv")
 
@@ -37,33 +44,27 @@ def main():
 
     # 🦆 Connexion à DuckDB
     try:
-        con = duckdb.connect(str(DUCKDB_PATH))
-        logger.success(f"✅ Connexion à DuckDB établie : {DUCKDB_PATH}")
+        con = connect_duckdb(DUCKDB_PATH, stage="fusion")
+        logger.success(f"✅ Connexion à DuckDB établie : {DUCKDB_PATH} ({describe_settings(con)})")
     except Exception as e:
         logger.error(f"❌ Erreur de connexion à DuckDB : {e}")
         sys.exit(1)
 
-    # 🔄 Création de la table fusionnée
+    # 🔄 Création ou mise à jour incrémentale de la table fusionnée
     try:
-        con.execute("""
-            CREATE OR REPLACE TABLE fusion AS
-            SELECT
-                e.product_id,
-                e.onsale_web,
-                e.price,
-                e.stock_quantity,
-                e.stock_status,
-                w.post_title,
-                w.post_excerpt,
-                w.post_status,
-                w.post_type,
-                w.average_rating,
-                w.total_sales
-            FROM erp_dedup e
-            JOIN liaison_dedup l ON e.product_id = l.product_id
-            JOIN web_dedup w ON l.id_web = w.sku
-        """)
-        logger.success("✅ Table 'fusion' créée avec succès à partir des jointures.")
+        logger.info(f"🔗 Moteur de fusion : {FUSION_ENGINE}")
+        result = refresh_fusion(
+            con,
+            fusion_query(),
+            key="product_id",
+            affected_sql=FUSION_AFFECTED_KEYS,
+            delta_tables=DELTA_TABLES,
+        )
+        details = f" ({result['raison']})" if result["raison"] else ""
+        logger.success(
+            f"✅ Table 'fusion' à jour — mode {result['mode']}{details} : "
+            f"{result['cles_modifiees']} produit(s) recalculé(s)."
+        )
     except Exception as e:
         logger.error(f"❌ Erreur lors de la création de la table fusion : {e}")
         sys.exit(1)
@@ -76,9 +77,13 @@ def main():
         else:
             logger.info("✔️ Nombre de lignes attendu : 714")
 
-        fusion_df = con.execute("SELECT * FROM fusion").fetchdf()
-        fusion_df.to_csv(OUTPUT_PATH, index=False)
+        # Export en flux (COPY ou lots Arrow) : pas de DataFrame intermédiaire
+        export_table(con, "fusion", OUTPUT_PATH)
         logger.success(f"📁 Table fusion exportée avec succès : {OUTPUT_PATH}")
+
+        record_metrics(con, "fusion", {"fusion.lignes": nb_rows})
+        record_metrics(con, "fusion", {"fusion.csv.octets": OUTPUT_PATH.stat().st_size}, unit="octets")
+        record_metrics(con, "fusion", {"fusion.duree": time.perf_counter() - started}, unit="s")
     except Exception as e:
         logger.error(f"❌ Erreur lors de la validation ou de l'export : {e}")
         sys.exit(1)
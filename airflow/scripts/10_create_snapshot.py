@@ -1,12 +1,18 @@
 # === Script 10 - Snapshot de la base DuckDB après fusion ===
-# Ce script copie le fichier de base de données DuckDB après fusion
-# pour créer une sauvegarde figée dans '/opt/airflow/data/snapshots/'.
+# Ce script crée un snapshot horodaté de la base DuckDB après fusion dans
+# '/opt/airflow/data/snapshots/' (lien 'latest' vers le plus récent), puis applique
+# la politique de rétention. Le mode (SNAPSHOT_MODE) est décrit dans snapshot_store.py :
+# clone reflink du fichier, ou export Parquet des seules tables modifiées.
 
 import os
 import sys
-import shutil
 from pathlib import Path
 from loguru import logger
+from duckdb_settings import connect_duckdb
+from snapshot_store import (
+    SNAPSHOT_MODE, SNAPSHOT_RETENTION, SNAPSHOT_MAX_AGE_DAYS,
+    resolve_mode, create_snapshot, apply_retention,
+)
 
 # ==============================================================================
 # 🔧 Initialisation des logs
@@ -27,7 +33,6 @@ def main():
     DATA_PATH = Path("/opt/airflow/data")
     SOURCE_DUCKDB = DATA_PATH / "bottleneck.duckdb"
     SNAPSHOT_DIR = DATA_PATH / "snapshots"
-    SNAPSHOT_FILE = SNAPSHOT_DIR / "bottleneck_fusion_ok.duckdb"
 
     # ✅ Vérification de la base source
     if not SOURCE_DUCKDB.exists():
@@ -35,13 +40,47 @@ def main():
         sys.exit(1)
 
     try:
-        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(SOURCE_DUCKDB, SNAPSHOT_FILE)
-        logger.success(f"✅ Snapshot créé avec succès : {SNAPSHOT_FILE}")
+        mode = resolve_mode(SNAPSHOT_DIR, SNAPSHOT_MODE)
+        logger.info(f"📸 Mode de snapshot : {mode} (demandé : {SNAPSHOT_MODE})")
+    except Exception as e:
+        logger.error(f"❌ Mode de snapshot invalide : {e}")
+        sys.exit(1)
+
+    try:
+        # Le WAL est intégré au fichier avant tout clone ou export
+        con = connect_duckdb(SOURCE_DUCKDB, stage="snapshot")
+        con.execute("CHECKPOINT")
+        if mode == "parquet":
+            result = create_snapshot(SOURCE_DUCKDB, SNAPSHOT_DIR, mode, con=con)
+            con.close()
+        else:
+            con.close()
+            result = create_snapshot(SOURCE_DUCKDB, SNAPSHOT_DIR, mode)
+
+        logger.success(f"✅ Snapshot créé avec succès : {result['path']}")
+        if result["tables_exportees"] is not None:
+            logger.info(
+                f"📦 Tables exportées : {len(result['tables_exportees'])} "
+                f"({', '.join(result['tables_exportees']) or 'aucune'}), "
+                f"inchangées liées : {len(result['tables_liees'])}"
+            )
     except Exception as e:
         logger.error(f"❌ Erreur lors de la création du snapshot : {e}")
         sys.exit(1)
 
+    # 🧹 Rétention
+    try:
+        removed = apply_retention(SNAPSHOT_DIR, SNAPSHOT_RETENTION, SNAPSHOT_MAX_AGE_DAYS)
+        for name in removed:
+            logger.info(f"🧹 Snapshot supprimé (rétention) : {name}")
+        logger.info(
+            f"🗂️ Rétention : {SNAPSHOT_RETENTION} snapshot(s)"
+            + (f", {SNAPSHOT_MAX_AGE_DAYS} jour(s) maximum" if SNAPSHOT_MAX_AGE_DAYS > 0 else "")
+        )
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de l'application de la rétention : {e}")
+        sys.exit(1)
+
     logger.success("🎯 Sauvegarde de la base DuckDB terminée.")
 
 # ==============================================================================
@@ -4,12 +4,15 @@
 
 import os
 import sys
+import time
 from pathlib import Path
-import duckdb
-import pandas as pd
-import boto3
-from botocore.exceptions import ClientError
 from loguru import logger
+from duckdb_settings import connect_duckdb
+from minio_storage import upload_many
+from table_export import export_table
+from xlsx_export import EXCEL_EXPORT, export_table_xlsx
+from run_metrics import record_metrics
+from incremental import mark_tables
 
 # ==============================================================================
 # 🔧 Initialisation des logs
@@ -27,6 +30,7 @@ logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 # 💰 Fonction principale : calcul CA, export, upload MinIO
 # ==============================================================================
 def main():
+    started = time.perf_counter()
     DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
     OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
     OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
@@ -37,7 +41,7 @@ def main():
         sys.exit(1)
 
     try:
-        con = duckdb.connect(str(DUCKDB_PATH))
+        con = connect_duckdb(DUCKDB_PATH, stage="ca")
         logger.success("✅ Connexion à DuckDB réussie.")
     except Exception as e:
         logger.error(f"❌ Connexion DuckDB échouée : {e}")
@@ -45,7 +49,7 @@ def main():
 
     # 🧮 Calcul du chiffre d'affaires
     try:
-        con.execute("""
+        nb_produits = con.execute("""
             CREATE OR REPLACE TABLE ca_par_produit AS
             SELECT
                 product_id,
@@ -56,68 +60,61 @@ def main():
             FROM fusion
             WHERE stock_quantity > 0
               AND stock_status = 'instock'
-        """)
-        logger.success("✅ Table 'ca_par_produit' créée.")
+        """).fetchone()[0]
+        logger.success(f"✅ Table 'ca_par_produit' créée : {nb_produits} produits.")
 
         con.execute("""
             CREATE OR REPLACE TABLE ca_total AS
             SELECT ROUND(SUM(chiffre_affaires), 2) AS ca_total
             FROM ca_par_produit
         """)
-        logger.success("✅ Table 'ca_total' créée.")
+        ca_total = con.execute("SELECT ca_total FROM ca_total").fetchone()[0]
+        mark_tables(con, ["ca_par_produit", "ca_total"])
+        logger.success(f"✅ Table 'ca_total' créée : {ca_total} €.")
     except Exception as e:
         logger.error(f"❌ Erreur lors du calcul CA : {e}")
         sys.exit(1)
 
     # 💾 Export local en CSV/XLSX
     try:
-        df_ca = con.execute("SELECT * FROM ca_par_produit").fetchdf()
-        df_total = con.execute("SELECT * FROM ca_total").fetchdf()
-
-        local_files = {
-            "ca_par_produit.csv": df_ca,
-            "ca_total.csv": df_total,
-            "ca_par_produit.xlsx": df_ca,
+        # CSV : export en flux depuis DuckDB (COPY ou lots Arrow, sans DataFrame)
+        csv_exports = {
+            "ca_par_produit.csv": "ca_par_produit",
+            "ca_total.csv": "ca_total",
         }
-
-        for filename, df in local_files.items():
-            local_path = OUTPUTS_PATH / filename
-            if filename.endswith(".csv"):
-                df.to_csv(local_path, index=False)
-            elif filename.endswith(".xlsx"):
-                df.to_excel(local_path, index=False)
-            logger.success(f"📁 Fichier généré localement : {local_path}")
+        for filename, table in csv_exports.items():
+            export_table(con, table, OUTPUTS_PATH / filename)
+            logger.success(f"📁 Fichier généré localement : {OUTPUTS_PATH / filename}")
+
+        # XLSX : écrit en flux (openpyxl write_only), ou à la demande si EXCEL_EXPORT=lazy
+        local_files = list(csv_exports)
+        if EXCEL_EXPORT == "lazy":
+            logger.info("⏭️ ca_par_produit.xlsx différé (EXCEL_EXPORT=lazy, voir xlsx_export.py).")
+        else:
+            xlsx_path = OUTPUTS_PATH / "ca_par_produit.xlsx"
+            export_table_xlsx(con, "ca_par_produit", xlsx_path)
+            logger.success(f"📁 Fichier généré localement : {xlsx_path}")
+            local_files.append(xlsx_path.name)
+
+        record_metrics(con, "ca", {"ca.produits.lignes": nb_produits})
+        record_metrics(con, "ca", {"ca.total": ca_total}, unit="€")
+        record_metrics(con, "ca", {
+            f"{filename}.octets": (OUTPUTS_PATH / filename).stat().st_size for filename in local_files
+        }, unit="octets")
+        record_metrics(con, "ca", {"ca.duree": time.perf_counter() - started}, unit="s")
     except Exception as e:
         logger.error(f"❌ Erreur lors de la génération des fichiers CA : {e}")
         sys.exit(1)
 
-    # ☁️ Upload dans MinIO
-    MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-    ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-    SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-    BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
+    # ☁️ Upload dans MinIO (en parallèle)
     DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/outputs/")
 
     try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1",
-        )
-        logger.success("✅ Connexion à MinIO réussie.")
+        upload_many([
+            (OUTPUTS_PATH / filename, f"{DESTINATION_PREFIX}{filename}")
+            for filename in local_files
+        ])
     except Exception as e:
-        logger.error(f"❌ Échec de la connexion à MinIO : {e}")
-        sys.exit(1)
-
-    try:
-        for filename in local_files:
-            local_path = OUTPUTS_PATH / filename
-            s3_key = f"{DESTINATION_PREFIX}{filename}"
-            s3_client.upload_file(str(local_path), BUCKET_NAME, s3_key)
-            logger.success(f"🚀 Upload réussi : {filename} ➔ {s3_key}")
-    except ClientError as e:
         logger.error(f"❌ Erreur d'upload MinIO : {e}")
         sys.exit(1)
 
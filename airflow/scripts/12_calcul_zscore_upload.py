@@ -1,16 +1,24 @@
 # === Script 12 - Calcul du Z-score et upload dans MinIO ===
 # Ce script identifie les vins "millésimés" via un Z-score sur le prix.
+# Le Z-score et la classification sont calculés dans DuckDB (agrégats de fenêtre)
+# en une lecture de 'fusion' ; les deux CSV sont écrits en une passe sur le résultat.
+# Avec ZSCORE_ENGINE=streaming, les statistiques viennent de stats_sketches.py
+# (lecture par lots, mémoire constante) et un Z-score robuste (médiane / MAD) est ajouté.
 # Les résultats sont exportés localement puis uploadés dans MinIO.
 
 import os
 import sys
+import math
+import time
 import warnings
 from pathlib import Path
-import duckdb
-import pandas as pd
-import boto3
-from botocore.exceptions import ClientError
 from loguru import logger
+from duckdb_settings import connect_duckdb
+from minio_storage import upload_many
+from table_export import export_partitioned
+from stats_sketches import ROBUST_Z_FACTOR, profile_query
+from run_metrics import record_metrics
+from incremental import mark_tables
 
 warnings.filterwarnings("ignore")
 
@@ -26,10 +34,85 @@ logger.remove()
 logger.add(sys.stdout, level="INFO")
 logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 
+# ==============================================================================
+# ⚙️ Configuration du Z-score
+# ==============================================================================
+# Un vin est "millésimé" si son Z-score global dépasse ZSCORE_THRESHOLD.
+ZSCORE_THRESHOLD = float(os.getenv("ZSCORE_THRESHOLD", "2"))
+# ZSCORE_GROUPS : Z-scores par groupe ajoutés en colonnes z_score_<colonne>,
+# ex. "stock_status,onsale_web" (calculés dans la même requête, sans relecture).
+ZSCORE_GROUPS = [g.strip() for g in os.getenv("ZSCORE_GROUPS", "").split(",") if g.strip()]
+# ZSCORE_ENGINE : "sql" (par défaut, agrégats de fenêtre) ou "streaming" (profil en flux)
+ZSCORE_ENGINE = os.getenv("ZSCORE_ENGINE", "sql")
+
+# ==============================================================================
+# 🧮 Requête du Z-score (global et par groupe)
+# ==============================================================================
+def zscore_query(groups: list = ZSCORE_GROUPS, threshold: float = ZSCORE_THRESHOLD) -> str:
+    """Z-score du prix par agrégats de fenêtre ; un groupe d'un seul prix ou de prix égaux donne NULL."""
+    grouped = "".join(
+        f",\n                (price - AVG(price) OVER (PARTITION BY {g})) / STDDEV_SAMP(price) OVER (PARTITION BY {g}) AS z_score_{g}"
+        for g in groups
+    )
+    grouped_columns = "".join(f", z_score_{g}" for g in groups)
+    return f"""
+        SELECT
+            product_id, post_title, price, z_score{grouped_columns},
+            CASE WHEN z_score > {threshold} THEN 'millésimé' ELSE 'ordinaire' END AS type
+        FROM (
+            SELECT
+                product_id,
+                post_title,
+                price,
+                (price - AVG(price) OVER ()) / STDDEV_SAMP(price) OVER () AS z_score{grouped}
+            FROM fusion
+            WHERE price IS NOT NULL
+        )
+    """
+
+def streaming_zscore_query(threshold: float = ZSCORE_THRESHOLD) -> str:
+    """Z-score et Z-score robuste calculés depuis un profil figé (second passage en flux).
+
+    Moyenne, écart-type, médiane et MAD sont passés en paramètres (voir profile_parameters).
+    """
+    return f"""
+        SELECT
+            product_id, post_title, price, z_score, robust_z_score,
+            CASE WHEN z_score > {threshold} THEN 'millésimé' ELSE 'ordinaire' END AS type
+        FROM (
+            SELECT
+                product_id,
+                post_title,
+                price,
+                (price - $mean) / NULLIF($std, 0) AS z_score,
+                {ROBUST_Z_FACTOR} * (price - $median) / NULLIF($mad, 0) AS robust_z_score
+            FROM fusion
+            WHERE price IS NOT NULL
+        )
+    """
+
+
+def _defined(value) -> bool:
+    return value is not None and not math.isnan(value)
+
+
+def profile_parameters(summary: dict) -> dict:
+    """Paramètres de streaming_zscore_query : une statistique indéfinie (0 ou 1 prix) devient NULL,
+    comme STDDEV_SAMP dans le moteur sql."""
+    return {
+        name: float(summary[name]) if _defined(summary[name]) else None
+        for name in ("mean", "std", "median", "mad")
+    }
+
+
+def format_stat(value) -> str:
+    return f"{value:.4f}" if _defined(value) else "n/d"
+
 # ==============================================================================
 # 🍷 Fonction principale : calcul du Z-score et upload MinIO
 # ==============================================================================
 def main():
+    started = time.perf_counter()
     DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
     OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
     OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
@@ -40,7 +123,7 @@ def main():
         sys.exit(1)
 
     try:
-        con = duckdb.connect(str(DUCKDB_PATH))
+        con = connect_duckdb(DUCKDB_PATH, stage="zscore")
         logger.success("✅ Connexion à DuckDB établie.")
     except Exception as e:
         logger.error(f"❌ Erreur de connexion à DuckDB : {e}")
@@ -48,20 +131,40 @@ def main():
 
     # 📊 Calcul du Z-score
     try:
-        df = con.execute("""
-            SELECT product_id, post_title, price
-            FROM fusion
-            WHERE price IS NOT NULL
-        """).fetchdf()
-
-        df["z_score"] = (df["price"] - df["price"].mean()) / df["price"].std()
-        df["type"] = df["z_score"].apply(lambda z: "millésimé" if z > 2 else "ordinaire")
-
-        nb_millesimes = (df["type"] == "millésimé").sum()
-        nb_total = len(df)
+        fusion_columns = [row[0] for row in con.execute("DESCRIBE fusion").fetchall()]
+        unknown = [g for g in ZSCORE_GROUPS if g not in fusion_columns]
+        if unknown:
+            raise ValueError(f"Colonne(s) de regroupement inconnue(s) dans 'fusion' : {', '.join(unknown)}")
+
+        if ZSCORE_ENGINE == "streaming":
+            if ZSCORE_GROUPS:
+                raise ValueError("ZSCORE_GROUPS n'est disponible qu'avec ZSCORE_ENGINE=sql")
+            summary = profile_query(con, "SELECT price FROM fusion WHERE price IS NOT NULL").summary()
+            logger.info(
+                f"📈 Profil du prix : n={summary['count']}, moyenne={format_stat(summary['mean'])}, "
+                f"écart-type={format_stat(summary['std'])}, médiane≈{format_stat(summary['median'])}, "
+                f"MAD≈{format_stat(summary['mad'])}"
+            )
+            con.execute(f"CREATE OR REPLACE TABLE zscore_vins AS {streaming_zscore_query()}", profile_parameters(summary))
+        elif ZSCORE_ENGINE == "sql":
+            con.execute(f"CREATE OR REPLACE TABLE zscore_vins AS {zscore_query()}")
+        else:
+            raise ValueError(f"Moteur de Z-score inconnu : {ZSCORE_ENGINE} (attendu : sql, streaming)")
+        mark_tables(con, ["zscore_vins"])
+
+        nb_total, nb_millesimes, nb_nulls, nb_infs = con.execute("""
+            SELECT
+                COUNT(*),
+                COUNT(*) FILTER (WHERE type = 'millésimé'),
+                COUNT(*) FILTER (WHERE price IS NULL OR z_score IS NULL),
+                COUNT(*) FILTER (WHERE isinf(price) OR isinf(z_score))
+            FROM zscore_vins
+        """).fetchone()
 
         logger.info(f"🍷 Vins millésimés détectés : {nb_millesimes} (attendu : 30)")
         logger.info(f"📦 Vins ordinaires : {nb_total - nb_millesimes}")
+        if ZSCORE_GROUPS:
+            logger.info(f"🧩 Z-scores par groupe : {', '.join(f'z_score_{g}' for g in ZSCORE_GROUPS)}")
     except Exception as e:
         logger.error(f"❌ Erreur lors du calcul du Z-score : {e}")
         sys.exit(1)
@@ -71,49 +174,43 @@ def main():
         vins_millesimes_path = OUTPUTS_PATH / "vins_millesimes.csv"
         vins_ordinaires_path = OUTPUTS_PATH / "vins_ordinaires.csv"
 
-        df[df["type"] == "millésimé"].to_csv(vins_millesimes_path, index=False)
-        df[df["type"] == "ordinaire"].to_csv(vins_ordinaires_path, index=False)
+        # Les deux fichiers sont écrits en une seule passe sur la table, triés par produit
+        export_partitioned(con, "SELECT * FROM zscore_vins", "type", {
+            "millésimé": vins_millesimes_path,
+            "ordinaire": vins_ordinaires_path,
+        }, order_by="product_id")
 
         logger.success(f"📄 Export local terminé : {vins_millesimes_path}, {vins_ordinaires_path}")
+
+        record_metrics(con, "zscore", {
+            "zscore.millesimes.lignes": nb_millesimes,
+            "zscore.ordinaires.lignes": nb_total - nb_millesimes,
+        })
+        record_metrics(con, "zscore", {
+            f"{path.name}.octets": path.stat().st_size for path in [vins_millesimes_path, vins_ordinaires_path]
+        }, unit="octets")
+        record_metrics(con, "zscore", {"zscore.duree": time.perf_counter() - started}, unit="s")
     except Exception as e:
         logger.error(f"❌ Erreur lors de l'export local : {e}")
         sys.exit(1)
 
-    # ☁️ Connexion MinIO
-    MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-    ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-    SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-    BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
+    # 🚀 Upload des fichiers vers MinIO (en parallèle)
     DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/outputs/")
 
     try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1",
-        )
-        logger.success("✅ Connexion à MinIO établie.")
+        upload_many([
+            (local_file, f"{DESTINATION_PREFIX}{local_file.name}")
+            for local_file in [vins_millesimes_path, vins_ordinaires_path]
+        ])
     except Exception as e:
-        logger.error(f"❌ Connexion à MinIO échouée : {e}")
-        sys.exit(1)
-
-    # 🚀 Upload des fichiers vers MinIO
-    try:
-        for local_file in [vins_millesimes_path, vins_ordinaires_path]:
-            s3_key = f"{DESTINATION_PREFIX}{local_file.name}"
-            s3_client.upload_file(str(local_file), BUCKET_NAME, s3_key)
-            logger.success(f"🚀 Upload réussi : {local_file.name} ➔ {s3_key}")
-    except ClientError as e:
         logger.error(f"❌ Erreur lors de l'upload MinIO : {e}")
         sys.exit(1)
 
     # ✅ Tests de validation interne
     try:
         assert nb_millesimes == 30, f"❌ Nombre incorrect de vins millésimés : {nb_millesimes} (attendu : 30)"
-        assert df[["price", "z_score"]].isnull().sum().sum() == 0, "❌ Valeurs nulles détectées dans price/z_score"
-        assert df["z_score"].isin([float("inf"), float("-inf")]).sum() == 0, "❌ Valeurs infinies détectées dans z_score"
+        assert nb_nulls == 0, "❌ Valeurs nulles détectées dans price/z_score"
+        assert nb_infs == 0, "❌ Valeurs infinies détectées dans z_score"
         logger.success("🧪 Validation des résultats Z-score : OK")
     except Exception as e:
         logger.error(f"❌ Échec des tests de validation Z-score : {e}")
@@ -1,15 +1,18 @@
 # === Script 13 - Génération du rapport final et upload dans MinIO ===
 # Ce script synthétise toutes les métriques du pipeline, génère un rapport final,
 # l’exporte en CSV/XLSX et l’upload dans MinIO.
+# Les métriques sont enregistrées par chaque étape dans le catalogue 'run_metrics'
+# (voir run_metrics.py) : le rapport est une seule lecture, sans relire les données.
 
 import os
 import sys
-import duckdb
-import pandas as pd
-import boto3
-from botocore.exceptions import ClientError
+from minio_storage import upload_many
 from pathlib import Path
 from loguru import logger
+from duckdb_settings import connect_duckdb
+from run_metrics import RUN_ID, load_metrics
+from table_export import export_table
+from xlsx_export import EXCEL_EXPORT, export_table_xlsx
 import warnings
 
 warnings.filterwarnings("ignore")
@@ -26,13 +29,31 @@ logger.remove()
 logger.add(sys.stdout, level="INFO")
 logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 
+# ==============================================================================
+# 📋 Lignes du rapport : (étape, métrique du catalogue, valeur attendue)
+# ==============================================================================
+REPORT_ROWS = [
+    ("Brut - ERP", "erp.brut.lignes", ""),
+    ("Brut - Web", "web.brut.lignes", ""),
+    ("Brut - Liaison", "liaison.brut.lignes", ""),
+    ("Nettoyé - ERP", "erp.nettoye.lignes", ""),
+    ("Nettoyé - Web", "web.nettoye.lignes", ""),
+    ("Nettoyé - Liaison", "liaison.nettoye.lignes", ""),
+    ("Dédoublonné - ERP", "erp.dedup.lignes", "825"),
+    ("Dédoublonné - Web", "web.dedup.lignes", "714"),
+    ("Dédoublonné - Liaison", "liaison.dedup.lignes", "825"),
+    ("Fusion finale", "fusion.lignes", "714"),
+    ("Produits CA", "ca.produits.lignes", "573"),
+    ("CA Total (€)", "ca.total", "387837.60"),
+    ("Vins Millésimés", "zscore.millesimes.lignes", "30"),
+]
+
 # ==============================================================================
 # 📊 Fonction principale
 # ==============================================================================
 def main():
     DATA_PATH = Path("/opt/airflow/data")
     DUCKDB_PATH = DATA_PATH / "bottleneck.duckdb"
-    RAW_PATH = DATA_PATH / "inputs"
     OUTPUTS_PATH = DATA_PATH / "outputs"
     OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
 
@@ -42,79 +63,62 @@ def main():
         sys.exit(1)
 
     try:
-        con = duckdb.connect(str(DUCKDB_PATH))
+        con = connect_duckdb(DUCKDB_PATH, stage="report")
         logger.success("✅ Connexion à DuckDB établie.")
     except Exception as e:
         logger.error(f"❌ Erreur de connexion à DuckDB : {e}")
         sys.exit(1)
 
-    # 📥 Récupération des métriques du pipeline
+    # 📥 Récupération des métriques du pipeline (une requête sur le catalogue)
     try:
-        logger.info("📋 Récupération des métriques du pipeline...")
-
-        metrics = {
-            "ERP_brut": pd.read_csv(RAW_PATH / "erp.csv").shape[0],
-            "Web_brut": pd.read_csv(RAW_PATH / "web.csv").shape[0],
-            "Liaison_brut": pd.read_csv(RAW_PATH / "liaison.csv").shape[0],
-            "ERP_nettoye": con.execute("SELECT COUNT(*) FROM erp_clean").fetchone()[0],
-            "Web_nettoye": con.execute("SELECT COUNT(*) FROM web_clean").fetchone()[0],
-            "Liaison_nettoye": con.execute("SELECT COUNT(*) FROM liaison_clean").fetchone()[0],
-            "ERP_dedup": con.execute("SELECT COUNT(*) FROM erp_dedup").fetchone()[0],
-            "Web_dedup": con.execute("SELECT COUNT(*) FROM web_dedup").fetchone()[0],
-            "Liaison_dedup": con.execute("SELECT COUNT(*) FROM liaison_dedup").fetchone()[0],
-            "Fusion": con.execute("SELECT COUNT(*) FROM fusion").fetchone()[0],
-            "CA_total": con.execute("SELECT ca_total FROM ca_total").fetchone()[0],
-            "Produits_CA": con.execute("SELECT COUNT(*) FROM ca_par_produit").fetchone()[0],
-            "Vins_millesimes": pd.read_csv(OUTPUTS_PATH / "vins_millesimes.csv").shape[0],
-        }
+        logger.info(f"📋 Récupération des métriques de l'exécution '{RUN_ID}'...")
+        metrics = load_metrics(con)
 
+        missing = [name for _, name, _ in REPORT_ROWS if metrics.get(name) is None]
+        if missing:
+            raise ValueError(f"métriques absentes du catalogue : {', '.join(missing)}")
+
+        durations = {name: value for name, value in metrics.items() if name.endswith(".duree")}
+        if durations:
+            logger.info("⏱️ Durées : " + ", ".join(f"{name[:-6]}={value:.1f}s" for name, value in sorted(durations.items())))
         logger.success("✅ Données récupérées avec succès.")
     except Exception as e:
         logger.error(f"❌ Erreur lors de la récupération des métriques : {e}")
         sys.exit(1)
 
-    # 📄 Construction et export du rapport
+    # 📄 Construction et export du rapport (table 'rapport_final', source des exports)
     try:
-        df_report = pd.DataFrame([
-            {"Étape": "Brut - ERP", "Résultat": metrics["ERP_brut"], "Attendu": ""},
-            {"Étape": "Brut - Web", "Résultat": metrics["Web_brut"], "Attendu": ""},
-            {"Étape": "Brut - Liaison", "Résultat": metrics["Liaison_brut"], "Attendu": ""},
-            {"Étape": "Nettoyé - ERP", "Résultat": metrics["ERP_nettoye"], "Attendu": ""},
-            {"Étape": "Nettoyé - Web", "Résultat": metrics["Web_nettoye"], "Attendu": ""},
-            {"Étape": "Nettoyé - Liaison", "Résultat": metrics["Liaison_nettoye"], "Attendu": ""},
-            {"Étape": "Dédoublonné - ERP", "Résultat": metrics["ERP_dedup"], "Attendu": "825"},
-            {"Étape": "Dédoublonné - Web", "Résultat": metrics["Web_dedup"], "Attendu": "714"},
-            {"Étape": "Dédoublonné - Liaison", "Résultat": metrics["Liaison_dedup"], "Attendu": "825"},
-            {"Étape": "Fusion finale", "Résultat": metrics["Fusion"], "Attendu": "714"},
-            {"Étape": "Produits CA", "Résultat": metrics["Produits_CA"], "Attendu": "573"},
-            {"Étape": "CA Total (€)", "Résultat": round(metrics["CA_total"], 2), "Attendu": "387837.60"},
-            {"Étape": "Vins Millésimés", "Résultat": metrics["Vins_millesimes"], "Attendu": "30"},
+        con.execute("""
+            CREATE OR REPLACE TABLE rapport_final (
+                "Étape" VARCHAR,
+                "Résultat" DOUBLE,
+                "Attendu" VARCHAR
+            )
+        """)
+        con.executemany("INSERT INTO rapport_final VALUES (?, ?, ?)", [
+            [label, round(metrics[name], 2) if name == "ca.total" else metrics[name], expected or None]
+            for label, name, expected in REPORT_ROWS
         ])
 
-        df_report.to_csv(OUTPUTS_PATH / "rapport_final.csv", index=False)
-        df_report.to_excel(OUTPUTS_PATH / "rapport_final.xlsx", index=False)
-        logger.success("📄 Rapport final généré et exporté (CSV + XLSX).")
+        report_files = ["rapport_final.csv"]
+        export_table(con, "rapport_final", OUTPUTS_PATH / "rapport_final.csv")
+        if EXCEL_EXPORT == "lazy":
+            logger.info("⏭️ rapport_final.xlsx différé (EXCEL_EXPORT=lazy, voir xlsx_export.py).")
+        else:
+            export_table_xlsx(con, "rapport_final", OUTPUTS_PATH / "rapport_final.xlsx")
+            report_files.append("rapport_final.xlsx")
+        logger.success(f"📄 Rapport final généré et exporté ({', '.join(report_files)}).")
     except Exception as e:
         logger.error(f"❌ Erreur lors de l'export du rapport : {e}")
         sys.exit(1)
 
-    # ☁️ Upload vers MinIO
+    # ☁️ Upload vers MinIO (en parallèle)
     try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=os.getenv("MINIO_ENDPOINT", "http://minio:9000"),
-            aws_access_key_id=os.getenv("MINIO_ACCESS_KEY", "admin"),
-            aws_secret_access_key=os.getenv("MINIO_SECRET_KEY", "admin1234"),
-            region_name="us-east-1",
-        )
-        bucket_name = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
         prefix = os.getenv("MINIO_DESTINATION_PREFIX", "data/outputs/")
-
-        for filename in ["rapport_final.csv", "rapport_final.xlsx"]:
-            local_path = OUTPUTS_PATH / filename
-            s3_key = f"{prefix}{filename}"
-            s3_client.upload_file(str(local_path), bucket_name, s3_key)
-            logger.success(f"🚀 Upload réussi : {filename} ➔ {s3_key}")
+        upload_many([
+            (OUTPUTS_PATH / filename, f"{prefix}{filename}")
+            for filename in report_files
+        ])
     except Exception as e:
         logger.error(f"❌ Échec de l’upload vers MinIO : {e}")
         sys.exit(1)
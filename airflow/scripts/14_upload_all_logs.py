@@ -1,13 +1,14 @@
 # === Script 14 - Upload automatique des fichiers logs vers MinIO ===
-# Ce script explore le répertoire "logs" et transfère chaque fichier .log
-# dans le bucket MinIO, sous le chemin distant 'logs/'.
+# Ce script explore le répertoire "logs" et transfère dans le bucket MinIO le contenu
+# des fichiers .log écrit depuis le dernier envoi, compressé, sous 'logs/<run_id>/'
+# (voir log_shipping.py pour le fichier d'état des offsets et les réglages).
 
 import os
 import sys
-import boto3
-from botocore.exceptions import ClientError
 from pathlib import Path
 from loguru import logger
+from log_shipping import LOG_COMPRESSION, ship_logs
+from run_metrics import RUN_ID
 
 # ==============================================================================
 # 🔧 Initialisation des logs d'exécution
@@ -25,43 +26,24 @@ logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 # 📤 Fonction principale : upload des logs
 # ==============================================================================
 def main():
-    # 🌍 Configuration MinIO (via .env ou Airflow)
-    MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-    ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-    SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-    BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
-
-    # ✅ Connexion à MinIO
-    try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1",
-        )
-        logger.success("✅ Connexion à MinIO établie.")
-    except Exception as e:
-        logger.error(f"❌ Connexion à MinIO échouée : {e}")
-        sys.exit(1)
-
     # 📦 Recherche des fichiers logs
     logs_files = list(LOGS_PATH.glob("*.log"))
     if not logs_files:
         logger.warning("⚠️ Aucun fichier .log trouvé à uploader.")
         sys.exit(0)
 
-    logger.info(f"📂 {len(logs_files)} fichier(s) log trouvé(s) à uploader.")
+    logger.info(f"📂 {len(logs_files)} fichier(s) log trouvé(s), exécution '{RUN_ID}', compression {LOG_COMPRESSION}.")
 
-    # 🚀 Upload vers MinIO
-    for log_file in logs_files:
-        s3_key = f"logs/{log_file.name}"
-        try:
-            s3_client.upload_file(str(log_file), BUCKET_NAME, s3_key)
-            logger.success(f"📤 Upload réussi : {log_file.name} ➔ {s3_key}")
-        except ClientError as e:
-            logger.error(f"❌ Échec de l’upload de {log_file.name} : {e}")
-            sys.exit(1)
+    # 🚀 Envoi des nouvelles tranches vers MinIO (en parallèle, connexion : voir minio_storage.py)
+    try:
+        summary = ship_logs(LOGS_PATH, RUN_ID)
+        logger.info(
+            f"📊 {summary['tranches']} tranche(s) envoyée(s) : {summary['octets_lus']} octets de logs, "
+            f"{summary['octets_envoyes']} octets après compression."
+        )
+    except Exception as e:
+        logger.error(f"❌ Échec de l’upload des logs : {e}")
+        sys.exit(1)
 
     logger.success("🎯 Tous les fichiers logs ont été uploadés avec succès.")
 
@@ -0,0 +1,81 @@
+# === Module partagé - Formats de données et schémas des sources ===
+# Ce module centralise le format d'échange entre les étapes du pipeline
+# (CSV historique ou Parquet typé compressé en zstd) et déclare le schéma
+# de chaque source (erp, web, liaison) utilisé lors de l'écriture Parquet.
+
+import os
+from pathlib import Path
+
+# ==============================================================================
+# ⚙️ Format d'échange entre les étapes
+# ==============================================================================
+# DATA_FORMAT : "csv" (par défaut) ou "parquet"
+# En mode parquet, 01 écrit directement erp/web/liaison.parquet depuis Excel,
+# et 05/08 lisent ces fichiers typés sans ré-inférence des types.
+DATA_FORMAT = os.getenv("DATA_FORMAT", "csv")
+FILE_EXTENSION = "parquet" if DATA_FORMAT == "parquet" else "csv"
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+
+# ==============================================================================
+# 🔁 Échange entre le nettoyage (05) et le dédoublonnage (08)
+# ==============================================================================
+# DEDUP_INPUT : "table" (par défaut) ➝ 08 lit directement les tables *_clean de la base,
+#               "clean" ➝ 08 relit les fichiers *_clean exportés (restaurés par 07),
+#               "raw"   ➝ 08 nettoie et dédoublonne en une passe depuis les fichiers bruts.
+DEDUP_INPUT = os.getenv("DEDUP_INPUT", "table")
+# CLEAN_EXPORT : "eager" (par défaut) ➝ 05 exporte les tables *_clean en fichiers,
+#                "lazy" ➝ l'export est différé jusqu'à l'étape qui en a besoin (upload 06).
+CLEAN_EXPORT = os.getenv("CLEAN_EXPORT", "eager")
+CLEAN_TABLES = ["erp_clean", "web_clean", "liaison_clean"]
+
+# ==============================================================================
+# 🧾 Schémas déclarés par source (types DuckDB)
+# ==============================================================================
+# Seules les colonnes utilisées par le pipeline sont typées explicitement ;
+# les autres colonnes du fichier source sont conservées (texte si types mixtes).
+SOURCE_SCHEMAS = {
+    "erp": {
+        "product_id": "BIGINT",
+        "onsale_web": "BIGINT",
+        "price": "DOUBLE",
+        "stock_quantity": "BIGINT",
+        "stock_status": "VARCHAR",
+    },
+    "web": {
+        "sku": "VARCHAR",
+        "post_date": "TIMESTAMP",
+        "post_type": "VARCHAR",
+        "post_title": "VARCHAR",
+        "post_excerpt": "VARCHAR",
+        "post_status": "VARCHAR",
+        "average_rating": "DOUBLE",
+        "total_sales": "BIGINT",
+    },
+    "liaison": {
+        "product_id": "BIGINT",
+        "id_web": "VARCHAR",
+    },
+}
+
+# ==============================================================================
+# 📄 Nom de fichier d'une table selon le format courant
+# ==============================================================================
+def data_file(name: str, extension: str = None) -> str:
+    return f"{name}.{extension or FILE_EXTENSION}"
+
+# ==============================================================================
+# 🦆 Expressions DuckDB de lecture / d'écriture
+# ==============================================================================
+def source_reader(path: Path) -> str:
+    """Fonction table DuckDB adaptée à l'extension du fichier."""
+    if Path(path).suffix == ".parquet":
+        return f"read_parquet('{path}')"
+    return f"read_csv_auto('{path}')"
+
+
+def copy_options(extension: str = None) -> str:
+    """Options de COPY ... TO adaptées au format de sortie."""
+    if (extension or FILE_EXTENSION) == "parquet":
+        return f"(FORMAT PARQUET, COMPRESSION {PARQUET_COMPRESSION.upper()})"
+    return "(HEADER, DELIMITER ',')"
+
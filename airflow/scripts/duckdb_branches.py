@@ -0,0 +1,172 @@
+# === Module partagé - Bases de sortie des branches parallèles ===
+# DuckDB n'autorise qu'un processus en écriture par fichier : les branches parallèles du
+# DAG (CA, Z-score) qui ouvraient toutes deux bottleneck.duckdb en écriture se bloquaient
+# l'une l'autre. Chaque branche écrit donc dans sa propre base, 'branches/<branche>.duckdb',
+# où la base du pipeline est attachée en lecture seule sous le nom 'pipeline'. Les tables
+# sont résolues d'abord dans la branche, puis dans la base du pipeline : les étapes n'ont
+# pas à qualifier leurs requêtes (connect_duckdb choisit la base selon DUCKDB_BRANCH).
+#
+#     DUCKDB_BRANCH=ca python stage_cache.py 11_calcul_ca   ➝ écrit dans branches/ca.duckdb
+#     python duckdb_branches.py ca zscore                   ➝ fusion des branches dans la base
+#
+# La fusion, seule tâche en écriture (pool Airflow 'duckdb_writer'), recopie les tables de
+# chaque branche dans une transaction, reporte leurs métriques (run_metrics) et leur état
+# (pipeline_state, dont les marqueurs de version des tables) ligne à ligne, la plus récente
+# l'emportant, puis supprime les bases de branche.
+
+import os
+import re
+import sys
+import time
+from pathlib import Path
+import duckdb
+from run_metrics import METRICS_TABLE, ensure_metrics
+from incremental import STATE_TABLE, ensure_state
+
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+BRANCH = os.getenv("DUCKDB_BRANCH", "")
+BRANCHES_PATH = Path(os.getenv("DUCKDB_BRANCHES_PATH", "/opt/airflow/data/branches"))
+PIPELINE_ALIAS = "pipeline"
+BRANCH_NAME = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+# Tables partagées fusionnées ligne à ligne : (création, clé, horodatage de la ligne)
+SHARED_TABLES = {
+    METRICS_TABLE: (ensure_metrics, ["run_id", "name"], "recorded_at"),
+    STATE_TABLE: (ensure_state, ["name"], "updated_at"),
+}
+
+# ==============================================================================
+# 🌿 Connexion à une branche
+# ==============================================================================
+def branch_path(branch: str, branches_path: Path = BRANCHES_PATH) -> Path:
+    if not BRANCH_NAME.match(branch) or branch == PIPELINE_ALIAS:
+        raise ValueError(f"Nom de branche invalide : '{branch}' (minuscules, chiffres et '_')")
+    return Path(branches_path) / f"{branch}.duckdb"
+
+
+def _has_table(con, database: str, table: str) -> bool:
+    return con.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE database_name = ? AND schema_name = 'main' AND table_name = ?",
+        [database, table],
+    ).fetchone()[0] > 0
+
+
+def connect_branch(path: Path, branch: str, read_only: bool = False, branches_path: Path = BRANCHES_PATH):
+    """Ouvre la base de la branche, base du pipeline 'path' attachée en lecture seule.
+
+    En écriture, run_metrics et pipeline_state sont recopiés dans la branche (sans écraser
+    ses propres lignes) : la copie de la branche masque celle du pipeline, copy_metrics
+    et get_state doivent y retrouver l'historique et les marqueurs de version.
+    En lecture seule, une branche encore absente renvoie la base du pipeline.
+    """
+    target = branch_path(branch, branches_path)
+    if read_only and not target.exists():
+        return duckdb.connect(str(path), read_only=True)
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    con = duckdb.connect(str(target), read_only=read_only)
+    con.execute(f"ATTACH '{Path(path)}' AS {PIPELINE_ALIAS} (READ_ONLY)")
+    con.execute(f"SET search_path = '{branch}.main,{PIPELINE_ALIAS}.main'")
+
+    if not read_only:
+        for table, (ensure, _, _) in SHARED_TABLES.items():
+            if _has_table(con, PIPELINE_ALIAS, table):
+                ensure(con)
+                con.execute(f"INSERT OR IGNORE INTO {branch}.main.{table} SELECT * FROM {PIPELINE_ALIAS}.main.{table}")
+    return con
+
+# ==============================================================================
+# 🔀 Fusion des branches dans la base du pipeline
+# ==============================================================================
+def merge_branches(con, branches: list, branches_path: Path = BRANCHES_PATH) -> dict:
+    """Recopie les tables des branches dans la base ouverte par 'con' ; retourne {branche: [tables]}.
+
+    Une branche sans base (étape non exécutée) est ignorée. Deux branches produisant la
+    même table sont refusées avant toute écriture.
+    """
+    paths = {branch: branch_path(branch, branches_path) for branch in branches}
+    paths = {branch: path for branch, path in paths.items() if path.exists()}
+
+    tables, owners = {}, {}
+    try:
+        for branch, path in paths.items():
+            con.execute(f"ATTACH '{path}' AS branche_{branch} (READ_ONLY)")
+            tables[branch] = [row[0] for row in con.execute(
+                "SELECT table_name FROM duckdb_tables() WHERE database_name = ? AND schema_name = 'main' ORDER BY table_name",
+                [f"branche_{branch}"],
+            ).fetchall()]
+            for table in tables[branch]:
+                if table not in SHARED_TABLES and table in owners:
+                    raise ValueError(f"Table '{table}' produite par les branches '{owners[table]}' et '{branch}'")
+                owners[table] = branch
+
+        con.execute("BEGIN TRANSACTION")
+        try:
+            for branch, names in tables.items():
+                for table in names:
+                    source = f'branche_{branch}.main."{table}"'
+                    if table in SHARED_TABLES:
+                        # Lignes recopiées à l'ouverture : seules les lignes plus récentes remplacent
+                        ensure, keys, stamp = SHARED_TABLES[table]
+                        ensure(con)
+                        con.execute(f"""
+                            INSERT OR REPLACE INTO {table}
+                            SELECT b.* FROM {source} b
+                            LEFT JOIN {table} m USING ({', '.join(keys)})
+                            WHERE m.{stamp} IS NULL OR b.{stamp} > m.{stamp}
+                        """)
+                    else:
+                        con.execute(f'CREATE OR REPLACE TABLE "{table}" AS SELECT * FROM {source}')
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+    finally:
+        for branch in tables:
+            con.execute(f"DETACH branche_{branch}")
+
+    for path in paths.values():
+        path.unlink()
+        path.with_name(f"{path.name}.wal").unlink(missing_ok=True)
+    return tables
+
+# ==============================================================================
+# 🚀 Point d'entrée (tâche de fusion du DAG)
+# ==============================================================================
+def main(branches: list = None):
+    from loguru import logger
+    from duckdb_settings import connect_duckdb
+
+    LOGS_PATH = Path(os.getenv("AIRFLOW_LOG_PATH", "logs"))
+    LOGS_PATH.mkdir(parents=True, exist_ok=True)
+    logger.remove()
+    logger.add(sys.stdout, level="INFO")
+    logger.add(LOGS_PATH / "duckdb_branches.log", level="INFO", rotation="500 KB")
+
+    DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
+    branches = branches if branches is not None else sys.argv[1:]
+    if not branches:
+        logger.error("❌ Aucune branche à fusionner (ex. : python duckdb_branches.py ca zscore)")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    try:
+        con = connect_duckdb(DUCKDB_PATH, stage="merge")
+        merged = merge_branches(con, branches)
+        con.close()
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de la fusion des branches : {e}")
+        sys.exit(1)
+
+    for branch in branches:
+        if branch in merged:
+            logger.success(f"✅ Branche '{branch}' fusionnée : {', '.join(merged[branch]) or 'aucune table'}")
+        else:
+            logger.info(f"⏭️ Branche '{branch}' absente : rien à fusionner.")
+    logger.success(f"🎯 Fusion des branches terminée en {time.perf_counter() - started:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
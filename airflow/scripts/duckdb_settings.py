@@ -0,0 +1,115 @@
+# === Module partagé - Connexion DuckDB et ressources par étape ===
+# Ce module ouvre la base DuckDB du pipeline en appliquant les limites de ressources
+# de l'étape courante : mémoire, nombre de threads et répertoire de débordement sur disque.
+# Chaque réglage se lit d'abord dans une variable propre à l'étape, puis dans la
+# variable globale ; sans variable, la valeur par défaut de DuckDB est conservée.
+#
+#     DUCKDB_MEMORY_LIMIT=4GB              ➝ toutes les étapes
+#     DUCKDB_FUSION_MEMORY_LIMIT=12GB      ➝ étape "fusion" uniquement
+#     DUCKDB_THREADS / DUCKDB_<ETAPE>_THREADS
+#     DUCKDB_TEMP_DIRECTORY / DUCKDB_<ETAPE>_TEMP_DIRECTORY
+#
+# Connexion partagée (pipeline_runner.py) : lorsque plusieurs étapes s'exécutent dans
+# un même processus, share_connection() enregistre la base ; chaque connect_duckdb()
+# sur ce fichier renvoie alors un curseur de l'unique connexion (ouverte au premier
+# appel), avec les réglages de l'étape appliqués et les autres remis à leur valeur
+# d'origine. Le processus détient la base en écriture : read_only est alors ignoré.
+#
+# Branches parallèles : avec DUCKDB_BRANCH=<branche>, la base ouverte est celle de la
+# branche, base du pipeline attachée en lecture seule (voir duckdb_branches.py).
+
+import os
+import time
+from pathlib import Path
+import duckdb
+import duckdb_branches
+
+# ==============================================================================
+# ⚙️ Réglages DuckDB pilotés par l'environnement
+# ==============================================================================
+DUCKDB_SETTINGS = {
+    "memory_limit": "MEMORY_LIMIT",
+    "threads": "THREADS",
+    "temp_directory": "TEMP_DIRECTORY",
+}
+
+# ==============================================================================
+# 🔧 Lecture et application des réglages
+# ==============================================================================
+def stage_settings(stage: str) -> dict:
+    """Réglages de l'étape : variable DUCKDB_<ETAPE>_<REGLAGE>, sinon DUCKDB_<REGLAGE>."""
+    settings = {}
+    for name, suffix in DUCKDB_SETTINGS.items():
+        value = os.getenv(f"DUCKDB_{stage.upper()}_{suffix}", os.getenv(f"DUCKDB_{suffix}"))
+        if value:
+            settings[name] = value
+    return settings
+
+
+def apply_settings(con, stage: str, defaults: dict = None) -> dict:
+    settings = stage_settings(stage)
+    for name, value in {**(defaults or {}), **settings}.items():
+        if name == "temp_directory" and value:
+            Path(value).mkdir(parents=True, exist_ok=True)
+        con.execute(f"SET {name} = '{value}'")
+    return settings
+
+
+def connect_duckdb(path: Path, stage: str, read_only: bool = False):
+    """Ouvre la base et applique les réglages de ressources de l'étape."""
+    if _SHARED["path"] is not None and Path(path).resolve() == _SHARED["path"]:
+        return _shared_cursor(stage)
+    con = open_database(path, read_only=read_only)
+    apply_settings(con, stage)
+    return con
+
+
+def open_database(path: Path, read_only: bool = False):
+    """Base 'path', ou base de la branche courante (DUCKDB_BRANCH) qui l'attache en lecture seule."""
+    if duckdb_branches.BRANCH:
+        return duckdb_branches.connect_branch(path, duckdb_branches.BRANCH, read_only=read_only)
+    return duckdb.connect(str(path), read_only=read_only)
+
+# ==============================================================================
+# 🔗 Connexion partagée entre étapes d'un même processus
+# ==============================================================================
+_SHARED = {"path": None, "con": None, "defaults": {}, "ouverture": 0.0}
+
+
+def share_connection(path: Path):
+    """Les connect_duckdb() suivants sur 'path' réutilisent une seule connexion."""
+    close_shared_connection()
+    _SHARED["path"] = Path(path).resolve()
+
+
+def _shared_cursor(stage: str):
+    if _SHARED["con"] is None:
+        started = time.perf_counter()
+        con = open_database(_SHARED["path"])
+        _SHARED["defaults"] = dict(con.execute(
+            "SELECT name, value FROM duckdb_settings() WHERE name IN ('memory_limit', 'threads', 'temp_directory')"
+        ).fetchall())
+        _SHARED["con"] = con
+        _SHARED["ouverture"] = time.perf_counter() - started
+    cursor = _SHARED["con"].cursor()
+    apply_settings(cursor, stage, defaults=_SHARED["defaults"])
+    return cursor
+
+
+def shared_open_time() -> float:
+    """Durée d'ouverture de la connexion partagée (0 si elle n'a pas été ouverte)."""
+    return _SHARED["ouverture"]
+
+
+def close_shared_connection():
+    if _SHARED["con"] is not None:
+        _SHARED["con"].close()
+    _SHARED.update(path=None, con=None, defaults={}, ouverture=0.0)
+
+
+def describe_settings(con) -> str:
+    """Valeurs effectives, pour les logs des étapes."""
+    rows = con.execute(
+        "SELECT name, value FROM duckdb_settings() WHERE name IN ('memory_limit', 'threads', 'temp_directory') ORDER BY name"
+    ).fetchall()
+    return ", ".join(f"{name}={value}" for name, value in rows)
@@ -0,0 +1,112 @@
+# === Module partagé - Cache de téléchargement conditionnel ===
+# Ce module mémorise, pour chaque URL source, l'ETag, le Last-Modified et les
+# empreintes SHA-256 de l'archive et des fichiers extraits. Il permet d'envoyer
+# des requêtes conditionnelles (If-None-Match / If-Modified-Since) et d'indiquer
+# si les fichiers d'entrée ont changé depuis le dernier run du script 00.
+# Ce statut est informatif (XCom de la tâche) : le script 01 compare les classeurs
+# à ceux de sa dernière conversion réussie, pas au dernier téléchargement.
+
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+from pathlib import Path
+
+# ==============================================================================
+# 📁 Emplacements du cache et du statut des entrées
+# ==============================================================================
+CACHE_PATH = Path(os.getenv("FETCH_CACHE_PATH", "/opt/airflow/data/cache/fetch_cache.json"))
+STATUS_PATH = Path(os.getenv("FETCH_STATUS_PATH", "/opt/airflow/data/cache/inputs_status.json"))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# ==============================================================================
+# 🔐 Empreinte SHA-256 d'un fichier (lecture par blocs)
+# ==============================================================================
+def sha256_file(path: Path, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# ==============================================================================
+# 💾 Écriture JSON atomique
+# ==============================================================================
+def write_json_atomic(path: Path, payload: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    tmp_path.replace(path)
+
+# ==============================================================================
+# 🗃️ Cache des métadonnées de téléchargement
+# ==============================================================================
+class FetchCache:
+    def __init__(self, path: Path = CACHE_PATH):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                # Cache illisible : on repart d'un cache vide (téléchargement complet)
+                self.entries = {}
+
+    def get(self, url: str) -> dict:
+        return self.entries.get(url, {})
+
+    def members_intact(self, url: str, output_dir: Path) -> bool:
+        """Vrai si tous les fichiers extraits au dernier run sont présents et inchangés."""
+        members = self.get(url).get("members", {})
+        if not members:
+            return False
+        for name, digest in members.items():
+            local_path = Path(output_dir) / name
+            if not local_path.exists() or sha256_file(local_path) != digest:
+                return False
+        return True
+
+    def conditional_headers(self, url: str) -> dict:
+        entry = self.get(url)
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, url: str, etag: str = None, last_modified: str = None,
+               archive_sha256: str = None, members: dict = None):
+        self.entries[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "archive_sha256": archive_sha256,
+            "members": members or {},
+            "fetched_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def save(self):
+        write_json_atomic(self.path, self.entries)
+
+# ==============================================================================
+# 📣 Statut des entrées pour les tâches suivantes
+# ==============================================================================
+def write_inputs_status(changed: bool, reason: str, files: list, path: Path = STATUS_PATH):
+    write_json_atomic(path, {
+        "changed": changed,
+        "reason": reason,
+        "files": sorted(files),
+        "checked_at": datetime.now(timezone.utc).isoformat(),
+    })
+
+
+def inputs_unchanged(path: Path = STATUS_PATH) -> bool:
+    """Vrai si le dernier run du script 00 a conclu que les entrées n'ont pas changé."""
+    if not Path(path).exists():
+        return False
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8")).get("changed") is False
+    except (OSError, ValueError):
+        return False
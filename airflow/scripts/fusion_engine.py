@@ -0,0 +1,89 @@
+# === Module partagé - Requêtes de fusion ERP ↔ liaison ↔ web ===
+# Ce module porte les requêtes de la table 'fusion' (script 09) et leurs variantes :
+# - "standard" (par défaut) : jointure ERP ⋈ liaison ⋈ web telle quelle,
+# - "optimized" : lors de leur construction complète (script 08), les tables dédoublonnées
+#   sont triées selon CLUSTER_KEYS (erp sur product_id, liaison sur id_web, web sur sku),
+#   et les lignes web sont pré-filtrées par semi-jointure sur les id_web de la liaison.
+#   Ce pré-filtre parcourt quand même tout web_dedup et construit une table de hachage
+#   des id_web : il ne retire que les SKU non référencés de la jointure principale.
+# Les deux variantes produisent exactement les mêmes lignes. Sur les données synthétiques
+# de tests/bench_09_fusion.py, "optimized" est plus lent que "standard" (12,1 s contre
+# 11,0 s à 1M de produits, 70,4 s contre 52,8 s à 5M) et le tri n'apporte aucun gain :
+# "standard" reste donc le moteur par défaut, et 08 n'ajoute alors aucun tri.
+
+import os
+
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+# FUSION_ENGINE : "standard" (par défaut) ou "optimized"
+FUSION_ENGINE = os.getenv("FUSION_ENGINE", "standard")
+FUSION_ENGINES = ("standard", "optimized")
+
+FUSION_COLUMNS = """
+        e.product_id,
+        e.onsale_web,
+        e.price,
+        e.stock_quantity,
+        e.stock_status,
+        w.post_title,
+        w.post_excerpt,
+        w.post_status,
+        w.post_type,
+        w.average_rating,
+        w.total_sales"""
+
+# ==============================================================================
+# 🧾 Requêtes de fusion (une ligne par product_id)
+# ==============================================================================
+FUSION_QUERIES = {
+    "standard": f"""
+    SELECT{FUSION_COLUMNS}
+    FROM erp_dedup e
+    JOIN liaison_dedup l ON e.product_id = l.product_id
+    JOIN web_dedup w ON l.id_web = w.sku
+""",
+    "optimized": f"""
+    WITH web_linked AS (
+        SELECT * FROM web_dedup
+        WHERE sku IN (SELECT id_web FROM liaison_dedup)
+    )
+    SELECT{FUSION_COLUMNS}
+    FROM erp_dedup e
+    JOIN liaison_dedup l ON e.product_id = l.product_id
+    JOIN web_linked w ON l.id_web = w.sku
+""",
+}
+
+# Produits à recalculer : clés modifiées côté ERP ou liaison, et produits liés à un SKU web modifié
+FUSION_AFFECTED_KEYS = """
+    SELECT product_id FROM erp_dedup_delta
+    UNION
+    SELECT product_id FROM liaison_dedup_delta
+    UNION
+    SELECT l.product_id FROM liaison_dedup l JOIN web_dedup_delta w ON l.id_web = w.sku
+"""
+DELTA_TABLES = ["erp_dedup_delta", "liaison_dedup_delta", "web_dedup_delta"]
+
+# Colonnes de tri des tables dédoublonnées, sur leur clé de jointure vers la table suivante
+# (liaison_dedup sur id_web, clé de la jointure vers web_dedup). Les jointures par hachage
+# de DuckDB n'exploitent pas cet ordre : tests/bench_09_fusion.py ne mesure pas d'écart
+# de durée de la fusion avec ou sans tri.
+CLUSTER_KEYS = {
+    "erp_dedup": ["product_id"],
+    "liaison_dedup": ["id_web"],
+    "web_dedup": ["sku"],
+}
+
+# ==============================================================================
+# 🔧 Sélection du moteur
+# ==============================================================================
+def fusion_query(engine: str = FUSION_ENGINE) -> str:
+    if engine not in FUSION_ENGINES:
+        raise ValueError(f"Moteur de fusion inconnu : {engine} (attendu : {', '.join(FUSION_ENGINES)})")
+    return FUSION_QUERIES[engine]
+
+
+def cluster_keys(table: str, engine: str = FUSION_ENGINE) -> list:
+    """Colonnes de tri de 'table' lors d'une reconstruction complète (aucune en moteur standard)."""
+    return CLUSTER_KEYS.get(table, []) if engine == "optimized" else []
@@ -0,0 +1,294 @@
+# === Module partagé - Rafraîchissement incrémental des tables dédoublonnées et de la fusion ===
+# D'un mois à l'autre, la plupart des produits ne changent pas. Plutôt que de recréer
+# erp_dedup, web_dedup, liaison_dedup et fusion à chaque exécution, ce module :
+# - détecte les clés nouvelles, modifiées ou disparues de chaque source,
+#   par watermark sur une colonne (ex. post_date) ou par empreinte de ligne (row_hash),
+# - applique ces changements en upsert (DELETE + INSERT des seules clés concernées),
+# - journalise les clés touchées dans '<source>_dedup_delta' pour la fusion incrémentale.
+# Une reconstruction complète reste possible (FULL_REBUILD=1) et a lieu d'office au premier
+# passage, si une table manque ou si les règles de la source ont changé.
+#
+# Marqueurs de version : chaque étape qui modifie une table du pipeline appelle
+# mark_tables, qui enregistre un nouveau jeton 'table.<table>.version' dans pipeline_state.
+# Snapshots (snapshot_store.py) et cache des étapes (stage_cache.py) comparent ces jetons
+# au lieu de relire les tables : seules les tables sans marqueur sont hachées en entier.
+#
+# Modes de détection ('incremental.change_detection' dans rules/<source>.json) :
+# - watermark : seules les lignes des clés touchées sont relues et re-dédoublonnées ;
+#   c'est le seul mode qui économise du calcul dans 08,
+# - row_hash : la table dédoublonnée est recalculée en entier puis comparée, hachée,
+#   à la précédente ; plus coûteux qu'une reconstruction dans 08, il ne sert qu'à
+#   alimenter '<source>_dedup_delta' pour que 09 ne recalcule que les clés touchées.
+#   Réservé aux sources sans colonne de changement (erp, liaison),
+# - full (par défaut) : reconstruction à chaque exécution, fusion complète ensuite.
+#
+# Contrat du watermark : toute ligne ajoutée ou modifiée pour une clé déjà connue porte une
+# valeur de colonne strictement supérieure au watermark précédent. Les clés nouvelles ou
+# disparues sont détectées quelle que soit leur date.
+
+import os
+import json
+import uuid
+import hashlib
+from rules_engine import compile_dedup, compile_filter
+
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+# FULL_REBUILD=1 : recrée toutes les tables (vérification, reprise après incident)
+FULL_REBUILD = os.getenv("FULL_REBUILD", "0") == "1"
+
+STATE_TABLE = "pipeline_state"
+FUSION_REBUILD_STATE = "fusion.full_rebuild_required"
+TABLE_VERSION_STATE = "table.{}.version"
+
+# ==============================================================================
+# 🗃️ État persistant (watermarks, empreintes des règles) dans la base DuckDB
+# ==============================================================================
+def ensure_state(con):
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            name VARCHAR PRIMARY KEY,
+            value VARCHAR,
+            updated_at TIMESTAMP
+        )
+    """)
+
+
+def get_state(con, name: str):
+    ensure_state(con)
+    row = con.execute(f"SELECT value FROM {STATE_TABLE} WHERE name = ?", [name]).fetchone()
+    return row[0] if row else None
+
+
+def set_state(con, name: str, value):
+    ensure_state(con)
+    con.execute(
+        f"INSERT OR REPLACE INTO {STATE_TABLE} VALUES (?, ?, CAST(now() AS TIMESTAMP))",
+        [name, None if value is None else str(value)],
+    )
+
+
+def mark_tables(con, tables: list):
+    """Nouveau marqueur de version pour chaque table modifiée (dans la transaction en cours)."""
+    for table in tables:
+        set_state(con, TABLE_VERSION_STATE.format(table), uuid.uuid4().hex)
+
+
+def table_versions(con) -> dict:
+    """{table: marqueur de version} des tables déjà marquées."""
+    if not table_exists(con, STATE_TABLE):
+        return {}
+    prefix, suffix = TABLE_VERSION_STATE.split("{}")
+    rows = con.execute(
+        f"SELECT name, value FROM {STATE_TABLE} WHERE starts_with(name, ?) AND ends_with(name, ?)",
+        [prefix, suffix],
+    ).fetchall()
+    return {name[len(prefix):len(name) - len(suffix)]: value for name, value in rows}
+
+
+def table_exists(con, table: str) -> bool:
+    return con.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = ? AND NOT temporary", [table]
+    ).fetchone()[0] > 0
+
+
+def rules_fingerprint(rules: dict) -> str:
+    """Empreinte des règles : toute modification du fichier impose une reconstruction."""
+    return hashlib.sha256(json.dumps(rules, sort_keys=True).encode("utf-8")).hexdigest()
+
+# ==============================================================================
+# 🔑 Helpers SQL sur les clés
+# ==============================================================================
+def _key_match(keys: list, left: str, right: str) -> str:
+    return " AND ".join(f"{left}.{k} IS NOT DISTINCT FROM {right}.{k}" for k in keys)
+
+
+def _upsert(con, target: str, changed: str, next_rows: str, keys: list):
+    """Remplace dans 'target' les lignes des clés de 'changed' par celles de 'next_rows'."""
+    con.execute(f"DELETE FROM {target} WHERE EXISTS (SELECT 1 FROM {changed} c WHERE {_key_match(keys, 'c', target)})")
+    con.execute(f"""
+        INSERT INTO {target}
+        SELECT n.* FROM {next_rows} n
+        WHERE EXISTS (SELECT 1 FROM {changed} c WHERE {_key_match(keys, 'c', 'n')})
+    """)
+
+# ==============================================================================
+# 🧹 Dédoublonnage incrémental d'une source
+# ==============================================================================
+def _watermark(con, rules: dict, relation: str, previous: str = None):
+    """Nouvelle valeur du watermark : max de la colonne, jamais en deçà du précédent."""
+    column = rules["incremental"]["column"]
+    column_type = con.execute(f"DESCRIBE SELECT {column} FROM {relation}").fetchone()[1]
+    return con.execute(
+        f"SELECT CAST(GREATEST(MAX({column}), CAST(? AS {column_type})) AS VARCHAR) FROM {relation}",
+        [previous],
+    ).fetchone()[0]
+
+
+def _changed_by_row_hash(con, rules: dict, relation: str, target: str, keys: list) -> str:
+    """Clés dont la ligne dédoublonnée est nouvelle, différente ou disparue.
+
+    Le dédoublonnage complet est recalculé et les deux tables sont hachées : aucun
+    gain dans 08, seul le journal des clés touchées profite à la fusion (09).
+    """
+    key_list = ", ".join(keys)
+    con.execute(f"CREATE OR REPLACE TEMP TABLE {target}_next AS {compile_dedup(rules, relation)}")
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {target}_changed AS
+        SELECT {key_list} FROM (
+            SELECT {key_list}, hash(n) AS row_hash FROM {target}_next n
+            EXCEPT
+            SELECT {key_list}, hash(o) AS row_hash FROM {target} o
+        )
+        UNION
+        SELECT {key_list} FROM (
+            SELECT {key_list} FROM {target}
+            EXCEPT
+            SELECT {key_list} FROM {target}_next
+        )
+    """)
+    return f"{target}_next"
+
+
+def _changed_by_watermark(con, rules: dict, relation: str, target: str, keys: list, watermark: str) -> str:
+    """Clés ayant une ligne au-delà du watermark, plus les clés apparues ou disparues.
+
+    La comparaison des ensembles de clés (sans relire les autres colonnes) rattrape
+    les clés qui réapparaissent avec une date antérieure au watermark.
+    """
+    key_list = ", ".join(keys)
+    column = rules["incremental"]["column"]
+    column_type = con.execute(f"DESCRIBE SELECT {column} FROM {relation}").fetchone()[1]
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {target}_changed AS
+        WITH eligible AS (
+            SELECT DISTINCT {key_list} FROM {relation} WHERE {compile_filter(rules)}
+        )
+        SELECT DISTINCT {key_list} FROM {relation}
+        WHERE {column} > CAST(? AS {column_type})
+        UNION
+        (SELECT {key_list} FROM {target} EXCEPT SELECT {key_list} FROM eligible)
+        UNION
+        (SELECT {key_list} FROM eligible EXCEPT SELECT {key_list} FROM {target})
+    """, [watermark])
+
+    # Seules les lignes des clés touchées sont relues et re-dédoublonnées
+    touched = f"(SELECT r.* FROM {relation} r WHERE EXISTS (SELECT 1 FROM {target}_changed c WHERE {_key_match(keys, 'c', 'r')}))"
+    con.execute(f"CREATE OR REPLACE TEMP TABLE {target}_next AS {compile_dedup(rules, touched)}")
+    return f"{target}_next"
+
+
+def refresh_dedup(con, rules: dict, relation: str, full: bool = FULL_REBUILD, cluster_by: list = None) -> dict:
+    """Met à jour '<source>_dedup' depuis 'relation' et retourne un résumé de l'opération.
+
+    Avec cluster_by, une reconstruction complète écrit la table triée sur ces colonnes
+    (les upserts incrémentaux suivants sont ajoutés en fin de table).
+    """
+    source = rules["source"]
+    target = f"{source}_dedup"
+    delta = f"{target}_delta"
+    keys = rules["dedup"]["key"]
+    detection = rules["incremental"]["change_detection"]
+    fingerprint = rules_fingerprint(rules)
+    watermark = get_state(con, f"dedup.{source}.watermark")
+
+    reason = None
+    if full:
+        reason = "reconstruction complète demandée"
+    elif detection == "full":
+        reason = "pas de détection de changement"
+    elif not table_exists(con, target) or not table_exists(con, delta):
+        reason = "première exécution"
+    elif get_state(con, f"dedup.{source}.rules") != fingerprint:
+        reason = "règles modifiées"
+    elif detection == "watermark" and watermark is None:
+        reason = "watermark absent"
+
+    con.begin()
+    try:
+        if reason:
+            order_by = f"\nORDER BY {', '.join(cluster_by)}" if cluster_by else ""
+            con.execute(f"CREATE OR REPLACE TABLE {target} AS SELECT * FROM ({compile_dedup(rules, relation)}){order_by}")
+            con.execute(f"CREATE OR REPLACE TABLE {delta} AS SELECT {', '.join(keys)} FROM {target} LIMIT 0")
+            set_state(con, FUSION_REBUILD_STATE, "1")
+            nb_changed = con.execute(f"SELECT COUNT(*) FROM {target}").fetchone()[0]
+            mark_tables(con, [target, delta])
+        else:
+            if detection == "watermark":
+                next_rows = _changed_by_watermark(con, rules, relation, target, keys, watermark)
+            else:
+                next_rows = _changed_by_row_hash(con, rules, relation, target, keys)
+            _upsert(con, target, f"{target}_changed", next_rows, keys)
+            con.execute(f"INSERT INTO {delta} SELECT * FROM {target}_changed")
+            nb_changed = con.execute(f"SELECT COUNT(*) FROM {target}_changed").fetchone()[0]
+            if nb_changed:
+                mark_tables(con, [target, delta])
+
+        if detection == "watermark":
+            previous = None if reason else watermark
+            set_state(con, f"dedup.{source}.watermark", _watermark(con, rules, relation, previous))
+        set_state(con, f"dedup.{source}.rules", fingerprint)
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+
+    return {
+        "source": source,
+        "mode": "complet" if reason else "incrémental",
+        "raison": reason,
+        "cles_modifiees": nb_changed,
+        "lignes": con.execute(f"SELECT COUNT(*) FROM {target}").fetchone()[0],
+    }
+
+# ==============================================================================
+# 🔗 Fusion incrémentale
+# ==============================================================================
+def refresh_fusion(con, select_sql: str, key: str, affected_sql: str, delta_tables: list,
+                   target: str = "fusion", full: bool = FULL_REBUILD) -> dict:
+    """Met à jour 'target' pour les seules clés listées par 'affected_sql'.
+
+    'select_sql' est la requête de fusion complète, 'affected_sql' retourne les
+    valeurs de 'key' à recalculer à partir des tables '<source>_dedup_delta'.
+    Les deltas sont vidés une fois consommés.
+    """
+    reason = None
+    if full:
+        reason = "reconstruction complète demandée"
+    elif not table_exists(con, target):
+        reason = "première exécution"
+    elif not all(table_exists(con, table) for table in delta_tables):
+        reason = "journal des changements absent"
+    elif get_state(con, FUSION_REBUILD_STATE) != "0":
+        reason = "tables dédoublonnées reconstruites"
+
+    con.begin()
+    try:
+        if reason:
+            con.execute(f"CREATE OR REPLACE TABLE {target} AS {select_sql}")
+            nb_changed = con.execute(f"SELECT COUNT(*) FROM {target}").fetchone()[0]
+            mark_tables(con, [target])
+        else:
+            con.execute(f"CREATE OR REPLACE TEMP TABLE {target}_affected AS SELECT DISTINCT {key} FROM ({affected_sql})")
+            con.execute(f"CREATE OR REPLACE TEMP TABLE {target}_next AS SELECT * FROM ({select_sql}) WHERE {key} IN (SELECT {key} FROM {target}_affected)")
+            _upsert(con, target, f"{target}_affected", f"{target}_next", [key])
+            nb_changed = con.execute(f"SELECT COUNT(*) FROM {target}_affected").fetchone()[0]
+            if nb_changed:
+                mark_tables(con, [target])
+
+        for table in delta_tables:
+            if table_exists(con, table) and con.execute(f"DELETE FROM {table}").fetchone()[0]:
+                mark_tables(con, [table])
+        set_state(con, FUSION_REBUILD_STATE, "0")
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+
+    return {
+        "mode": "complet" if reason else "incrémental",
+        "raison": reason,
+        "cles_modifiees": nb_changed,
+        "lignes": con.execute(f"SELECT COUNT(*) FROM {target}").fetchone()[0],
+    }
@@ -0,0 +1,162 @@
+# === Module partagé - Expédition incrémentale des logs vers MinIO ===
+# Ce module n'envoie que le contenu des logs écrit depuis le dernier envoi :
+# - un fichier d'état local retient, par fichier (identifié par son inode, qui survit
+#   au renommage lors d'une rotation loguru), l'offset déjà expédié et l'empreinte
+#   de son début pour détecter une troncature ou la réutilisation d'un inode,
+# - chaque nouvelle tranche [offset, fin) est coupée à la dernière fin de ligne,
+#   compressée (gzip ou zstd) et envoyée sous 'logs/<run_id>/<fichier>.<début>-<fin>.<ext>',
+# - les tranches sont envoyées en parallèle ; l'état n'avance que pour les envois réussis.
+# Les tranches successives d'un même fichier (suivi par inode, même renommé) se
+# suivent sans trou ni recouvrement : concaténées dans l'ordre des offsets, elles
+# redonnent le fichier (des membres gzip concaténés forment un gzip valide).
+
+import os
+import json
+import gzip
+import shutil
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from loguru import logger
+from minio_storage import BATCH_WORKERS, BUCKET_NAME, upload_file
+
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+# LOG_COMPRESSION : "gzip" (par défaut), "zstd" (paquet zstandard requis) ou "none"
+LOG_COMPRESSION = os.getenv("LOG_COMPRESSION", "gzip")
+LOG_COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+LOG_PREFIX = os.getenv("LOG_PREFIX", "logs/")
+STATE_FILE_NAME = ".log_shipping_state.json"
+# Nombre d'octets du début de fichier retenus pour reconnaître un fichier déjà vu
+HEAD_BYTES = 1024
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# ==============================================================================
+# 🗃️ État local (offsets déjà expédiés)
+# ==============================================================================
+def load_state(state_path: Path) -> dict:
+    state_path = Path(state_path)
+    return json.loads(state_path.read_text()) if state_path.exists() else {}
+
+
+def save_state(state_path: Path, state: dict):
+    state_path = Path(state_path)
+    tmp_path = state_path.with_name(f".{state_path.name}.tmp")
+    tmp_path.write_text(json.dumps(state, indent=2, sort_keys=True))
+    os.replace(tmp_path, state_path)
+
+
+def file_id(path: Path) -> str:
+    stat = path.stat()
+    return f"{stat.st_dev}:{stat.st_ino}"
+
+
+def _head_digest(path: Path, length: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read(min(length, HEAD_BYTES))).hexdigest()
+
+# ==============================================================================
+# ✂️ Tranches à expédier
+# ==============================================================================
+def _last_newline_end(path: Path, start: int, end: int) -> int:
+    """Fin de la dernière ligne complète dans [start, end), ou start s'il n'y en a pas."""
+    position = end
+    with open(path, "rb") as f:
+        while position > start:
+            block_start = max(start, position - COPY_CHUNK_BYTES)
+            f.seek(block_start)
+            block = f.read(position - block_start)
+            index = block.rfind(b"\n")
+            if index >= 0:
+                return block_start + index + 1
+            position = block_start
+    return start
+
+
+def pending_ranges(log_files: list, state: dict) -> list:
+    """Retourne [(chemin, id, début, fin)] des octets non encore expédiés."""
+    ranges = []
+    for path in log_files:
+        fid = file_id(path)
+        size = path.stat().st_size
+        known = state.get(fid)
+        start = 0
+        if known and known["offset"] <= size and _head_digest(path, known["offset"]) == known["head"]:
+            start = known["offset"]
+        end = _last_newline_end(path, start, size)
+        if end > start:
+            ranges.append((path, fid, start, end))
+    return ranges
+
+
+def _compress_range(path: Path, start: int, end: int, dest: Path, compression: str):
+    if compression == "zstd":
+        import zstandard
+        opener = lambda p: zstandard.ZstdCompressor().stream_writer(open(p, "wb"))  # noqa: E731
+    elif compression == "gzip":
+        opener = lambda p: gzip.open(p, "wb")  # noqa: E731
+    else:
+        opener = lambda p: open(p, "wb")  # noqa: E731
+
+    with open(path, "rb") as src, opener(dest) as out:
+        src.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = src.read(min(COPY_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            out.write(chunk)
+            remaining -= len(chunk)
+
+# ==============================================================================
+# 🚀 Expédition
+# ==============================================================================
+def ship_logs(logs_path: Path, run_id: str, compression: str = LOG_COMPRESSION,
+              state_path: Path = None, bucket: str = BUCKET_NAME, max_workers: int = BATCH_WORKERS) -> dict:
+    """Expédie les nouvelles tranches des fichiers '*.log' de logs_path ; retourne un bilan."""
+    if compression not in LOG_COMPRESSIONS:
+        raise ValueError(f"Compression inconnue : {compression} (attendu : {', '.join(LOG_COMPRESSIONS)})")
+
+    logs_path = Path(logs_path)
+    state_path = Path(state_path or logs_path / STATE_FILE_NAME)
+    state = load_state(state_path)
+    log_files = sorted(logs_path.glob("*.log"))
+    ranges = pending_ranges(log_files, state)
+
+    # Les fichiers disparus sont retirés de l'état
+    present = {file_id(path) for path in log_files}
+    state = {fid: entry for fid, entry in state.items() if fid in present}
+
+    summary = {"fichiers": len(log_files), "tranches": 0, "octets_lus": 0, "octets_envoyes": 0}
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        def ship(task):
+            path, fid, start, end = task
+            key = f"{LOG_PREFIX}{run_id}/{path.name}.{start}-{end}{LOG_COMPRESSIONS[compression]}"
+            compressed = Path(tmp) / f"{fid.replace(':', '_')}.{start}"
+            _compress_range(path, start, end, compressed, compression)
+            upload_file(compressed, key, bucket=bucket)
+            return key, compressed.stat().st_size
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ranges) or 1))) as pool:
+            futures = {pool.submit(ship, task): task for task in ranges}
+            for future in as_completed(futures):
+                path, fid, start, end = futures[future]
+                try:
+                    key, sent = future.result()
+                except Exception as e:
+                    failures.append(path.name)
+                    logger.error(f"❌ Échec de l'envoi de {path.name} [{start}, {end}) : {e}")
+                    continue
+                state[fid] = {"name": path.name, "offset": end, "head": _head_digest(path, end)}
+                summary["tranches"] += 1
+                summary["octets_lus"] += end - start
+                summary["octets_envoyes"] += sent
+                logger.success(f"📤 {path.name} [{start}, {end}) ➔ {key} ({sent} octets)")
+
+    save_state(state_path, state)
+    if failures:
+        raise RuntimeError(f"{len(failures)} tranche(s) en échec : {', '.join(failures)}")
+    return summary
@@ -0,0 +1,340 @@
+# === Module partagé - Accès MinIO / S3 pour toutes les étapes du pipeline ===
+# Ce module remplace les initialisations boto3 dupliquées dans les scripts :
+# - un client S3 unique par processus, avec pool de connexions,
+# - une configuration de transfert (taille des blocs multipart, concurrence) réglable,
+# - des envois / téléchargements groupés exécutés en parallèle (upload_many / download_many),
+# - un mode synchronisation qui n'envoie que les fichiers dont le contenu a changé,
+# - un manifeste (clés, tailles, empreintes) écrit à l'envoi et vérifiable sans téléchargement.
+
+import os
+import json
+import hashlib
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from loguru import logger
+
+# ==============================================================================
+# ☁️ Configuration MinIO (variables d'environnement communes à toutes les étapes)
+# ==============================================================================
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
+ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
+SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
+BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
+REGION_NAME = os.getenv("MINIO_REGION", "us-east-1")
+
+# ==============================================================================
+# ⚙️ Réglages de transfert
+# ==============================================================================
+MAX_POOL_CONNECTIONS = int(os.getenv("MINIO_MAX_POOL_CONNECTIONS", "32"))
+MULTIPART_THRESHOLD_MB = int(os.getenv("MINIO_MULTIPART_THRESHOLD_MB", "16"))
+MULTIPART_CHUNK_MB = int(os.getenv("MINIO_MULTIPART_CHUNK_MB", "16"))
+MAX_CONCURRENCY = int(os.getenv("MINIO_MAX_CONCURRENCY", "8"))
+BATCH_WORKERS = int(os.getenv("MINIO_BATCH_WORKERS", "8"))
+
+# MINIO_SYNC=1 : un fichier déjà présent avec le même contenu n'est pas renvoyé
+SYNC_ENABLED = os.getenv("MINIO_SYNC", "1") == "1"
+SHA256_METADATA_KEY = "sha256"
+MANIFEST_NAME = "_manifest.json"
+
+_client = None
+_client_lock = threading.Lock()
+
+# ==============================================================================
+# 🔌 Client S3 partagé (pool de connexions)
+# ==============================================================================
+def get_s3_client():
+    """Retourne le client S3 du processus, créé une seule fois.
+
+    Les clients boto3 sont thread-safe : le même client sert tous les threads
+    des transferts groupés, qui se partagent son pool de connexions HTTP.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client(
+                    "s3",
+                    endpoint_url=MINIO_ENDPOINT,
+                    aws_access_key_id=ACCESS_KEY,
+                    aws_secret_access_key=SECRET_KEY,
+                    region_name=REGION_NAME,
+                    config=Config(
+                        max_pool_connections=MAX_POOL_CONNECTIONS,
+                        retries={"max_attempts": 5, "mode": "standard"},
+                    ),
+                )
+    return _client
+
+
+def get_transfer_config() -> TransferConfig:
+    return TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD_MB * 1024 * 1024,
+        multipart_chunksize=MULTIPART_CHUNK_MB * 1024 * 1024,
+        max_concurrency=MAX_CONCURRENCY,
+        use_threads=True,
+    )
+
+# ==============================================================================
+# 📦 Vérification (et création optionnelle) du bucket
+# ==============================================================================
+def ensure_bucket(bucket: str = BUCKET_NAME, create: bool = False):
+    s3_client = get_s3_client()
+    try:
+        s3_client.head_bucket(Bucket=bucket)
+    except ClientError as e:
+        if create and e.response["Error"]["Code"] in ("404", "NoSuchBucket"):
+            s3_client.create_bucket(Bucket=bucket)
+            logger.warning(f"📁 Bucket '{bucket}' créé automatiquement.")
+        else:
+            raise
+
+# ==============================================================================
+# 📤 Transferts unitaires
+# ==============================================================================
+def upload_file(local_path: Path, key: str, bucket: str = BUCKET_NAME, extra_args: dict = None):
+    get_s3_client().upload_file(
+        str(local_path), bucket, key,
+        ExtraArgs=extra_args, Config=get_transfer_config(),
+    )
+
+
+def download_file(key: str, local_path: Path, bucket: str = BUCKET_NAME):
+    Path(local_path).parent.mkdir(parents=True, exist_ok=True)
+    get_s3_client().download_file(bucket, key, str(local_path), Config=get_transfer_config())
+
+# ==============================================================================
+# 🚀 Transferts groupés en parallèle
+# ==============================================================================
+def _run_batch(tasks: list, action, max_workers: int, label: str) -> list:
+    """Exécute action(task) sur un pool de threads ; lève une erreur si un transfert échoue."""
+    if not tasks:
+        return []
+
+    done, failures = [], []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as pool:
+        futures = {pool.submit(action, task): task for task in tasks}
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                future.result()
+                done.append(task)
+                logger.success(f"{label} : {task[0]} ➔ {task[1]}")
+            except Exception as e:
+                failures.append((task, e))
+                logger.error(f"❌ Échec du transfert {task[0]} ➔ {task[1]} : {e}")
+
+    if failures:
+        raise RuntimeError(f"{len(failures)} transfert(s) en échec sur {len(tasks)}")
+    return done
+
+
+def upload_many(files: list, bucket: str = BUCKET_NAME, max_workers: int = BATCH_WORKERS,
+                sync: bool = SYNC_ENABLED, manifest_key: str = None) -> list:
+    """Envoie une liste de (chemin_local, clé_s3) en parallèle.
+
+    En mode sync, seuls les fichiers absents ou modifiés côté MinIO sont envoyés.
+    Avec manifest_key, un manifeste des clés, tailles et empreintes est écrit
+    après l'envoi pour permettre une vérification d'intégrité ultérieure.
+    """
+    files = [(Path(local), key) for local, key in files]
+    fingerprints = None
+    if sync or manifest_key:
+        fingerprints = {key: local_fingerprint(local) for local, key in files}
+
+    if sync:
+        uploaded = sync_many(files, bucket=bucket, max_workers=max_workers, fingerprints=fingerprints)
+    else:
+        uploaded = _run_batch(
+            files,
+            lambda task: upload_file(task[0], task[1], bucket=bucket, extra_args=(
+                {"Metadata": {SHA256_METADATA_KEY: fingerprints[task[1]]["sha256"]}} if fingerprints else None
+            )),
+            max_workers, "📤 Upload réussi",
+        )
+
+    if manifest_key:
+        write_manifest(manifest_key, fingerprints, bucket=bucket)
+    return uploaded
+
+
+def download_many(files: list, bucket: str = BUCKET_NAME, max_workers: int = BATCH_WORKERS) -> list:
+    """Télécharge une liste de (clé_s3, chemin_local) en parallèle."""
+    return _run_batch(
+        [(key, Path(local)) for key, local in files],
+        lambda task: download_file(task[0], task[1], bucket=bucket),
+        max_workers, "📥 Téléchargement réussi",
+    )
+
+# ==============================================================================
+# 🔐 Empreintes locales comparables aux objets MinIO
+# ==============================================================================
+def local_fingerprint(path: Path) -> dict:
+    """Calcule en une lecture l'ETag S3 attendu et le SHA-256 d'un fichier local.
+
+    L'ETag d'un objet envoyé en une fois est le MD5 du contenu ; en multipart,
+    c'est le MD5 des MD5 de chaque bloc suivi de '-<nb_blocs>'. Le calcul suit
+    la même configuration de transfert que upload_file().
+    """
+    path = Path(path)
+    size = path.stat().st_size
+    chunk_size = MULTIPART_CHUNK_MB * 1024 * 1024
+    multipart = size >= MULTIPART_THRESHOLD_MB * 1024 * 1024
+
+    sha256 = hashlib.sha256()
+    whole_md5 = hashlib.md5()
+    part_digests = []
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+            if multipart:
+                part_digests.append(hashlib.md5(chunk).digest())
+            else:
+                whole_md5.update(chunk)
+
+    if multipart:
+        etag = f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+    else:
+        etag = whole_md5.hexdigest()
+    return {"size": size, "etag": etag, "sha256": sha256.hexdigest()}
+
+# ==============================================================================
+# 📋 Index des objets distants (un listing par préfixe)
+# ==============================================================================
+def list_remote_objects(prefixes: set, bucket: str = BUCKET_NAME) -> dict:
+    """Retourne {clé: {"size", "etag"}} pour tous les objets sous les préfixes donnés."""
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    index = {}
+    for prefix in prefixes:
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                index[obj["Key"]] = {"size": obj["Size"], "etag": obj["ETag"].strip('"')}
+    return index
+
+
+def _remote_sha256(key: str, bucket: str) -> str:
+    head = get_s3_client().head_object(Bucket=bucket, Key=key)
+    return head.get("Metadata", {}).get(SHA256_METADATA_KEY)
+
+# ==============================================================================
+# 🔁 Synchronisation : envoi des seuls fichiers modifiés
+# ==============================================================================
+def sync_many(files: list, bucket: str = BUCKET_NAME, max_workers: int = BATCH_WORKERS,
+              fingerprints: dict = None) -> list:
+    """Envoie en parallèle les (chemin_local, clé_s3) dont le contenu diffère de MinIO.
+
+    Les objets distants sont connus par un seul listing par préfixe. Un fichier
+    est considéré inchangé si sa taille et son ETag correspondent ; à taille égale
+    mais ETag différent (autre découpage multipart), le SHA-256 stocké dans les
+    métadonnées de l'objet est comparé, les HEAD nécessaires étant envoyés en
+    parallèle. Retourne les fichiers envoyés.
+    """
+    files = [(Path(local), key) for local, key in files]
+    if not files:
+        return []
+    fingerprints = {key: (fingerprints or {}).get(key) or local_fingerprint(local) for local, key in files}
+
+    prefixes = {posixpath.dirname(key) + "/" if "/" in key else "" for _, key in files}
+    remote = list_remote_objects(prefixes, bucket=bucket)
+
+    # ETag différent à taille égale : SHA-256 des métadonnées, un HEAD par objet, en parallèle
+    remote_sha = {}
+    _run_batch(
+        [(local, key) for local, key in files
+         if key in remote and remote[key]["size"] == fingerprints[key]["size"]
+         and remote[key]["etag"] != fingerprints[key]["etag"]],
+        lambda task: remote_sha.update({task[1]: _remote_sha256(task[1], bucket)}),
+        max_workers, "🔎 SHA-256 distant lu",
+    )
+
+    to_upload, skipped, bytes_saved = [], [], 0
+    for local, key in files:
+        fingerprint = fingerprints[key]
+        obj = remote.get(key)
+        unchanged = obj is not None and obj["size"] == fingerprint["size"] and (
+            obj["etag"] == fingerprint["etag"] or remote_sha.get(key) == fingerprint["sha256"]
+        )
+        if unchanged:
+            skipped.append(key)
+            bytes_saved += fingerprint["size"]
+            logger.info(f"♻️ Inchangé, upload ignoré : {local.name} ➔ {key}")
+        else:
+            to_upload.append((local, key, fingerprint["sha256"]))
+
+    uploaded = _run_batch(
+        to_upload,
+        lambda task: upload_file(task[0], task[1], bucket=bucket,
+                                 extra_args={"Metadata": {SHA256_METADATA_KEY: task[2]}}),
+        max_workers, "📤 Upload réussi",
+    )
+    logger.info(
+        f"🔁 Synchronisation : {len(uploaded)} fichier(s) envoyé(s), {len(skipped)} inchangé(s), "
+        f"{bytes_saved / 1024 / 1024:.2f} Mo économisés."
+    )
+    return [(local, key) for local, key, _ in uploaded]
+
+# ==============================================================================
+# 🧾 Manifeste d'envoi et vérification d'intégrité
+# ==============================================================================
+def write_manifest(manifest_key: str, fingerprints: dict, bucket: str = BUCKET_NAME):
+    """Écrit dans MinIO le manifeste {clé: {size, etag, sha256}} des fichiers envoyés."""
+    payload = {"bucket": bucket, "objects": fingerprints}
+    get_s3_client().put_object(
+        Bucket=bucket, Key=manifest_key,
+        Body=json.dumps(payload, indent=2).encode("utf-8"),
+        ContentType="application/json",
+    )
+    logger.info(f"🧾 Manifeste écrit : {manifest_key} ({len(fingerprints)} objet(s))")
+
+
+def read_manifest(manifest_key: str, bucket: str = BUCKET_NAME) -> dict:
+    """Retourne le manifeste, ou None s'il n'existe pas."""
+    try:
+        body = get_s3_client().get_object(Bucket=bucket, Key=manifest_key)["Body"].read()
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return None
+        raise
+    return json.loads(body)
+
+
+def verify_manifest(manifest: dict, bucket: str = BUCKET_NAME, max_workers: int = BATCH_WORKERS) -> dict:
+    """Compare les objets distants au manifeste, sans rien télécharger.
+
+    Les tailles et ETags viennent d'un listing paginé (un par préfixe). Les objets
+    dont l'ETag diffère à taille égale (découpage multipart différent) sont
+    départagés en parallèle par le SHA-256 stocké dans leurs métadonnées.
+    Retourne {"ok", "missing", "size_mismatch", "checksum_mismatch"} (listes de clés).
+    """
+    expected = manifest.get("objects", {})
+    prefixes = {posixpath.dirname(key) + "/" if "/" in key else "" for key in expected}
+    remote = list_remote_objects(prefixes, bucket=bucket)
+
+    report = {"ok": [], "missing": [], "size_mismatch": [], "checksum_mismatch": []}
+    to_head = []
+    for key, fingerprint in expected.items():
+        obj = remote.get(key)
+        if obj is None:
+            report["missing"].append(key)
+        elif obj["size"] != fingerprint["size"]:
+            report["size_mismatch"].append(key)
+        elif obj["etag"] == fingerprint["etag"]:
+            report["ok"].append(key)
+        else:
+            to_head.append(key)
+
+    if to_head:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(to_head))) as pool:
+            remote_sha = dict(zip(to_head, pool.map(lambda key: _remote_sha256(key, bucket), to_head)))
+        for key in to_head:
+            if remote_sha[key] == expected[key]["sha256"]:
+                report["ok"].append(key)
+            else:
+                report["checksum_mismatch"].append(key)
+
+    return report
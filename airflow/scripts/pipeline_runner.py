@@ -0,0 +1,288 @@
+# === Runner - Exécution d'un sous-ensemble du pipeline dans un seul processus ===
+# Chaque tâche BashOperator relance un interpréteur, réimporte pandas / duckdb / boto3 /
+# loguru et rouvre bottleneck.duckdb. Ce runner charge les scripts d'étapes et de validation
+# comme des modules, appelle leur main() à la suite dans le même processus et partage
+# une seule connexion DuckDB (voir share_connection dans duckdb_settings.py) :
+# bibliothèques importées une fois, cache de la base conservé d'une étape à l'autre.
+#
+#     python pipeline_runner.py                       ➝ tout le pipeline, dans l'ordre du DAG
+#     python pipeline_runner.py dedoublonnage fusion  ➝ les groupes demandés
+#     python pipeline_runner.py 09_fusion             ➝ une étape isolée
+#
+# Un bilan sépare le coût de démarrage (imports, ouverture de la base, chargement de
+# chaque script) du temps d'exécution des étapes. RUNNER_COLD_START=1 mesure en plus un
+# démarrage à froid d'interpréteur, pour estimer ce qu'économise le mode un processus.
+
+import os
+import sys
+import time
+import importlib
+import importlib.util
+import subprocess
+from pathlib import Path
+from loguru import logger
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "pipeline_runner.log"
+
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
+SCRIPTS_PATH = Path(__file__).resolve().parent
+RUNNER_COLD_START = os.getenv("RUNNER_COLD_START", "0") == "1"
+
+# Bibliothèques importées une fois pour toutes les étapes
+PRELOAD_MODULES = ["duckdb", "pyarrow", "pandas", "boto3", "openpyxl", "minio_storage"]
+
+VALIDATION_ENGINE = SCRIPTS_PATH / "validation_engine.py"
+
+# Groupes d'étapes, dans l'ordre du DAG bottleneck_pipeline (étapes suivies de leur validation).
+# Une étape est un script, ou (script, arguments) pour un main() qui en attend.
+STAGE_GROUPS = {
+    "ingestion": [
+        SCRIPTS_PATH / "00_download_and_extract.py",
+        SCRIPTS_PATH / "01_excel_to_csv.py",
+        SCRIPTS_PATH / "02_upload_to_minio.py",
+        SCRIPTS_PATH / "03_verify_upload.py",
+    ],
+    "nettoyage": [
+        SCRIPTS_PATH / "05_clean_data.py",
+        (VALIDATION_ENGINE, ["clean"]),
+        SCRIPTS_PATH / "06_upload_clean_to_minio.py",
+    ],
+    "dedoublonnage": [
+        SCRIPTS_PATH / "08_dedoublonnage.py",
+        (VALIDATION_ENGINE, ["dedup"]),
+    ],
+    "fusion": [
+        SCRIPTS_PATH / "09_fusion.py",
+        (VALIDATION_ENGINE, ["fusion"]),
+    ],
+    "snapshot": [
+        SCRIPTS_PATH / "10_create_snapshot.py",
+    ],
+    "ca": [
+        SCRIPTS_PATH / "11_calcul_ca.py",
+        (VALIDATION_ENGINE, ["ca"]),
+    ],
+    "zscore": [
+        SCRIPTS_PATH / "12_calcul_zscore_upload.py",
+        (VALIDATION_ENGINE, ["zscore"]),
+    ],
+    # Fusion des bases de branche (CA et Z-score lancés avec DUCKDB_BRANCH), sinon sans effet
+    "branches": [
+        (SCRIPTS_PATH / "duckdb_branches.py", ["ca", "zscore"]),
+    ],
+    "rapport": [
+        SCRIPTS_PATH / "13_generate_final_report.py",
+    ],
+    "logs": [
+        SCRIPTS_PATH / "14_upload_all_logs.py",
+    ],
+}
+
+# Étapes exécutées même après un échec (TriggerRule.ALL_DONE dans le DAG)
+ALWAYS_RUN = {"14_upload_all_logs"}
+
+# ==============================================================================
+# 🧩 Résolution et chargement des étapes
+# ==============================================================================
+def split_stage(stage) -> tuple:
+    """(script, arguments) d'une étape."""
+    return stage if isinstance(stage, tuple) else (stage, [])
+
+
+def stage_name(stage) -> str:
+    """Nom d'une étape : nom du script, suivi de ses arguments (ex. validation_engine_clean)."""
+    path, args = split_stage(stage)
+    return "_".join([path.stem, *args])
+
+
+def resolve_stages(names: list) -> list:
+    """Étapes à exécuter : groupes et/ou étapes isolées (nom sans .py)."""
+    stages = {stage_name(stage): stage for group in STAGE_GROUPS.values() for stage in group}
+    selected = []
+    for name in names or list(STAGE_GROUPS):
+        if name in STAGE_GROUPS:
+            selected.extend(STAGE_GROUPS[name])
+        elif name.removesuffix(".py") in stages:
+            selected.append(stages[name.removesuffix(".py")])
+        else:
+            raise ValueError(
+                f"Groupe ou étape inconnu : {name} (groupes : {', '.join(STAGE_GROUPS)})"
+            )
+    return [stage for i, stage in enumerate(selected) if stage not in selected[:i]]
+
+
+def preload(modules: list = PRELOAD_MODULES) -> dict:
+    """Importe les bibliothèques communes ; retourne {module : durée d'import}."""
+    timings = {}
+    for name in modules:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"⚠️ Préchargement de {name} impossible : {e}")
+            continue
+        timings[name] = time.perf_counter() - started
+    return timings
+
+
+def load_stage(path: Path):
+    """Charge un script comme module (sans exécuter son bloc __main__)."""
+    spec = importlib.util.spec_from_file_location(f"stage_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def exit_code(e: SystemExit) -> int:
+    if e.code is None:
+        return 0
+    return e.code if isinstance(e.code, int) else 1
+
+
+def run_stage(stage) -> dict:
+    """Charge puis exécute main() ; un sys.exit() de l'étape devient son code retour.
+
+    Les étapes mémorisées (voir stage_cache.py) sont ignorées si leurs entrées n'ont pas changé.
+    """
+    from stage_cache import CACHED_STAGES, run_cached
+    from duckdb_settings import connect_duckdb
+
+    path, args = split_stage(stage)
+    name = stage_name(stage)
+    result = {"etape": name, "chargement": 0.0, "execution": 0.0, "code": 0}
+
+    def execute() -> int:
+        started = time.perf_counter()
+        try:
+            module = load_stage(path)
+            # Chaque script remplace les sinks loguru à l'import : le journal du runner est rajouté
+            sink = logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+            loaded = time.perf_counter()
+            result["chargement"] = loaded - started
+            try:
+                module.main(*([args] if args else []))
+            finally:
+                result["execution"] = time.perf_counter() - loaded
+                try:
+                    logger.remove(sink)
+                except ValueError:
+                    pass  # sinks déjà remplacés par le main() de l'étape
+        except SystemExit as e:
+            return exit_code(e)
+        except Exception as e:
+            logger.error(f"❌ Erreur inattendue dans {path.name} : {e}")
+            return 1
+        return 0
+
+    if name in CACHED_STAGES:
+        result["code"] = run_cached(name, execute, lambda: connect_duckdb(DUCKDB_PATH, stage="cache"))
+    else:
+        result["code"] = execute()
+    return result
+
+
+def run_stages(stages: list, always_run: set = ALWAYS_RUN) -> list:
+    """Exécute les étapes dans l'ordre ; après un échec, seules celles de always_run continuent."""
+    results = []
+    failed = False
+    for stage in stages:
+        if failed and stage_name(stage) not in always_run:
+            logger.warning(f"⏭️ {stage_name(stage)} ignorée (étape précédente en échec)")
+            continue
+        result = run_stage(stage)
+        results.append(result)
+        failed = failed or result["code"] != 0
+    return results
+
+# ==============================================================================
+# 📊 Bilan démarrage / exécution
+# ==============================================================================
+def cold_start_cost(modules: list = PRELOAD_MODULES) -> float:
+    """Durée d'un interpréteur neuf qui importe les bibliothèques communes."""
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", f"import {', '.join(modules)}"],
+        cwd=SCRIPTS_PATH, check=True, capture_output=True,
+    )
+    return time.perf_counter() - started
+
+
+def overhead_report(imports: dict, open_time: float, results: list, wall_time: float) -> list:
+    """Lignes du bilan : coût de démarrage partagé, puis chargement / exécution par étape."""
+    loading = sum(r["chargement"] for r in results)
+    overhead = sum(imports.values()) + open_time + loading
+    lines = [
+        f"📦 Imports des bibliothèques : {sum(imports.values()):.2f}s "
+        f"({', '.join(f'{name} {seconds:.2f}s' for name, seconds in imports.items())})",
+        f"🦆 Ouverture de la base partagée : {open_time:.3f}s",
+    ]
+    for r in results:
+        status = "✅" if r["code"] == 0 else "❌"
+        lines.append(f"{status} {r['etape']} : chargement {r['chargement']:.2f}s, exécution {r['execution']:.2f}s")
+    lines.append(
+        f"⏱️ Total {wall_time:.2f}s — démarrage et chargements {overhead:.2f}s "
+        f"({overhead / wall_time:.0%}), étapes {sum(r['execution'] for r in results):.2f}s"
+        if wall_time > 0 else "⏱️ Aucune étape exécutée"
+    )
+    return lines
+
+# ==============================================================================
+# 🚀 Fonction principale
+# ==============================================================================
+def main(names: list):
+    logger.remove()
+    logger.add(sys.stdout, level="INFO")
+    logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+    try:
+        stages = resolve_stages(names)
+    except ValueError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    imports = preload()
+    from duckdb_settings import share_connection, shared_open_time, close_shared_connection
+    share_connection(DUCKDB_PATH)
+    logger.info(f"🏃 {len(stages)} étape(s) dans un seul processus : {', '.join(stage_name(s) for s in stages)}")
+
+    try:
+        results = run_stages(stages)
+        open_time = shared_open_time()
+    finally:
+        close_shared_connection()
+    wall_time = time.perf_counter() - started
+
+    # Les étapes ont remplacé les sinks : le bilan repart sur ceux du runner
+    logger.remove()
+    logger.add(sys.stdout, level="INFO")
+    logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+    for line in overhead_report(imports, open_time, results, wall_time):
+        logger.info(line)
+
+    if RUNNER_COLD_START:
+        cold = cold_start_cost()
+        logger.info(
+            f"🧊 Démarrage à froid d'un interpréteur : {cold:.2f}s ➝ économie estimée "
+            f"{cold * (len(results) - 1):.2f}s pour {len(results)} étape(s) en processus séparés"
+        )
+
+    failed = [r["etape"] for r in results if r["code"] != 0]
+    if failed or len(results) < len(stages):
+        logger.error(f"❌ Étape(s) en échec : {', '.join(failed)}")
+        sys.exit(1)
+    logger.success("🎯 Étapes exécutées avec succès dans un seul processus.")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
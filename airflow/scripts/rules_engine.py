@@ -0,0 +1,149 @@
+# === Module partagé - Moteur de règles de nettoyage et de dédoublonnage ===
+# Les règles de chaque source (erp, web, liaison) sont déclarées dans 'rules/<source>.json'.
+# Ce module les charge et les compile en une seule requête DuckDB par table :
+# les règles de rejet (nettoyage) et la stratégie de dédoublonnage sont fusionnées,
+# si bien qu'ajouter une règle n'ajoute qu'un prédicat au même parcours des données.
+#
+# Affichage des requêtes compilées et de leur plan :
+#     python rules_engine.py [source ...]
+
+import os
+import sys
+import json
+from pathlib import Path
+
+# ==============================================================================
+# ⚙️ Emplacement des fichiers de règles
+# ==============================================================================
+RULES_PATH = Path(os.getenv("RULES_PATH", Path(__file__).resolve().parent / "rules"))
+SOURCES = ("erp", "web", "liaison")
+DEDUP_STRATEGIES = ("aggregate", "latest")
+CHANGE_DETECTIONS = ("full", "row_hash", "watermark")
+
+# ==============================================================================
+# 📥 Chargement et validation d'un fichier de règles
+# ==============================================================================
+def load_rules(source: str, rules_path: Path = RULES_PATH) -> dict:
+    """Charge 'rules/<source>.json' et vérifie sa structure."""
+    path = Path(rules_path) / f"{source}.json"
+    if not path.exists():
+        raise FileNotFoundError(f"Fichier de règles introuvable : {path}")
+
+    with open(path, encoding="utf-8") as f:
+        rules = json.load(f)
+
+    rules.setdefault("source", source)
+    rules.setdefault("clean", [])
+    for rule in rules["clean"]:
+        if not rule.get("name") or not rule.get("reject_if"):
+            raise ValueError(f"{path} : chaque règle de nettoyage requiert 'name' et 'reject_if'")
+
+    dedup = rules.get("dedup")
+    if dedup is not None:
+        if dedup.get("strategy") not in DEDUP_STRATEGIES:
+            raise ValueError(f"{path} : stratégie de dédoublonnage inconnue '{dedup.get('strategy')}'")
+        if not dedup.get("key"):
+            raise ValueError(f"{path} : 'dedup.key' est obligatoire")
+        if dedup["strategy"] == "aggregate" and not dedup.get("aggregates"):
+            raise ValueError(f"{path} : la stratégie 'aggregate' requiert 'aggregates'")
+        if dedup["strategy"] == "latest" and not dedup.get("order_by"):
+            raise ValueError(f"{path} : la stratégie 'latest' requiert 'order_by'")
+
+    # Sans colonne de changement déclarée, la table est reconstruite à chaque exécution
+    incremental = rules.setdefault("incremental", {"change_detection": "full"})
+    if incremental.get("change_detection") not in CHANGE_DETECTIONS:
+        raise ValueError(f"{path} : détection de changement inconnue '{incremental.get('change_detection')}'")
+    if incremental["change_detection"] == "watermark" and not incremental.get("column"):
+        raise ValueError(f"{path} : la détection 'watermark' requiert 'column'")
+    return rules
+
+
+def load_all_rules(rules_path: Path = RULES_PATH) -> dict:
+    return {source: load_rules(source, rules_path) for source in SOURCES}
+
+# ==============================================================================
+# 🧱 Compilation SQL
+# ==============================================================================
+def reject_condition(rules: dict) -> str:
+    """Prédicat vrai si la ligne viole au moins une règle (NULL compte comme non rejeté)."""
+    conditions = [f"({rule['reject_if']})" for rule in rules["clean"]]
+    if not conditions:
+        return "FALSE"
+    return f"COALESCE({' OR '.join(conditions)}, FALSE)"
+
+
+def compile_clean(rules: dict, relation: str) -> str:
+    """Requête de nettoyage seule : lignes de la relation ne violant aucune règle."""
+    return f"SELECT * FROM {relation} WHERE NOT {reject_condition(rules)}"
+
+
+def compile_clean_counts(rules: dict, relation: str, columns: list) -> str:
+    """Compteurs du nettoyage en une agrégation : total, lignes vides, rejets par règle et au total.
+
+    Une ligne peut violer plusieurs règles ; une condition NULL ne compte pas comme un rejet,
+    comme dans reject_condition.
+    """
+    empty_row = " AND ".join(f'"{col}" IS NULL' for col in columns) or "FALSE"
+    conditions = [empty_row] + [rule["reject_if"] for rule in rules["clean"]] + [reject_condition(rules)]
+    counters = ", ".join(f"COUNT(*) FILTER (WHERE {condition})" for condition in conditions)
+    return f"SELECT COUNT(*), {counters} FROM {relation}"
+
+
+def compile_filter(rules: dict, apply_clean: bool = True) -> str:
+    """Prédicat des lignes éligibles au dédoublonnage (règles de rejet + filtre 'dedup.where')."""
+    predicates = []
+    if apply_clean and rules["clean"]:
+        predicates.append(f"NOT {reject_condition(rules)}")
+    if rules["dedup"].get("where"):
+        predicates.append(f"({rules['dedup']['where']})")
+    return " AND ".join(predicates) or "TRUE"
+
+
+def compile_dedup(rules: dict, relation: str, apply_clean: bool = True) -> str:
+    """Requête fusionnée nettoyage + dédoublonnage en un seul parcours de la relation.
+
+    Avec apply_clean=False, la relation est supposée déjà nettoyée et seules
+    la stratégie de dédoublonnage et son éventuel filtre sont appliqués.
+    """
+    dedup = rules["dedup"]
+    where = f"WHERE {compile_filter(rules, apply_clean)}"
+    keys = ", ".join(dedup["key"])
+
+    if dedup["strategy"] == "aggregate":
+        aggregates = ",\n    ".join(
+            f"{func}({col}) AS {col}" for col, func in dedup["aggregates"].items()
+        )
+        return f"SELECT\n    {keys},\n    {aggregates}\nFROM {relation}\n{where}\nGROUP BY {keys}"
+
+    # 'latest' : première ligne par clé selon order_by, équivalent à ROW_NUMBER() = 1
+    # mais compilé en agrégat arg_max/arg_min sur la ligne entière. Un QUALIFY peut
+    # être réécrit par l'optimiseur en semi-jointure qui relit la source ; l'agrégat
+    # garde un seul parcours. Les NULL de tri passent en dernier (comme ORDER BY).
+    column, _, direction = dedup["order_by"].partition(" ")
+    pick = "arg_min" if direction.strip().upper() == "ASC" else "arg_max"
+    return (
+        f"SELECT UNNEST(COALESCE({pick}(src, {column}), any_value(src)))\n"
+        f"FROM (SELECT * FROM {relation}\n{where}) src\nGROUP BY {keys}"
+    )
+
+# ==============================================================================
+# 🔎 Plan d'exécution
+# ==============================================================================
+def explain(con, sql: str) -> str:
+    """Plan physique DuckDB de la requête (texte de EXPLAIN)."""
+    return "\n".join(row[1] for row in con.execute(f"EXPLAIN {sql}").fetchall())
+
+# ==============================================================================
+# 🚀 Affichage des requêtes compilées et de leurs plans
+# ==============================================================================
+if __name__ == "__main__":
+    import duckdb
+    from data_formats import data_file, source_reader
+
+    inputs_path = Path("/opt/airflow/data/inputs")
+    con = duckdb.connect()
+    for source in sys.argv[1:] or SOURCES:
+        rules = load_rules(source)
+        sql = compile_dedup(rules, source_reader(inputs_path / data_file(source)))
+        print(f"-- ===== {source} =====\n{sql};\n")
+        print(explain(con, sql))
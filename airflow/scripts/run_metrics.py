@@ -0,0 +1,72 @@
+# === Module partagé - Catalogue des métriques d'exécution ===
+# Chaque étape enregistre, au moment où elle les produit, ses compteurs de lignes,
+# tailles de fichiers, durées et agrégats clés dans la table 'run_metrics' de la base
+# DuckDB, sous l'identifiant de l'exécution en cours. Le rapport final (script 13)
+# se contente d'une lecture de cette table, quel que soit le volume des données.
+#
+# Identifiant d'exécution : PIPELINE_RUN_ID, sinon le run_id Airflow exposé aux
+# BashOperator (AIRFLOW_CTX_DAG_RUN_ID), sinon "local".
+
+import os
+
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+RUN_ID = os.getenv("PIPELINE_RUN_ID") or os.getenv("AIRFLOW_CTX_DAG_RUN_ID") or "local"
+METRICS_TABLE = "run_metrics"
+# Unités dont la valeur est entière (restituée en int par load_metrics)
+INTEGER_UNITS = ("lignes", "octets")
+
+# ==============================================================================
+# 🗃️ Table du catalogue
+# ==============================================================================
+def ensure_metrics(con):
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {METRICS_TABLE} (
+            run_id VARCHAR,
+            stage VARCHAR,
+            name VARCHAR,
+            value DOUBLE,
+            unit VARCHAR,
+            recorded_at TIMESTAMP,
+            PRIMARY KEY (run_id, name)
+        )
+    """)
+
+
+def record_metrics(con, stage: str, metrics: dict, unit: str = "lignes", run_id: str = RUN_ID):
+    """Enregistre (ou remplace, en cas de relance de l'étape) les métriques {nom : valeur}."""
+    ensure_metrics(con)
+    con.executemany(
+        f"INSERT OR REPLACE INTO {METRICS_TABLE} VALUES (?, ?, ?, ?, ?, CAST(now() AS TIMESTAMP))",
+        [[run_id, stage, name, None if value is None else float(value), unit] for name, value in metrics.items()],
+    )
+
+
+def load_metrics(con, run_id: str = RUN_ID) -> dict:
+    """Toutes les métriques de l'exécution, en une requête : {nom : valeur}."""
+    ensure_metrics(con)
+    rows = con.execute(
+        f"SELECT name, value, unit FROM {METRICS_TABLE} WHERE run_id = ?", [run_id]
+    ).fetchall()
+    return {
+        name: int(value) if unit in INTEGER_UNITS and value is not None else value
+        for name, value, unit in rows
+    }
+
+
+def copy_metrics(con, stage: str, from_run_id: str, run_id: str = RUN_ID) -> int:
+    """Reprend pour run_id les métriques d'une étape enregistrées par une exécution antérieure."""
+    ensure_metrics(con)
+    if from_run_id == run_id:
+        return 0
+    rows = con.execute(
+        f"SELECT stage, name, value, unit FROM {METRICS_TABLE} WHERE run_id = ? AND stage = ?",
+        [from_run_id, stage],
+    ).fetchall()
+    if rows:
+        con.executemany(
+            f"INSERT OR REPLACE INTO {METRICS_TABLE} VALUES (?, ?, ?, ?, ?, CAST(now() AS TIMESTAMP))",
+            [[run_id, *row] for row in rows],
+        )
+    return len(rows)
@@ -0,0 +1,281 @@
+# === Module partagé - Snapshots horodatés de la base DuckDB ===
+# Chaque snapshot est une entrée 'snapshot_<AAAAMMJJTHHMMSS>' du répertoire des snapshots,
+# le plus récent étant désigné par le lien symbolique 'latest'. Modes disponibles :
+# - "reflink" : clone copie-sur-écriture du fichier .duckdb (btrfs, XFS...) ; instantané,
+#   seuls les blocs modifiés ensuite occupent de la place,
+# - "parquet" : répertoire au format EXPORT DATABASE (schema.sql, load.sql, un Parquet par
+#   table) ; seules les tables dont l'empreinte a changé depuis le snapshot précédent sont
+#   réécrites, les autres sont des liens physiques vers les fichiers déjà exportés. Les
+#   tables modifiées par les étapes sont comparées par leur marqueur de version
+#   (incremental.mark_tables), sans être relues ; seules les autres sont hachées,
+# - "auto" (par défaut) : reflink si le système de fichiers le permet, parquet sinon,
+# - "copy" : copie complète du fichier (comportement historique).
+# Le fichier .duckdb vivant est modifié sur place : il n'est jamais lié physiquement.
+# Restauration : ouvrir le fichier cloné, ou IMPORT DATABASE '<répertoire du snapshot>'.
+
+import os
+import json
+import errno
+import fcntl
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+import duckdb
+from table_export import export_table
+from incremental import table_versions
+
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+SNAPSHOT_MODE = os.getenv("SNAPSHOT_MODE", "auto")
+SNAPSHOT_MODES = ("auto", "reflink", "parquet", "copy")
+# Rétention : nombre de snapshots conservés, et âge maximal en jours (0 = sans limite)
+SNAPSHOT_RETENTION = int(os.getenv("SNAPSHOT_RETENTION", "7"))
+SNAPSHOT_MAX_AGE_DAYS = int(os.getenv("SNAPSHOT_MAX_AGE_DAYS", "0"))
+
+SNAPSHOT_PREFIX = "snapshot_"
+TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S"
+LATEST_LINK = "latest"
+MANIFEST_FILE = "manifest.json"
+
+# ioctl Linux de clonage de fichier (FICLONE)
+FICLONE = 0x40049409
+
+# ==============================================================================
+# 🧭 Nommage et inventaire des snapshots
+# ==============================================================================
+def new_snapshot_name(snapshot_dir: Path, now: datetime = None) -> str:
+    base = f"{SNAPSHOT_PREFIX}{(now or datetime.now()).strftime(TIMESTAMP_FORMAT)}"
+    name, i = base, 1
+    while any(Path(snapshot_dir).glob(f"{name}*")):
+        name, i = f"{base}_{i}", i + 1
+    return name
+
+
+def snapshot_time(entry: Path) -> datetime:
+    stamp = entry.name[len(SNAPSHOT_PREFIX):].split(".")[0].split("_")[0]
+    return datetime.strptime(stamp, TIMESTAMP_FORMAT)
+
+
+def list_snapshots(snapshot_dir: Path) -> list:
+    """Snapshots terminés, du plus ancien au plus récent."""
+    entries = [
+        p for p in Path(snapshot_dir).glob(f"{SNAPSHOT_PREFIX}*")
+        if p.is_dir() or p.suffix == ".duckdb"
+    ]
+    return sorted(entries, key=lambda p: (snapshot_time(p), p.name))
+
+
+def update_latest(snapshot_dir: Path, target: Path):
+    """Fait pointer 'latest' vers le snapshot donné (remplacement atomique du lien)."""
+    link = Path(snapshot_dir) / LATEST_LINK
+    tmp_link = Path(snapshot_dir) / f".{LATEST_LINK}.tmp"
+    if tmp_link.is_symlink() or tmp_link.exists():
+        tmp_link.unlink()
+    tmp_link.symlink_to(target.name)
+    os.replace(tmp_link, link)
+
+# ==============================================================================
+# 🪞 Snapshot du fichier : reflink ou copie
+# ==============================================================================
+def reflink(source: Path, dest: Path):
+    """Clone copie-sur-écriture ; OSError si le système de fichiers ne le permet pas."""
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            dest.unlink()
+            raise
+
+
+def reflink_supported(directory: Path) -> bool:
+    probe_src = Path(directory) / ".reflink_probe.src"
+    probe_dst = Path(directory) / ".reflink_probe.dst"
+    try:
+        probe_src.write_bytes(b"reflink")
+        reflink(probe_src, probe_dst)
+        return True
+    except OSError as e:
+        if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EXDEV, errno.ENOSYS):
+            return False
+        raise
+    finally:
+        for probe in (probe_src, probe_dst):
+            if probe.exists():
+                probe.unlink()
+
+
+def snapshot_file(source: Path, snapshot_dir: Path, name: str, mode: str) -> dict:
+    dest = Path(snapshot_dir) / f"{name}.duckdb"
+    tmp = Path(snapshot_dir) / f".{name}.duckdb.tmp"
+    if mode == "reflink":
+        reflink(source, tmp)
+    else:
+        shutil.copy2(source, tmp)
+    os.replace(tmp, dest)
+    return {"path": dest, "mode": mode, "tables_exportees": None, "tables_liees": None}
+
+# ==============================================================================
+# 🧾 Snapshot Parquet incrémental
+# ==============================================================================
+def table_fingerprints(con, only: list = None) -> dict:
+    """Empreinte de chaque table (ou des tables 'only' existantes).
+
+    Schéma et marqueur de version pour une table marquée par les étapes ; schéma, nombre
+    de lignes et somme des hash de lignes (lecture complète) pour les autres.
+    """
+    # DISTINCT / DESCRIBE : avec une base attachée (branches), une table présente dans les
+    # deux bases n'est décrite qu'une fois, telle que la requête la résout
+    tables = [row[0] for row in con.execute("""
+        SELECT DISTINCT table_name FROM duckdb_tables()
+        WHERE schema_name = 'main' AND NOT temporary
+        ORDER BY table_name
+    """).fetchall()]
+    if only is not None:
+        tables = [table for table in tables if table in only]
+
+    versions = table_versions(con)
+    fingerprints = {}
+    for table in tables:
+        columns = [row[:2] for row in con.execute(f'DESCRIBE "{table}"').fetchall()]
+        fingerprints[table] = {"schema": [f"{name} {data_type}" for name, data_type in columns]}
+        if table in versions:
+            fingerprints[table]["version"] = versions[table]
+            continue
+        nb_rows, row_hash = con.execute(
+            f'SELECT COUNT(*), COALESCE(SUM(hash(t)::HUGEINT), 0) FROM "{table}" t'
+        ).fetchone()
+        fingerprints[table].update({"lignes": nb_rows, "empreinte": f"{duckdb.__version__}:{row_hash}"})
+    return fingerprints
+
+
+def latest_manifest(snapshot_dir: Path):
+    """Manifeste du snapshot Parquet le plus récent (ou None)."""
+    for entry in reversed(list_snapshots(snapshot_dir)):
+        manifest = entry / MANIFEST_FILE
+        if entry.is_dir() and manifest.exists():
+            return entry, json.loads(manifest.read_text())
+    return None, None
+
+
+def _schema_sql(con) -> str:
+    statements = [row[0] for row in con.execute("""
+        SELECT sql FROM duckdb_tables()
+        WHERE schema_name = 'main' AND NOT temporary
+        ORDER BY table_name
+    """).fetchall()]
+    statements += [row[0] for row in con.execute("""
+        SELECT sql FROM duckdb_views()
+        WHERE schema_name = 'main' AND NOT internal AND NOT temporary
+        ORDER BY view_name
+    """).fetchall()]
+    return "\n".join(s if s.rstrip().endswith(";") else f"{s};" for s in statements) + "\n"
+
+
+def snapshot_parquet(con, snapshot_dir: Path, name: str) -> dict:
+    """Exporte les tables modifiées depuis le dernier snapshot Parquet, lie les autres."""
+    previous_dir, previous = latest_manifest(snapshot_dir)
+    previous_tables = previous["tables"] if previous else {}
+
+    dest = Path(snapshot_dir) / name
+    tmp = Path(snapshot_dir) / f".{name}.tmp"
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    exported, linked = [], []
+    try:
+        fingerprints = table_fingerprints(con)
+        for table, fingerprint in fingerprints.items():
+            filename = f"{table}.parquet"
+            unchanged = previous_tables.get(table, {}).get("fichier") and all(
+                previous_tables[table].get(k) == v for k, v in fingerprint.items()
+            )
+            if unchanged and (previous_dir / filename).exists():
+                try:
+                    os.link(previous_dir / filename, tmp / filename)
+                except OSError:
+                    shutil.copy2(previous_dir / filename, tmp / filename)
+                linked.append(table)
+            else:
+                export_table(con, f'"{table}"', tmp / filename, engine="copy")
+                exported.append(table)
+            fingerprint["fichier"] = filename
+
+        (tmp / "schema.sql").write_text(_schema_sql(con))
+        (tmp / "load.sql").write_text("".join(
+            f"COPY \"{table}\" FROM '{dest / info['fichier']}' (FORMAT 'parquet');\n"
+            for table, info in fingerprints.items()
+        ))
+        (tmp / MANIFEST_FILE).write_text(json.dumps({
+            "cree_le": datetime.now().isoformat(timespec="seconds"),
+            "snapshot_precedent": previous_dir.name if previous_dir else None,
+            "tables": fingerprints,
+        }, indent=2, ensure_ascii=False))
+        os.replace(tmp, dest)
+    finally:
+        if tmp.exists():
+            shutil.rmtree(tmp)
+
+    return {"path": dest, "mode": "parquet", "tables_exportees": exported, "tables_liees": linked}
+
+# ==============================================================================
+# 🧹 Rétention
+# ==============================================================================
+def apply_retention(snapshot_dir: Path, keep: int = SNAPSHOT_RETENTION,
+                    max_age_days: int = SNAPSHOT_MAX_AGE_DAYS, now: datetime = None) -> list:
+    """Supprime les snapshots au-delà des 'keep' plus récents ou plus vieux que 'max_age_days'.
+
+    Le snapshot le plus récent est toujours conservé.
+    """
+    snapshots = list_snapshots(snapshot_dir)
+    if not snapshots:
+        return []
+
+    limit = (now or datetime.now()) - timedelta(days=max_age_days) if max_age_days > 0 else None
+    removed = []
+    for i, entry in enumerate(snapshots[:-1]):
+        too_many = len(snapshots) - i > max(keep, 1)
+        too_old = limit is not None and snapshot_time(entry) < limit
+        if too_many or too_old:
+            if entry.is_dir():
+                shutil.rmtree(entry)
+            else:
+                entry.unlink()
+            removed.append(entry.name)
+    return removed
+
+# ==============================================================================
+# 💾 Création d'un snapshot
+# ==============================================================================
+def resolve_mode(snapshot_dir: Path, mode: str = SNAPSHOT_MODE) -> str:
+    """Mode effectif : "auto" devient "reflink" ou "parquet" selon le système de fichiers."""
+    if mode not in SNAPSHOT_MODES:
+        raise ValueError(f"Mode de snapshot inconnu : {mode} (attendu : {', '.join(SNAPSHOT_MODES)})")
+    if mode == "auto":
+        Path(snapshot_dir).mkdir(parents=True, exist_ok=True)
+        return "reflink" if reflink_supported(snapshot_dir) else "parquet"
+    return mode
+
+
+def create_snapshot(source: Path, snapshot_dir: Path, mode: str = SNAPSHOT_MODE, con=None) -> dict:
+    """Crée un snapshot de 'source' et met à jour le lien 'latest'.
+
+    'con' (connexion ouverte sur 'source') n'est utilisée qu'en mode parquet ;
+    les modes fichier exigent que la base soit fermée et checkpointée.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    mode = resolve_mode(snapshot_dir, mode)
+
+    name = new_snapshot_name(snapshot_dir)
+    if mode == "parquet":
+        if con is None:
+            raise ValueError("Le mode parquet nécessite une connexion DuckDB ouverte.")
+        result = snapshot_parquet(con, snapshot_dir, name)
+    else:
+        result = snapshot_file(source, snapshot_dir, name, mode)
+
+    update_latest(snapshot_dir, result["path"])
+    return result
@@ -0,0 +1,417 @@
+# === Module partagé - Cache des étapes par empreinte de contenu ===
+# Une relance ou un re-déclenchement de bottleneck_pipeline ré-exécute toutes les étapes,
+# même quand leurs entrées sont identiques à la dernière exécution réussie. Ce module
+# mémorise les étapes déclarées dans CACHED_STAGES :
+# - l'empreinte d'une étape combine le code du script et des modules qu'il utilise,
+#   les fichiers d'entrée (SHA-256), les tables d'entrée (schéma et marqueur de version
+#   posé par l'étape qui les écrit, sans relecture : voir incremental.mark_tables et
+#   snapshot_store.table_fingerprints) et les variables d'environnement qui la règlent,
+# - après une exécution réussie, l'empreinte est enregistrée avec celles des sorties
+#   (tables et fichiers) et une copie des fichiers produits,
+# - à l'exécution suivante, si l'empreinte est connue et que les tables produites sont
+#   intactes, l'étape est ignorée : les fichiers manquants ou modifiés sont restaurés
+#   depuis la copie, re-synchronisés dans MinIO pour les étapes qui les y envoient, et
+#   les métriques de l'étape reprises pour l'exécution en cours.
+#
+# Le registre est partagé par tous les workers Celery : Redis (stack-redis, par défaut)
+# ou une base DuckDB dédiée sur le volume de données. S'il est injoignable, l'étape
+# s'exécute normalement.
+#
+#     python stage_cache.py 09_fusion     ➝ exécute 09_fusion.py sauf si son empreinte est connue
+#     python stage_cache.py --evict       ➝ applique la politique d'éviction
+#
+# STAGE_CACHE=0 ou FULL_REBUILD=1 désactivent le cache.
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import subprocess
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import duckdb
+from loguru import logger
+from fetch_cache import sha256_file
+from data_formats import CLEAN_EXPORT, CLEAN_TABLES, DEDUP_INPUT, data_file
+from incremental import FULL_REBUILD
+from snapshot_store import table_fingerprints
+from run_metrics import RUN_ID, copy_metrics
+from xlsx_export import EXCEL_EXPORT
+from storage_backend import INPUTS_PREFIX, OUTPUTS_PREFIX, remote_reads, s3_url, source_etag
+from minio_storage import upload_many
+
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+STAGE_CACHE = os.getenv("STAGE_CACHE", "1") == "1"
+# STAGE_CACHE_BACKEND : "redis" (par défaut, partagé via stack-redis) ou "duckdb"
+STAGE_CACHE_BACKEND = os.getenv("STAGE_CACHE_BACKEND", "redis")
+STAGE_CACHE_REDIS_URL = os.getenv("STAGE_CACHE_REDIS_URL", "redis://stack-redis:6379/1")
+STAGE_CACHE_DB = Path(os.getenv("STAGE_CACHE_DB", "/opt/airflow/data/cache/stage_cache.duckdb"))
+# Copies des fichiers produits, par étape et par empreinte
+STAGE_CACHE_DIR = Path(os.getenv("STAGE_CACHE_DIR", "/opt/airflow/data/cache/stages"))
+# Éviction : nombre d'empreintes conservées par étape, âge maximal (0 = sans limite)
+STAGE_CACHE_MAX_ENTRIES = int(os.getenv("STAGE_CACHE_MAX_ENTRIES", "5"))
+STAGE_CACHE_MAX_AGE_DAYS = int(os.getenv("STAGE_CACHE_MAX_AGE_DAYS", "30"))
+
+DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
+INPUTS_PATH = Path("/opt/airflow/data/inputs")
+OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
+SCRIPTS_PATH = Path(__file__).resolve().parent
+RULES_FILES = sorted((SCRIPTS_PATH / "rules").glob("*.json"))
+SOURCES = ["erp", "web", "liaison"]
+DEDUP_TABLES = [f"{source}_dedup" for source in SOURCES]
+
+
+def exchange_files(prefix: str, local_dir: Path, names: list) -> list:
+    """Fichiers d'échange lus par une étape : chemins locaux, ou URL s3:// (STORAGE_BACKEND=s3)."""
+    if remote_reads():
+        return [s3_url(f"{prefix}{name}") for name in names]
+    return [local_dir / name for name in names]
+
+# ==============================================================================
+# 📋 Étapes mémorisées : entrées, sorties et métriques reprises en cas de saut
+# ==============================================================================
+# code    : script et modules partagés qu'il importe (tests/test_stage_cache.py le vérifie)
+# files   : fichiers d'entrée ; tables : tables d'entrée ; env : variables de réglage
+#           les journaux '<source>_dedup_delta' ne sont pas des entrées de 09 : il les vide
+#           et les re-marque lui-même, et 08 re-marque toujours '<source>_dedup' avec eux
+# outputs : tables et fichiers (dans OUTPUTS_PATH) produits par l'étape ; les tables
+#           vidées ou modifiées par une étape suivante (journaux '<source>_dedup_delta')
+#           n'y figurent pas, sans quoi la sortie ne serait jamais retrouvée intacte
+# upload  : les fichiers produits sont envoyés dans MinIO (OUTPUTS_PREFIX) par l'étape
+# metrics : nom d'étape sous lequel run_metrics enregistre ses métriques
+CACHED_STAGES = {
+    "05_clean_data": {
+        "code": ["05_clean_data.py", "rules_engine.py", "data_formats.py", "table_export.py", "storage_backend.py",
+                 "incremental.py", "duckdb_settings.py", "run_metrics.py"],
+        "files": exchange_files(INPUTS_PREFIX, INPUTS_PATH, [data_file(source) for source in SOURCES]) + RULES_FILES,
+        "tables": [],
+        "env": ["DATA_FORMAT", "PARQUET_COMPRESSION", "CLEAN_EXPORT"],
+        "outputs": {
+            "tables": CLEAN_TABLES,
+            "files": ["resume_stats.csv", "resume_exclusions.csv"]
+            + ([data_file(table) for table in CLEAN_TABLES] if CLEAN_EXPORT == "eager" else []),
+        },
+        "metrics": "clean",
+    },
+    "08_dedoublonnage": {
+        "code": ["08_dedoublonnage.py", "rules_engine.py", "incremental.py", "fusion_engine.py", "data_formats.py",
+                 "storage_backend.py", "duckdb_settings.py", "run_metrics.py"],
+        "files": RULES_FILES + (
+            exchange_files(INPUTS_PREFIX, INPUTS_PATH, [data_file(source) for source in SOURCES]) if DEDUP_INPUT == "raw"
+            else exchange_files(OUTPUTS_PREFIX, OUTPUTS_PATH, [data_file(f"{source}_clean") for source in SOURCES])
+            if DEDUP_INPUT == "clean"
+            else []
+        ),
+        "tables": CLEAN_TABLES if DEDUP_INPUT == "table" else [],
+        "env": ["DEDUP_INPUT", "DATA_FORMAT", "FUSION_ENGINE"],
+        "outputs": {"tables": DEDUP_TABLES, "files": []},
+        "metrics": "dedup",
+    },
+    "09_fusion": {
+        "code": ["09_fusion.py", "incremental.py", "fusion_engine.py", "table_export.py", "duckdb_settings.py",
+                 "run_metrics.py"],
+        "files": [],
+        "tables": DEDUP_TABLES,
+        "env": ["FUSION_ENGINE"],
+        "outputs": {"tables": ["fusion"], "files": ["fusion.csv"]},
+        "metrics": "fusion",
+    },
+    "11_calcul_ca": {
+        "code": ["11_calcul_ca.py", "table_export.py", "xlsx_export.py", "run_metrics.py", "incremental.py",
+                 "duckdb_settings.py", "minio_storage.py"],
+        "files": [],
+        "tables": ["fusion"],
+        "env": ["EXCEL_EXPORT"],
+        "outputs": {
+            "tables": ["ca_par_produit", "ca_total"],
+            "files": ["ca_par_produit.csv", "ca_total.csv"]
+            + (["ca_par_produit.xlsx"] if EXCEL_EXPORT == "eager" else []),
+        },
+        "upload": True,
+        "metrics": "ca",
+    },
+    "12_calcul_zscore_upload": {
+        "code": ["12_calcul_zscore_upload.py", "table_export.py", "stats_sketches.py", "run_metrics.py",
+                 "incremental.py", "duckdb_settings.py", "minio_storage.py"],
+        "files": [],
+        "tables": ["fusion"],
+        "env": ["ZSCORE_THRESHOLD", "ZSCORE_GROUPS", "ZSCORE_ENGINE"],
+        "outputs": {"tables": ["zscore_vins"], "files": ["vins_millesimes.csv", "vins_ordinaires.csv"]},
+        "upload": True,
+        "metrics": "zscore",
+    },
+}
+
+# ==============================================================================
+# 🔐 Empreintes
+# ==============================================================================
+def _file_digest(path: Path):
+    if str(path).startswith("s3://"):
+        etag = source_etag(str(path).split("/", 3)[3])
+        return f"etag:{etag}" if etag else None
+    return sha256_file(path) if Path(path).exists() else None
+
+
+def stage_fingerprint(stage: str, con) -> str:
+    """Empreinte des entrées de l'étape : code, fichiers, tables et variables de réglage."""
+    spec = CACHED_STAGES[stage]
+    payload = {
+        "etape": stage,
+        "code": {name: _file_digest(SCRIPTS_PATH / name) for name in spec["code"]},
+        "fichiers": {str(path): _file_digest(path) for path in spec["files"]},
+        "tables": table_fingerprints(con, spec["tables"]) if spec["tables"] else {},
+        "env": {name: os.getenv(name) for name in spec["env"]},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def output_fingerprints(stage: str, con, outputs_path: Path = OUTPUTS_PATH) -> dict:
+    outputs = CACHED_STAGES[stage]["outputs"]
+    return {
+        "tables": table_fingerprints(con, outputs["tables"]),
+        "fichiers": {name: _file_digest(outputs_path / name) for name in outputs["files"]},
+    }
+
+# ==============================================================================
+# 🗃️ Registres partagés
+# ==============================================================================
+class RedisStore:
+    """Entrées 'stage_cache:<étape>:<empreinte>' et index trié par date par étape."""
+
+    def __init__(self, url: str = STAGE_CACHE_REDIS_URL):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=5)
+
+    def get(self, stage: str, fingerprint: str):
+        value = self.client.get(f"stage_cache:{stage}:{fingerprint}")
+        return json.loads(value) if value else None
+
+    def put(self, stage: str, fingerprint: str, entry: dict):
+        pipe = self.client.pipeline()
+        pipe.set(f"stage_cache:{stage}:{fingerprint}", json.dumps(entry))
+        pipe.zadd(f"stage_cache:index:{stage}", {fingerprint: time.time()})
+        pipe.execute()
+
+    def entries(self, stage: str) -> list:
+        """[(empreinte, date d'enregistrement)] du plus récent au plus ancien."""
+        rows = self.client.zrevrange(f"stage_cache:index:{stage}", 0, -1, withscores=True)
+        return [(fp.decode(), datetime.fromtimestamp(score, timezone.utc)) for fp, score in rows]
+
+    def delete(self, stage: str, fingerprint: str):
+        pipe = self.client.pipeline()
+        pipe.delete(f"stage_cache:{stage}:{fingerprint}")
+        pipe.zrem(f"stage_cache:index:{stage}", fingerprint)
+        pipe.execute()
+
+
+class DuckDBStore:
+    """Table 'stage_cache' d'une base dédiée ; connexion courte et réessayée si verrouillée."""
+
+    def __init__(self, path: Path = STAGE_CACHE_DB, attempts: int = 10):
+        self.path = Path(path)
+        self.attempts = attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._execute("""
+            CREATE TABLE IF NOT EXISTS stage_cache (
+                stage VARCHAR,
+                fingerprint VARCHAR,
+                entry VARCHAR,
+                created_at TIMESTAMP,
+                PRIMARY KEY (stage, fingerprint)
+            )
+        """)
+
+    def _execute(self, sql: str, params: list = None) -> list:
+        for attempt in range(self.attempts):
+            try:
+                con = duckdb.connect(str(self.path))
+            except duckdb.IOException:
+                # Base ouverte par un autre worker : nouvel essai
+                if attempt == self.attempts - 1:
+                    raise
+                time.sleep(0.5)
+                continue
+            try:
+                result = con.execute(sql, params or [])
+                return result.fetchall() if result.description else []
+            finally:
+                con.close()
+
+    def get(self, stage: str, fingerprint: str):
+        rows = self._execute("SELECT entry FROM stage_cache WHERE stage = ? AND fingerprint = ?", [stage, fingerprint])
+        return json.loads(rows[0][0]) if rows else None
+
+    def put(self, stage: str, fingerprint: str, entry: dict):
+        self._execute(
+            "INSERT OR REPLACE INTO stage_cache VALUES (?, ?, ?, ?)",
+            [stage, fingerprint, json.dumps(entry), datetime.now(timezone.utc).replace(tzinfo=None)],
+        )
+
+    def entries(self, stage: str) -> list:
+        rows = self._execute(
+            "SELECT fingerprint, created_at FROM stage_cache WHERE stage = ? ORDER BY created_at DESC", [stage]
+        )
+        return [(fp, created_at.replace(tzinfo=timezone.utc)) for fp, created_at in rows]
+
+    def delete(self, stage: str, fingerprint: str):
+        self._execute("DELETE FROM stage_cache WHERE stage = ? AND fingerprint = ?", [stage, fingerprint])
+
+
+STORES = {"redis": RedisStore, "duckdb": DuckDBStore}
+
+
+def open_store(backend: str = STAGE_CACHE_BACKEND):
+    if backend not in STORES:
+        raise ValueError(f"Registre de cache inconnu : {backend} (attendu : {', '.join(STORES)})")
+    return STORES[backend]()
+
+# ==============================================================================
+# ♻️ Consultation, enregistrement et éviction
+# ==============================================================================
+def _entry_dir(stage: str, fingerprint: str, cache_dir: Path) -> Path:
+    return Path(cache_dir) / stage / fingerprint
+
+
+def reuse(stage: str, entry: dict, fingerprint: str, con,
+          outputs_path: Path = OUTPUTS_PATH, cache_dir: Path = STAGE_CACHE_DIR) -> bool:
+    """Vrai si les sorties enregistrées sont en place (fichiers restaurés au besoin)."""
+    current = output_fingerprints(stage, con, outputs_path)
+    if current["tables"] != entry["sorties"]["tables"]:
+        return False
+
+    for name, digest in entry["sorties"]["fichiers"].items():
+        if current["fichiers"].get(name) == digest:
+            continue
+        copy = _entry_dir(stage, fingerprint, cache_dir) / name
+        if _file_digest(copy) != digest:
+            return False
+        outputs_path.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(copy, outputs_path / name)
+        logger.info(f"📦 {name} restauré depuis le cache de {stage}")
+    return True
+
+
+def publish(stage: str, outputs_path: Path = OUTPUTS_PATH) -> list:
+    """Re-synchronise dans MinIO les fichiers d'une étape ignorée (seuls les objets différents sont envoyés)."""
+    return upload_many([
+        (outputs_path / name, f"{OUTPUTS_PREFIX}{name}") for name in CACHED_STAGES[stage]["outputs"]["files"]
+    ], sync=True)
+
+
+def record(store, stage: str, fingerprint: str, con, run_id: str = RUN_ID,
+           outputs_path: Path = OUTPUTS_PATH, cache_dir: Path = STAGE_CACHE_DIR):
+    outputs = output_fingerprints(stage, con, outputs_path)
+    entry_dir = _entry_dir(stage, fingerprint, cache_dir)
+    entry_dir.mkdir(parents=True, exist_ok=True)
+    for name, digest in outputs["fichiers"].items():
+        if digest is not None:
+            shutil.copy2(outputs_path / name, entry_dir / name)
+    store.put(stage, fingerprint, {
+        "run_id": run_id,
+        "enregistre_le": datetime.now(timezone.utc).isoformat(),
+        "sorties": outputs,
+    })
+
+
+def evict(store, stages: list = None, max_entries: int = STAGE_CACHE_MAX_ENTRIES,
+          max_age_days: int = STAGE_CACHE_MAX_AGE_DAYS, cache_dir: Path = STAGE_CACHE_DIR) -> list:
+    """Supprime, par étape, les empreintes au-delà des max_entries plus récentes ou trop anciennes."""
+    limit = datetime.now(timezone.utc) - timedelta(days=max_age_days) if max_age_days > 0 else None
+    removed = []
+    for stage in stages or CACHED_STAGES:
+        for rank, (fingerprint, created_at) in enumerate(store.entries(stage)):
+            if rank < max_entries and (limit is None or created_at >= limit):
+                continue
+            store.delete(stage, fingerprint)
+            shutil.rmtree(_entry_dir(stage, fingerprint, cache_dir), ignore_errors=True)
+            removed.append((stage, fingerprint))
+    return removed
+
+
+def run_cached(stage: str, execute, connect, run_id: str = RUN_ID, store=None,
+               outputs_path: Path = OUTPUTS_PATH, cache_dir: Path = STAGE_CACHE_DIR) -> int:
+    """Exécute 'execute()' (qui retourne un code) sauf si l'étape peut être reprise du cache.
+
+    'connect()' ouvre la base du pipeline ; la connexion est refermée avant execute(),
+    l'étape exécutée en sous-processus devant pouvoir ouvrir la base en écriture.
+    """
+    if not STAGE_CACHE or FULL_REBUILD or stage not in CACHED_STAGES:
+        return execute()
+
+    fingerprint = None
+    try:
+        store = store or open_store()
+        con = connect()
+        try:
+            fingerprint = stage_fingerprint(stage, con)
+            entry = store.get(stage, fingerprint)
+            if entry and reuse(stage, entry, fingerprint, con, outputs_path, cache_dir):
+                # Le bucket peut avoir divergé des fichiers locaux : envoi des seuls objets différents ;
+                # un échec d'envoi fait exécuter l'étape normalement (voir l'exception ci-dessous)
+                if CACHED_STAGES[stage].get("upload"):
+                    publish(stage, outputs_path)
+                nb_metrics = copy_metrics(con, CACHED_STAGES[stage]["metrics"], entry["run_id"], run_id)
+                logger.success(
+                    f"♻️ {stage} ignorée : entrées identiques à l'exécution '{entry['run_id']}' "
+                    f"(empreinte {fingerprint[:12]}, {nb_metrics} métrique(s) reprise(s))"
+                )
+                return 0
+        finally:
+            con.close()
+    except Exception as e:
+        logger.warning(f"⚠️ Cache des étapes indisponible pour {stage}, exécution normale : {e}")
+        store = fingerprint = None
+
+    code = execute()
+    if code == 0 and fingerprint is not None:
+        try:
+            con = connect()
+            try:
+                record(store, stage, fingerprint, con, run_id, outputs_path, cache_dir)
+            finally:
+                con.close()
+            evict(store, [stage], cache_dir=cache_dir)
+            logger.info(f"💾 {stage} mémorisée (empreinte {fingerprint[:12]})")
+        except Exception as e:
+            logger.warning(f"⚠️ Impossible de mémoriser {stage} : {e}")
+    return code
+
+# ==============================================================================
+# 🚀 Point d'entrée (tâches du DAG)
+# ==============================================================================
+def main(args: list):
+    LOGS_PATH = Path(os.getenv("AIRFLOW_LOG_PATH", "logs"))
+    LOGS_PATH.mkdir(parents=True, exist_ok=True)
+    logger.remove()
+    logger.add(sys.stdout, level="INFO")
+    logger.add(LOGS_PATH / "stage_cache.log", level="INFO", rotation="500 KB")
+
+    if args == ["--evict"]:
+        try:
+            removed = evict(open_store())
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de l'éviction du cache des étapes : {e}")
+            sys.exit(1)
+        logger.success(f"🧹 {len(removed)} empreinte(s) évincée(s) du cache des étapes.")
+        return
+
+    if len(args) != 1 or not (SCRIPTS_PATH / f"{args[0]}.py").exists():
+        logger.error(f"❌ Usage : stage_cache.py <étape> | --evict (étapes mémorisées : {', '.join(CACHED_STAGES)})")
+        sys.exit(1)
+
+    from duckdb_settings import connect_duckdb
+    stage = args[0]
+    code = run_cached(
+        stage,
+        execute=lambda: subprocess.run([sys.executable, str(SCRIPTS_PATH / f"{stage}.py")]).returncode,
+        connect=lambda: connect_duckdb(DUCKDB_PATH, stage="cache"),
+    )
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,278 @@
+# === Module partagé - Statistiques en flux et fusionnables (détection d'anomalies) ===
+# Ce module calcule les statistiques d'une colonne numérique sans la charger en mémoire :
+# - Moments : moyenne / variance par Welford, étendu aux lots par la formule de Chan,
+# - TDigest : quantiles approchés (médiane, MAD) en mémoire bornée par 'compression',
+# - ColumnProfile : les deux réunis, avec Z-score et Z-score robuste.
+# Chaque état se met à jour lot par lot (update), se fusionne avec l'état d'un autre
+# lot ou d'une autre partition (merge) et se sérialise en dict (to_dict / from_dict) :
+# des workers parallèles profilent chacun une partition, puis les états sont fusionnés.
+# Le score d'une ligne n'a besoin que du résumé (summary) : une seconde passe en flux suffit.
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+DEFAULT_COMPRESSION = 500
+DEFAULT_BATCH_ROWS = 100000
+# Z-score robuste : 0.6745 * (x - médiane) / MAD (Iglewicz & Hoaglin)
+ROBUST_Z_FACTOR = 0.6745
+DEFAULT_Z_THRESHOLD = 2.0
+DEFAULT_ROBUST_Z_THRESHOLD = 3.5
+
+
+def _as_values(values) -> np.ndarray:
+    values = np.asarray(values, dtype=float).ravel()
+    return values[~np.isnan(values)]
+
+# ==============================================================================
+# 📐 Moments (Welford / Chan)
+# ==============================================================================
+class Moments:
+    """Nombre, moyenne, somme des carrés des écarts (M2), min et max."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _combine(self, count: int, mean: float, m2: float, minimum: float, maximum: float):
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    def update(self, values) -> "Moments":
+        values = _as_values(values)
+        if values.size:
+            mean = float(values.mean())
+            self._combine(values.size, mean, float(((values - mean) ** 2).sum()),
+                          float(values.min()), float(values.max()))
+        return self
+
+    def merge(self, other: "Moments") -> "Moments":
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        return self
+
+    def variance(self, ddof: int = 1) -> float:
+        return self.m2 / (self.count - ddof) if self.count > ddof else math.nan
+
+    def std(self, ddof: int = 1) -> float:
+        return math.sqrt(self.variance(ddof))
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "mean": self.mean, "m2": self.m2, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "Moments":
+        moments = cls()
+        moments.count, moments.mean, moments.m2 = state["count"], state["mean"], state["m2"]
+        moments.min, moments.max = state["min"], state["max"]
+        return moments
+
+# ==============================================================================
+# 🎯 Quantiles approchés (t-digest fusionnant, fonction d'échelle k1)
+# ==============================================================================
+class TDigest:
+    """Résumé de distribution en centroïdes (moyenne, poids), denses aux extrémités."""
+
+    def __init__(self, compression: int = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.buffer_size = 10 * compression
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer = []
+        self._buffered = 0
+
+    def _merge_centroids(self, means: np.ndarray, weights: np.ndarray):
+        order = np.argsort(means, kind="mergesort")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        # Un centroïde couvre au plus une unité de k(q) = δ/2π · asin(2q − 1)
+        k = np.floor(self.compression / (2 * math.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1)))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        merged_weights = np.add.reduceat(weights, starts)
+        merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+        self._means, self._weights = merged_means, merged_weights
+
+    def _flush(self):
+        if self._buffer:
+            values = np.concatenate(self._buffer)
+            self._buffer, self._buffered = [], 0
+            self._merge_centroids(np.r_[self._means, values], np.r_[self._weights, np.ones(values.size)])
+
+    def update(self, values) -> "TDigest":
+        values = _as_values(values)
+        if values.size:
+            self.count += values.size
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+            self._buffer.append(values)
+            self._buffered += values.size
+            if self._buffered >= self.buffer_size:
+                self._flush()
+        return self
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        self._flush()
+        other._flush()
+        if other.count:
+            self.count += other.count
+            self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+            self._merge_centroids(np.r_[self._means, other._means], np.r_[self._weights, other._weights])
+        return self
+
+    def _curve(self):
+        """Points (valeur, rang cumulé) interpolés linéairement entre min et max."""
+        self._flush()
+        centers = np.cumsum(self._weights) - self._weights / 2
+        return np.r_[self.min, self._means, self.max], np.r_[0.0, centers, float(self.count)]
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return math.nan
+        values, ranks = self._curve()
+        return float(np.interp(q * self.count, ranks, values))
+
+    def cdf(self, x: float) -> float:
+        if not self.count:
+            return math.nan
+        values, ranks = self._curve()
+        return float(np.interp(x, values, ranks)) / self.count
+
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+    def mad(self) -> float:
+        """Écart absolu médian : plus petit d tel que P(|x − médiane| ≤ d) ≥ 1/2 (bissection sur la CDF)."""
+        if not self.count:
+            return math.nan
+        median = self.median()
+        low, high = 0.0, self.max - self.min
+        for _ in range(100):
+            mid = (low + high) / 2
+            if self.cdf(median + mid) - self.cdf(median - mid) >= 0.5:
+                high = mid
+            else:
+                low = mid
+        return high
+
+    def to_dict(self) -> dict:
+        self._flush()
+        return {
+            "compression": self.compression, "count": self.count, "min": self.min, "max": self.max,
+            "means": self._means.tolist(), "weights": self._weights.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "TDigest":
+        digest = cls(state["compression"])
+        digest.count, digest.min, digest.max = state["count"], state["min"], state["max"]
+        digest._means = np.asarray(state["means"], dtype=float)
+        digest._weights = np.asarray(state["weights"], dtype=float)
+        return digest
+
+# ==============================================================================
+# 📊 Profil d'une colonne : moments + quantiles, scores
+# ==============================================================================
+class ColumnProfile:
+    def __init__(self, compression: int = DEFAULT_COMPRESSION):
+        self.moments = Moments()
+        self.digest = TDigest(compression)
+
+    def update(self, values) -> "ColumnProfile":
+        values = _as_values(values)
+        self.moments.update(values)
+        self.digest.update(values)
+        return self
+
+    def merge(self, other: "ColumnProfile") -> "ColumnProfile":
+        self.moments.merge(other.moments)
+        self.digest.merge(other.digest)
+        return self
+
+    def summary(self) -> dict:
+        return {
+            "count": self.moments.count,
+            "mean": self.moments.mean if self.moments.count else math.nan,
+            "std": self.moments.std(),
+            "min": self.moments.min,
+            "max": self.moments.max,
+            "median": self.digest.median(),
+            "mad": self.digest.mad(),
+        }
+
+    def to_dict(self) -> dict:
+        return {"moments": self.moments.to_dict(), "digest": self.digest.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "ColumnProfile":
+        profile = cls(state["digest"]["compression"])
+        profile.moments = Moments.from_dict(state["moments"])
+        profile.digest = TDigest.from_dict(state["digest"])
+        return profile
+
+
+def zscore(values, summary: dict) -> np.ndarray:
+    return (np.asarray(values, dtype=float) - summary["mean"]) / summary["std"]
+
+
+def robust_zscore(values, summary: dict) -> np.ndarray:
+    return ROBUST_Z_FACTOR * (np.asarray(values, dtype=float) - summary["median"]) / summary["mad"]
+
+
+def outlier_flags(values, summary: dict, z_threshold: float = DEFAULT_Z_THRESHOLD,
+                  robust_threshold: float = DEFAULT_ROBUST_Z_THRESHOLD) -> dict:
+    """Scores et indicateurs d'anomalie d'un lot, à partir d'un résumé figé."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = zscore(values, summary)
+        robust_z = robust_zscore(values, summary)
+    return {
+        "z_score": z,
+        "robust_z_score": robust_z,
+        "outlier_z": z > z_threshold,
+        "outlier_robust": np.abs(robust_z) > robust_threshold,
+    }
+
+# ==============================================================================
+# 🔁 Sources : lots DuckDB, partitions en parallèle
+# ==============================================================================
+def iter_column_batches(con, sql: str, batch_rows: int = DEFAULT_BATCH_ROWS):
+    """Première colonne de 'sql', lot Arrow par lot Arrow, en tableaux numpy."""
+    reader = con.execute(sql).fetch_record_batch(batch_rows)
+    for batch in reader:
+        yield batch.column(0).to_numpy(zero_copy_only=False).astype(float)
+
+
+def profile_query(con, sql: str, batch_rows: int = DEFAULT_BATCH_ROWS,
+                  compression: int = DEFAULT_COMPRESSION) -> ColumnProfile:
+    profile = ColumnProfile(compression)
+    for values in iter_column_batches(con, sql, batch_rows):
+        profile.update(values)
+    return profile
+
+
+def profile_partitions(partitions: list, profile_fn, max_workers: int = 4) -> ColumnProfile:
+    """Profile chaque partition avec profile_fn(partition) en parallèle puis fusionne les états.
+
+    profile_fn peut retourner un ColumnProfile ou son dict (état issu d'un autre processus).
+    """
+    merged = None
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(partitions)))) as pool:
+        for result in pool.map(profile_fn, partitions):
+            profile = ColumnProfile.from_dict(result) if isinstance(result, dict) else result
+            merged = profile if merged is None else merged.merge(profile)
+    return merged if merged is not None else ColumnProfile()
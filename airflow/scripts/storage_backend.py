@@ -0,0 +1,143 @@
+# === Module partagé - Lecture des fichiers d'échange : disque local ou MinIO (httpfs) ===
+# Par défaut (STORAGE_BACKEND=local), les étapes lisent les fichiers sur le disque du
+# worker ; 04 et 07 les rapatrient de MinIO quand l'étape précédente a tourné ailleurs.
+# Avec STORAGE_BACKEND=s3, DuckDB lit directement les objets MinIO via l'extension httpfs
+# (s3://<bucket>/<clé>, configurée depuis les variables MINIO_* de minio_storage.py) :
+# 05 lit les fichiers bruts envoyés par 02, 08 (DEDUP_INPUT=clean ou raw) ceux envoyés
+# par 06 ou 02, et 04 / 07 n'ont plus rien à télécharger.
+#
+# STORAGE_CACHE=1 ajoute un cache local en lecture : chaque objet est téléchargé une fois
+# par ETag dans STORAGE_CACHE_DIR, puis relu localement tant qu'il n'a pas changé.
+
+import os
+from pathlib import Path, PurePosixPath
+from urllib.parse import urlparse
+from botocore.exceptions import ClientError
+from minio_storage import (
+    ACCESS_KEY, BUCKET_NAME, MINIO_ENDPOINT, REGION_NAME, SECRET_KEY, get_s3_client, get_transfer_config,
+)
+
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+# STORAGE_BACKEND : "local" (par défaut) ou "s3"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STORAGE_CACHE = os.getenv("STORAGE_CACHE", "0") == "1"
+STORAGE_CACHE_DIR = Path(os.getenv("STORAGE_CACHE_DIR", "/opt/airflow/data/cache/s3"))
+
+# Mêmes préfixes que les envois de 02 (fichiers bruts) et de 06 (fichiers nettoyés)
+INPUTS_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/inputs/")
+OUTPUTS_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/outputs/")
+
+
+def remote_reads() -> bool:
+    return STORAGE_BACKEND == "s3"
+
+# ==============================================================================
+# 🦆 DuckDB httpfs
+# ==============================================================================
+def s3_url(key: str, bucket: str = BUCKET_NAME) -> str:
+    return f"s3://{bucket}/{key}"
+
+
+def httpfs_secret_sql() -> str:
+    """Secret S3 temporaire (session) pointant sur MinIO, adressage par chemin."""
+    endpoint = urlparse(MINIO_ENDPOINT)
+    return f"""
+        CREATE OR REPLACE SECRET minio (
+            TYPE S3,
+            KEY_ID '{ACCESS_KEY}',
+            SECRET '{SECRET_KEY}',
+            REGION '{REGION_NAME}',
+            ENDPOINT '{endpoint.netloc}',
+            URL_STYLE 'path',
+            USE_SSL {'true' if endpoint.scheme == 'https' else 'false'}
+        )
+    """
+
+
+def configure_httpfs(con):
+    """Charge httpfs (préinstallée dans l'image) et enregistre les identifiants MinIO."""
+    con.execute("INSTALL httpfs")
+    con.execute("LOAD httpfs")
+    con.execute(httpfs_secret_sql())
+
+
+def prepare_connection(con):
+    """À appeler après connect_duckdb dans les étapes qui lisent des fichiers d'échange."""
+    if remote_reads() and not STORAGE_CACHE:
+        configure_httpfs(con)
+
+# ==============================================================================
+# 🗄️ Cache local en lecture, indexé par ETag
+# ==============================================================================
+def remote_object(key: str, bucket: str = BUCKET_NAME, client=None) -> dict:
+    head = (client or get_s3_client()).head_object(Bucket=bucket, Key=key)
+    return {"etag": head["ETag"].strip('"'), "size": head["ContentLength"]}
+
+
+def _is_missing(error: ClientError) -> bool:
+    """Objet absent (HEAD ➝ 404) ; les autres erreurs (accès, réseau, MinIO) sont à remonter."""
+    return error.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound")
+
+
+def cached_object(key: str, bucket: str = BUCKET_NAME, cache_dir: Path = STORAGE_CACHE_DIR, client=None) -> Path:
+    """Copie locale de l'objet pour son ETag courant, téléchargée seulement s'il a changé.
+
+    Le téléchargement exige le même ETag (IfMatch) : un objet remplacé entre-temps n'est
+    pas enregistré sous l'ancienne empreinte. Les copies des ETags précédents sont supprimées.
+    """
+    client = client or get_s3_client()
+    etag = remote_object(key, bucket, client)["etag"]
+    folder = Path(cache_dir) / bucket / key
+    target = folder / f"{etag}{PurePosixPath(key).suffix}"
+    if target.exists():
+        return target
+
+    folder.mkdir(parents=True, exist_ok=True)
+    tmp_path = folder / f".{target.name}.{os.getpid()}.tmp"
+    client.download_file(bucket, key, str(tmp_path), ExtraArgs={"IfMatch": etag}, Config=get_transfer_config())
+    os.replace(tmp_path, target)
+    for old in folder.iterdir():
+        if old != target and not old.name.startswith("."):
+            old.unlink()
+    return target
+
+# ==============================================================================
+# 📄 Fichiers d'échange : chemin de lecture, existence, taille, empreinte
+# ==============================================================================
+def source_path(key: str, local_path: Path) -> str:
+    """Chemin à passer à DuckDB : fichier local, copie en cache ou URL s3:// selon le backend."""
+    if not remote_reads():
+        return str(local_path)
+    if STORAGE_CACHE:
+        return str(cached_object(key))
+    return s3_url(key)
+
+
+def source_exists(key: str, local_path: Path) -> bool:
+    if not remote_reads():
+        return Path(local_path).exists()
+    try:
+        remote_object(key)
+        return True
+    except ClientError as e:
+        if _is_missing(e):
+            return False
+        raise
+
+
+def source_size(key: str, local_path: Path) -> int:
+    if not remote_reads():
+        return Path(local_path).stat().st_size
+    return remote_object(key)["size"]
+
+
+def source_etag(key: str) -> str:
+    """Empreinte distante d'un fichier d'échange (ETag), None s'il est absent de MinIO."""
+    try:
+        return remote_object(key)["etag"]
+    except ClientError as e:
+        if _is_missing(e):
+            return None
+        raise
@@ -0,0 +1,173 @@
+# === Module partagé - Export en flux des tables et requêtes DuckDB ===
+# Ce module écrit le résultat d'une requête DuckDB en CSV ou en Parquet sans le
+# matérialiser en DataFrame pandas : la mémoire reste constante quelle que soit
+# la taille de la table.
+# - moteur "copy" (par défaut) : COPY (requête) TO ..., écrit par DuckDB lui-même,
+# - moteur "arrow" : lots Arrow (fetch_record_batch) écrits par pyarrow
+#   (en CSV, pyarrow met toutes les chaînes entre guillemets).
+# Le fichier est écrit sous un nom temporaire puis renommé : un lecteur ne voit
+# jamais un export partiel.
+# export_partitioned répartit une même requête entre plusieurs CSV (un par valeur
+# d'une colonne) en une seule passe ordonnée sur les données.
+
+import os
+import re
+import shutil
+from pathlib import Path
+from urllib.parse import unquote
+from data_formats import PARQUET_COMPRESSION, data_file, copy_options
+
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+EXPORT_ENGINE = os.getenv("EXPORT_ENGINE", "copy")
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "100000"))
+
+# ==============================================================================
+# 🏹 Écriture par lots Arrow
+# ==============================================================================
+def _write_arrow_batches(reader, path: Path, extension: str) -> int:
+    if extension == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(str(path), reader.schema, compression=PARQUET_COMPRESSION)
+    else:
+        import pyarrow.csv as pacsv
+        writer = pacsv.CSVWriter(str(path), reader.schema)
+
+    nb_rows = 0
+    try:
+        for batch in reader:
+            writer.write_batch(batch)
+            nb_rows += batch.num_rows
+    finally:
+        writer.close()
+    return nb_rows
+
+# ==============================================================================
+# 💾 Export d'une requête ou d'une table
+# ==============================================================================
+def export_query(con, sql: str, path: Path, engine: str = EXPORT_ENGINE) -> int:
+    """Écrit le résultat de 'sql' dans 'path' (.csv ou .parquet) et retourne le nombre de lignes."""
+    path = Path(path)
+    extension = "parquet" if path.suffix == ".parquet" else "csv"
+    tmp_path = path.with_name(f".{path.name}.tmp")
+
+    try:
+        if engine == "arrow":
+            reader = con.execute(sql).fetch_record_batch(EXPORT_BATCH_ROWS)
+            nb_rows = _write_arrow_batches(reader, tmp_path, extension)
+        else:
+            nb_rows = con.execute(f"COPY ({sql}) TO '{tmp_path}' {copy_options(extension)}").fetchone()[0]
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return nb_rows
+
+
+def export_table(con, table: str, path: Path, engine: str = EXPORT_ENGINE) -> int:
+    return export_query(con, f"SELECT * FROM {table}", path, engine)
+
+
+def export_tables(con, tables: list, output_dir: Path, engine: str = EXPORT_ENGINE) -> list:
+    """Exporte chaque table vers '<output_dir>/<table>.<ext>' (format DATA_FORMAT) et retourne les chemins."""
+    paths = []
+    for table in tables:
+        path = Path(output_dir) / data_file(table)
+        export_table(con, table, path, engine)
+        paths.append(path)
+    return paths
+
+# ==============================================================================
+# 🔀 Export réparti en une passe (un CSV par valeur d'une colonne)
+# ==============================================================================
+def _part_number(file: Path) -> int:
+    """Numéro d'un fichier de partition (data_10.csv ➝ 10) : data_10 vient après data_2."""
+    return int(re.findall(r"\d+", file.stem)[-1])
+
+
+def _copy_partitions(con, sql: str, column: str, tmp_dir: Path) -> dict:
+    """COPY ... PARTITION_BY ; retourne {valeur : [fichiers écrits, dans l'ordre]}.
+
+    Sur plusieurs threads, l'écriture partitionnée ne conserve pas l'ordre des lignes,
+    même avec un ORDER BY : la copie s'exécute donc sur un seul thread, et les fichiers
+    d'une partition (un nouveau à chaque vidage) sont triés par numéro.
+    """
+    options = f"FORMAT CSV, HEADER, DELIMITER ',', PARTITION_BY ({column})"
+    threads = con.execute("SELECT current_setting('threads')").fetchone()[0]
+    con.execute("SET threads = 1")
+    try:
+        # DuckDB ≥ 1.1 n'écrit la colonne de partition que sur demande
+        con.execute(f"COPY ({sql}) TO '{tmp_dir}' ({options}, WRITE_PARTITION_COLUMNS true)")
+    except Exception as e:
+        if "write_partition_columns" not in str(e).lower():
+            raise
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        con.execute(f"COPY ({sql}) TO '{tmp_dir}' ({options})")
+    finally:
+        con.execute(f"SET threads = {threads}")
+
+    partitions = {}
+    for directory in Path(tmp_dir).iterdir():
+        value = unquote(directory.name.split("=", 1)[1])
+        partitions[value] = sorted(directory.glob("*.csv"), key=_part_number)
+    return partitions
+
+
+def _concat_csv(files: list, path: Path):
+    """Concatène des CSV de même en-tête (seul le premier en-tête est conservé)."""
+    with open(path, "wb") as out:
+        for i, file in enumerate(files):
+            with open(file, "rb") as f:
+                if i > 0:
+                    f.readline()
+                shutil.copyfileobj(f, out)
+
+
+def export_partitioned(con, sql: str, column: str, paths: dict, order_by: str = None,
+                       engine: str = EXPORT_ENGINE) -> list:
+    """Écrit en une passe un CSV par valeur de 'column' (paths : valeur ➝ chemin).
+
+    Chaque fichier suit l'ordre 'order_by' (ex. "product_id") ; sans ordre explicite,
+    l'ordre des lignes n'est pas garanti. Les valeurs absentes de 'paths' sont
+    ignorées ; une valeur sans ligne donne un fichier réduit à l'en-tête.
+    """
+    if order_by:
+        sql = f"SELECT * FROM ({sql}) ORDER BY {order_by}"
+    paths = {value: Path(path) for value, path in paths.items()}
+    tmp_paths = {value: path.with_name(f".{path.name}.tmp") for value, path in paths.items()}
+
+    try:
+        if engine == "arrow":
+            import pyarrow.compute as pc
+            import pyarrow.csv as pacsv
+            reader = con.execute(sql).fetch_record_batch(EXPORT_BATCH_ROWS)
+            writers = {value: pacsv.CSVWriter(str(tmp), reader.schema) for value, tmp in tmp_paths.items()}
+            try:
+                for batch in reader:
+                    for value, writer in writers.items():
+                        writer.write_batch(batch.filter(pc.equal(batch.column(column), value)))
+            finally:
+                for writer in writers.values():
+                    writer.close()
+        else:
+            tmp_dir = Path(next(iter(paths.values()))).with_name(f".{column}_partitions.tmp")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            try:
+                partitions = _copy_partitions(con, sql, column, tmp_dir)
+                for value, tmp in tmp_paths.items():
+                    files = partitions.get(value)
+                    if files:
+                        _concat_csv(files, tmp)
+                    else:
+                        con.execute(f"COPY (SELECT * FROM ({sql}) LIMIT 0) TO '{tmp}' {copy_options('csv')}")
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        for value, tmp in tmp_paths.items():
+            os.replace(tmp, paths[value])
+    finally:
+        for tmp in tmp_paths.values():
+            if tmp.exists():
+                tmp.unlink()
+    return list(paths.values())
@@ -0,0 +1,399 @@
+# === Module partagé - Moteur de validation des tables du pipeline ===
+# Les contrôles de chaque étape sont déclarés dans 'checks/<étape>.json' (clean, dedup,
+# fusion, ca, zscore) et compilés en une seule requête d'agrégat par table : ajouter
+# un contrôle ajoute une colonne au même parcours des données, pas une requête.
+#
+# Contrôles disponibles par table :
+#     non_empty   : au moins une ligne
+#     row_count   : nombre de lignes exact (entier) ou borné ({"min": .., "max": ..})
+#     columns     : colonnes présentes (lu sur le schéma, sans parcours)
+#     not_null    : colonnes sans NULL
+#     finite      : colonnes numériques sans NaN ni infini
+#     unique      : clés (liste de colonnes) sans doublon
+#     ranges      : {"colonne": {"min": .., "max": ..}} bornes inclusives
+#     expressions : [{"name", "sql" (agrégat), "equals" | "min" | "max"}]
+# "source" remplace le nom de la table par une relation SQL ({outputs} = dossier des sorties).
+#
+#     python validation_engine.py clean dedup     ➝ valide les étapes demandées
+#
+# Mode approché (VALIDATION_MODE=approx), pour les tables d'au moins VALIDATION_APPROX_MIN_ROWS
+# lignes : not_null / finite / ranges sont comptés sur un échantillon (Bernoulli ou réservoir)
+# dimensionné pour borner le taux de violation non détecté, unique est estimé par HyperLogLog.
+# Une violation observée est un échec certain ; une estimation trop proche du seuil pour
+# conclure est recalculée exactement (escalade). Chaque résultat indique sa confiance.
+#
+# Le résultat structuré est écrit dans 'outputs/validation/<étape>.json'.
+
+import os
+import sys
+import json
+import math
+import time
+from pathlib import Path
+from statistics import NormalDist
+
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+CHECKS_PATH = Path(os.getenv("CHECKS_PATH", Path(__file__).resolve().parent / "checks"))
+VALIDATION_STAGES = ("clean", "dedup", "fusion", "ca", "zscore")
+TABLE_CHECKS = ("non_empty", "row_count", "columns", "not_null", "finite", "unique", "ranges", "expressions")
+TOLERANCE = 1e-9
+
+# Mode approché : exact (défaut) ou approx
+VALIDATION_MODE = os.getenv("VALIDATION_MODE", "exact")
+APPROX = {
+    "min_rows": int(os.getenv("VALIDATION_APPROX_MIN_ROWS", 10_000_000)),        # en dessous : exact
+    "confidence": float(os.getenv("VALIDATION_CONFIDENCE", 0.99)),
+    "sample_tolerance": float(os.getenv("VALIDATION_SAMPLE_TOLERANCE", 1e-4)),   # taux de NULL / hors bornes toléré
+    "distinct_tolerance": float(os.getenv("VALIDATION_DISTINCT_TOLERANCE", 0.01)),  # taux de doublons toléré
+    "hll_error": float(os.getenv("VALIDATION_HLL_ERROR", 0.003)),               # erreur type HyperLogLog visée
+    "sample_method": os.getenv("VALIDATION_SAMPLE_METHOD", "bernoulli"),        # bernoulli | reservoir
+}
+SAMPLED_CHECKS = ("not_null", "finite", "ranges")
+SAMPLE_MARGIN = 1.2   # la taille d'un échantillon de Bernoulli est aléatoire : marge pour atteindre la cible
+SAMPLE_SEED = 42
+
+# ==============================================================================
+# 📥 Chargement et validation des déclarations
+# ==============================================================================
+def load_checks(stage: str, checks_path: Path = CHECKS_PATH) -> dict:
+    """Charge 'checks/<étape>.json' et vérifie sa structure."""
+    path = Path(checks_path) / f"{stage}.json"
+    if not path.exists():
+        raise FileNotFoundError(f"Fichier de contrôles introuvable : {path}")
+
+    with open(path, encoding="utf-8") as f:
+        checks = json.load(f)
+
+    checks.setdefault("stage", stage)
+    if not checks.get("tables"):
+        raise ValueError(f"{path} : 'tables' est obligatoire")
+    for table, spec in checks["tables"].items():
+        unknown = set(spec) - set(TABLE_CHECKS) - {"source"}
+        if unknown:
+            raise ValueError(f"{path} : contrôle(s) inconnu(s) pour {table} : {', '.join(sorted(unknown))}")
+        for expression in spec.get("expressions", []):
+            if not expression.get("name") or not expression.get("sql"):
+                raise ValueError(f"{path} : chaque expression de {table} requiert 'name' et 'sql'")
+            if not {"equals", "min", "max"} & set(expression):
+                raise ValueError(f"{path} : l'expression '{expression['name']}' requiert 'equals', 'min' ou 'max'")
+    return checks
+
+# ==============================================================================
+# 🧱 Compilation : une requête d'agrégat par table
+# ==============================================================================
+def _quote(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _bounds_predicate(column: str, bounds: dict) -> str:
+    predicates = []
+    if "min" in bounds:
+        predicates.append(f"{_quote(column)} < {bounds['min']}")
+    if "max" in bounds:
+        predicates.append(f"{_quote(column)} > {bounds['max']}")
+    return " OR ".join(predicates) or "FALSE"
+
+
+def compile_checks(spec: dict, relation: str) -> tuple:
+    """Retourne (requête, contrôles) ; la colonne i+1 du résultat porte la valeur du contrôle i.
+
+    La colonne 0 est toujours COUNT(*), partagée par non_empty et row_count.
+    """
+    aggregates = ["COUNT(*)"]
+    checks = []
+
+    def add(check: str, target: str, sql: str, expected):
+        aggregates.append(sql)
+        checks.append({"check": check, "cible": target, "attendu": expected})
+
+    for column in spec.get("not_null", []):
+        add("not_null", column, f"COUNT(*) FILTER (WHERE {_quote(column)} IS NULL)", 0)
+    for column in spec.get("finite", []):
+        add("finite", column, f"COUNT(*) FILTER (WHERE isnan({_quote(column)}) OR isinf({_quote(column)}))", 0)
+    for key in spec.get("unique", []):
+        # Même définition que COUNT(*) - COUNT(DISTINCT clé) : une clé NULL compte comme doublon
+        distinct = _quote(key[0]) if len(key) == 1 else f"({', '.join(_quote(c) for c in key)})"
+        add("unique", ", ".join(key), f"COUNT(*) - COUNT(DISTINCT {distinct})", 0)
+    for column, bounds in spec.get("ranges", {}).items():
+        add("ranges", column, f"COUNT(*) FILTER (WHERE {_bounds_predicate(column, bounds)})", 0)
+    for expression in spec.get("expressions", []):
+        expected = {k: expression[k] for k in ("equals", "min", "max") if k in expression}
+        add("expressions", expression["name"], expression["sql"], expected)
+
+    sql = "SELECT\n    " + ",\n    ".join(aggregates) + f"\nFROM {relation}"
+    return sql, checks
+
+
+def _passes(value, expected) -> bool:
+    if value is None:
+        return False
+    if isinstance(expected, dict):
+        if "equals" in expected and abs(value - expected["equals"]) > TOLERANCE:
+            return False
+        if "min" in expected and value < expected["min"]:
+            return False
+        if "max" in expected and value > expected["max"]:
+            return False
+        return True
+    return value == expected
+
+# ==============================================================================
+# 🎲 Estimations : échantillons et HyperLogLog
+# ==============================================================================
+def sample_size(tolerance: float, confidence: float) -> int:
+    """Taille d'échantillon pour laquelle zéro violation observée borne le taux réel sous 'tolerance'."""
+    return math.ceil(math.log(1 / (1 - confidence)) / tolerance)
+
+
+def zero_rate_bound(nb_sampled: int, confidence: float) -> float:
+    """Borne supérieure du taux de violation quand aucune n'apparaît sur nb_sampled lignes."""
+    return 1.0 if nb_sampled == 0 else 1 - (1 - confidence) ** (1 / nb_sampled)
+
+
+def sample_clause(nb_rows: int, approx: dict) -> str:
+    target = sample_size(approx["sample_tolerance"], approx["confidence"])
+    if approx["sample_method"] == "reservoir":
+        return f"USING SAMPLE {target} ROWS (reservoir, {SAMPLE_SEED})"
+    percent = min(100.0, 100 * SAMPLE_MARGIN * target / nb_rows)
+    return f"USING SAMPLE {percent:.6f} PERCENT (bernoulli, {SAMPLE_SEED})"
+
+
+def hll_precision(error: float) -> int:
+    """Nombre de bits de registre pour une erreur type relative 1.04 / sqrt(2^p) <= error."""
+    return min(18, max(10, math.ceil(math.log2((1.04 / error) ** 2))))
+
+
+def hll_registers_sql(relation: str, key: list, precision: int) -> str:
+    """Registres HyperLogLog de la clé : rang maximal du premier bit à 1, par registre.
+
+    Un GROUP BY sur 2^p registres au plus, au lieu de la table de hachage de toutes les
+    clés distinctes. Comme COUNT(DISTINCT), une clé simple NULL n'est pas comptée.
+    """
+    bits = 64 - precision
+    rest = f"(h & ((1::UBIGINT << {bits}) - 1))"
+    where = f" WHERE {_quote(key[0])} IS NOT NULL" if len(key) == 1 else ""
+    return (
+        f"SELECT h >> {bits} AS registre,\n"
+        f"       MAX(CASE WHEN {rest} = 0 THEN {bits + 1} ELSE {bits} - FLOOR(LOG2({rest}::DOUBLE))::INTEGER END) AS rang\n"
+        f"FROM (SELECT hash({', '.join(_quote(c) for c in key)}) AS h FROM {relation}{where})\n"
+        f"GROUP BY ALL"
+    )
+
+
+def hll_estimate(ranks: list, precision: int) -> float:
+    m = 1 << precision
+    empty = m - len(ranks)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / (sum(2.0 ** -rank for rank in ranks) + empty)
+    if estimate <= 2.5 * m and empty:
+        return m * math.log(m / empty)  # petites cardinalités : comptage linéaire
+    return estimate
+
+# ==============================================================================
+# 🧪 Exécution
+# ==============================================================================
+def relation_of(table: str, spec: dict, outputs_path: Path) -> str:
+    return spec.get("source", table).replace("{outputs}", str(outputs_path))
+
+
+def _count_results(table: str, spec: dict, nb_rows: int) -> list:
+    results = []
+    if spec.get("non_empty"):
+        results.append({"table": table, "check": "non_empty", "cible": table, "valeur": nb_rows,
+                        "attendu": {"min": 1}, "ok": nb_rows > 0})
+    if "row_count" in spec:
+        expected = spec["row_count"]
+        results.append({"table": table, "check": "row_count", "cible": table, "valeur": nb_rows,
+                        "attendu": expected, "ok": _passes(nb_rows, expected)})
+    return results
+
+
+def _exact_results(con, table: str, spec: dict, relation: str, mode: str = "exact") -> list:
+    sql, checks = compile_checks(spec, relation)
+    values = con.execute(sql).fetchone()
+    results = _count_results(table, spec, values[0])
+    for check, value in zip(checks, values[1:]):
+        value = float(value) if check["check"] == "expressions" and value is not None else value
+        results.append({"table": table, **check, "valeur": value, "ok": _passes(value, check["attendu"]),
+                        "mode": mode, "confiance": 1.0})
+    return results
+
+
+def validate_table_approx(con, table: str, spec: dict, relation: str, nb_rows: int, approx: dict) -> list:
+    """Contrôles estimés d'une table volumineuse ; escalade exacte près du seuil."""
+    confidence = approx["confidence"]
+    escalation = {}
+
+    # COUNT(*) et expressions (agrégats libres) restent exacts
+    if spec.get("expressions"):
+        results = _exact_results(con, table, {k: spec[k] for k in ("non_empty", "row_count", "expressions") if k in spec}, relation)
+    else:
+        results = _count_results(table, spec, nb_rows)
+
+    # 🎲 NULL, NaN / infini, bornes : un échantillon, une requête
+    sampled = {k: spec[k] for k in SAMPLED_CHECKS if k in spec}
+    if sampled:
+        sql, checks = compile_checks(sampled, f"{relation} {sample_clause(nb_rows, approx)}")
+        values = con.execute(sql).fetchone()
+        nb_sampled = values[0]
+        bound = zero_rate_bound(nb_sampled, confidence)
+        for check, hits in zip(checks, values[1:]):
+            result = {"table": table, **check, "valeur": round(hits * nb_rows / nb_sampled) if nb_sampled else None,
+                      "mode": "echantillon", "echantillon": nb_sampled}
+            if hits:
+                # Violation observée : l'échec est certain
+                results.append({**result, "ok": False, "confiance": 1.0})
+            elif bound <= approx["sample_tolerance"]:
+                results.append({**result, "ok": True, "confiance": confidence, "borne": bound})
+            elif check["check"] == "ranges":
+                escalation.setdefault("ranges", {})[check["cible"]] = spec["ranges"][check["cible"]]
+            else:
+                escalation.setdefault(check["check"], []).append(check["cible"])
+
+    # 🔢 Unicité : HyperLogLog, intervalle de confiance sur le taux de doublons
+    precision = hll_precision(approx["hll_error"])
+    margin = NormalDist().inv_cdf((1 + confidence) / 2) * 1.04 / math.sqrt(1 << precision)
+    for key in spec.get("unique", []):
+        ranks = [rank for _, rank in con.execute(hll_registers_sql(relation, key, precision)).fetchall()]
+        distinct = hll_estimate(ranks, precision)
+        low = (nb_rows - distinct * (1 + margin)) / nb_rows
+        high = (nb_rows - distinct * (1 - margin)) / nb_rows
+        result = {"table": table, "check": "unique", "cible": ", ".join(key), "attendu": 0,
+                  "valeur": max(0, round(nb_rows - distinct)), "mode": "hll", "confiance": confidence,
+                  "borne": max(0.0, high)}
+        if low > 0:
+            results.append({**result, "ok": False})
+        elif high <= approx["distinct_tolerance"]:
+            results.append({**result, "ok": True})
+        else:
+            escalation.setdefault("unique", []).append(key)
+
+    # ⬆️ Estimations trop proches du seuil : un parcours exact pour toutes
+    if escalation:
+        results.extend(_exact_results(con, table, escalation, relation, mode="escalade"))
+    return results
+
+
+def validate_table(con, table: str, spec: dict, outputs_path: Path, approx: dict = None) -> list:
+    """Contrôles d'une table en un parcours (ou estimés si approx) ; retourne la liste des résultats."""
+    relation = relation_of(table, spec, outputs_path)
+    try:
+        columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()]
+    except Exception as e:
+        return [{"table": table, "check": "exists", "cible": relation, "valeur": str(e).splitlines()[0],
+                 "attendu": "relation lisible", "ok": False}]
+
+    results = [
+        {"table": table, "check": "columns", "cible": column, "valeur": column in columns,
+         "attendu": True, "ok": column in columns}
+        for column in spec.get("columns", [])
+    ]
+
+    if approx:
+        nb_rows = con.execute(f"SELECT COUNT(*) FROM {relation}").fetchone()[0]
+        if nb_rows >= approx["min_rows"]:
+            return results + validate_table_approx(con, table, spec, relation, nb_rows, approx)
+    return results + _exact_results(con, table, spec, relation)
+
+
+def validate(con, checks: dict, outputs_path: Path, approx: dict = None) -> dict:
+    """Valide toutes les tables d'une étape ; retourne le résultat structuré.
+
+    approx : paramètres du mode approché (voir APPROX), None pour des contrôles exacts.
+    """
+    started = time.perf_counter()
+    results = []
+    for table, spec in checks["tables"].items():
+        results.extend(validate_table(con, table, spec, outputs_path, approx))
+    for r in results:
+        r.setdefault("mode", "exact")
+        r.setdefault("confiance", 1.0)
+    return {
+        "stage": checks["stage"],
+        "ok": all(r["ok"] for r in results),
+        "mode": "approx" if approx else "exact",
+        "confiance": min((r["confiance"] for r in results), default=1.0),
+        "controles": len(results),
+        "echecs": sum(not r["ok"] for r in results),
+        "escalades": sum(r["mode"] == "escalade" for r in results),
+        "duree": time.perf_counter() - started,
+        "resultats": results,
+    }
+
+
+def write_report(report: dict, outputs_path: Path) -> Path:
+    path = Path(outputs_path) / "validation" / f"{report['stage']}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(json.dumps(report, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+    os.replace(tmp_path, path)
+    return path
+
+# ==============================================================================
+# 🚀 Point d'entrée (tâches de validation du DAG)
+# ==============================================================================
+def main(stages: list = None):
+    from loguru import logger
+    from duckdb_settings import connect_duckdb
+
+    LOGS_PATH = Path(os.getenv("AIRFLOW_LOG_PATH", "logs"))
+    LOGS_PATH.mkdir(parents=True, exist_ok=True)
+    logger.remove()
+    logger.add(sys.stdout, level="INFO")
+    logger.add(LOGS_PATH / "validation.log", level="INFO", rotation="500 KB")
+
+    DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
+    OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
+
+    stages = stages if stages is not None else sys.argv[1:]
+    unknown = [stage for stage in stages if stage not in VALIDATION_STAGES]
+    if not stages or unknown:
+        logger.error(f"❌ Étape(s) de validation inconnue(s) : {', '.join(unknown) or '-'} (disponibles : {', '.join(VALIDATION_STAGES)})")
+        sys.exit(1)
+
+    try:
+        con = connect_duckdb(DUCKDB_PATH, stage="validation", read_only=True)
+    except Exception as e:
+        logger.error(f"❌ Erreur de connexion à DuckDB : {e}")
+        sys.exit(1)
+
+    if VALIDATION_MODE not in ("exact", "approx"):
+        logger.error(f"❌ VALIDATION_MODE inconnu : {VALIDATION_MODE} (exact | approx)")
+        sys.exit(1)
+    approx = APPROX if VALIDATION_MODE == "approx" else None
+
+    failed = []
+    for stage in stages:
+        try:
+            report = validate(con, load_checks(stage), OUTPUTS_PATH, approx)
+            path = write_report(report, OUTPUTS_PATH)
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la validation '{stage}' : {e}")
+            failed.append(stage)
+            continue
+
+        for r in report["resultats"]:
+            message = f"{r['table']} · {r['check']}({r['cible']}) = {r['valeur']} (attendu : {r['attendu']})"
+            if r["mode"] != "exact":
+                message += f" [{r['mode']}, confiance {r['confiance']:.2%}]"
+            if r["ok"]:
+                logger.success(f"✅ {message}")
+            else:
+                logger.error(f"❌ {message}")
+        logger.info(
+            f"📋 Validation '{stage}' ({report['mode']}) : {report['controles']} contrôle(s), {report['echecs']} échec(s), "
+            f"{report['escalades']} escalade(s), confiance {report['confiance']:.2%}, en {report['duree']:.3f}s ➔ {path}"
+        )
+        if not report["ok"]:
+            failed.append(stage)
+    con.close()
+
+    if failed:
+        logger.error(f"❌ Validation en échec : {', '.join(failed)}")
+        sys.exit(1)
+    logger.success("🎯 Toutes les validations sont passées avec succès.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# === Module partagé - Export XLSX en flux depuis DuckDB ===
+# Ce module écrit le résultat d'une requête DuckDB en XLSX lot Arrow par lot Arrow,
+# avec openpyxl en mode write_only : les lignes sont sérialisées au fil de l'eau et
+# la mémoire reste constante, là où DataFrame.to_excel construit tout le classeur.
+#
+# EXCEL_EXPORT : "eager" (par défaut) ➝ 11 et 13 produisent leurs fichiers .xlsx à chaque
+#                exécution, "lazy" ➝ ils ne sont produits qu'à la demande :
+#     python xlsx_export.py                        ➝ tous les artefacts Excel
+#     python xlsx_export.py rapport_final.xlsx     ➝ un artefact donné
+# Les artefacts à la demande sont générés depuis les tables de la base puis uploadés
+# dans MinIO, au même emplacement que les autres sorties.
+
+import os
+import sys
+from pathlib import Path
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+# ==============================================================================
+# ⚙️ Configuration
+# ==============================================================================
+EXCEL_EXPORT = os.getenv("EXCEL_EXPORT", "eager")
+XLSX_BATCH_ROWS = int(os.getenv("XLSX_BATCH_ROWS", "50000"))
+# Limite d'une feuille Excel (en-tête compris)
+XLSX_MAX_ROWS = 1048576
+
+# Génération à la demande : base lue et dossier / préfixe MinIO des sorties
+DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
+OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
+DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/outputs/")
+
+# Artefacts Excel du pipeline : fichier ➝ requête sur la base
+EXCEL_ARTIFACTS = {
+    "ca_par_produit.xlsx": "SELECT * FROM ca_par_produit",
+    "rapport_final.xlsx": "SELECT * FROM rapport_final",
+}
+
+# ==============================================================================
+# 📗 Écriture en flux
+# ==============================================================================
+def export_query_xlsx(con, sql: str, path: Path, sheet_name: str = "Sheet1") -> int:
+    """Écrit le résultat de 'sql' dans 'path' (.xlsx) et retourne le nombre de lignes."""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    reader = con.execute(sql).fetch_record_batch(XLSX_BATCH_ROWS)
+
+    header = []
+    for name in reader.schema.names:
+        cell = WriteOnlyCell(sheet, value=name)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    sheet.append(header)
+
+    nb_rows = 0
+    try:
+        for batch in reader:
+            nb_rows += batch.num_rows
+            if nb_rows >= XLSX_MAX_ROWS:
+                raise ValueError(f"{nb_rows} lignes : limite d'une feuille Excel dépassée ({XLSX_MAX_ROWS - 1})")
+            for row in zip(*(column.to_pylist() for column in batch.columns)):
+                sheet.append(row)
+        workbook.save(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _discard_sheet(sheet)
+        raise
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return nb_rows
+
+
+def _discard_sheet(sheet):
+    """Ferme une feuille write_only abandonnée et supprime son fichier temporaire d'openpyxl."""
+    if not sheet.closed:
+        sheet.close()
+    writer = getattr(sheet, "_writer", None)
+    if writer is not None and os.path.exists(writer.out):
+        os.remove(writer.out)
+
+
+def export_table_xlsx(con, table: str, path: Path, sheet_name: str = "Sheet1") -> int:
+    return export_query_xlsx(con, f"SELECT * FROM {table}", path, sheet_name)
+
+# ==============================================================================
+# 🚀 Génération à la demande (EXCEL_EXPORT=lazy)
+# ==============================================================================
+def main(names: list):
+    from loguru import logger
+    from duckdb_settings import connect_duckdb
+    from minio_storage import upload_many
+
+    unknown = [name for name in names if name not in EXCEL_ARTIFACTS]
+    if unknown:
+        logger.error(f"❌ Artefact(s) inconnu(s) : {', '.join(unknown)} (disponibles : {', '.join(EXCEL_ARTIFACTS)})")
+        sys.exit(1)
+
+    try:
+        con = connect_duckdb(DUCKDB_PATH, stage="excel", read_only=True)
+        OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
+        for name in names or EXCEL_ARTIFACTS:
+            nb_rows = export_query_xlsx(con, EXCEL_ARTIFACTS[name], OUTPUTS_PATH / name)
+            logger.success(f"📗 {name} généré : {nb_rows} lignes")
+        con.close()
+
+        upload_many([
+            (OUTPUTS_PATH / name, f"{DESTINATION_PREFIX}{name}")
+            for name in names or EXCEL_ARTIFACTS
+        ])
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de la génération des fichiers Excel : {e}")
+        sys.exit(1)
+
+    logger.success("🎯 Fichiers Excel générés et uploadés.")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
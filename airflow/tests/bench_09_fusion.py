@@ -0,0 +1,171 @@
+# === Script de benchmark 09 - Moteurs de fusion ERP ↔ liaison ↔ web ===
+# Ce script génère des tables dédoublonnées synthétiques volumineuses (1M puis 10M de
+# produits par défaut), avec une majorité de SKU web jamais référencés par la liaison
+# et des colonnes texte larges, puis mesure la construction de la table 'fusion' :
+# - moteur "standard" sur des tables non triées,
+# - moteur "optimized" (pré-filtre par semi-jointure) sur des tables non triées,
+# - moteur "optimized" sur des tables triées selon fusion_engine.CLUSTER_KEYS
+#   (liaison_dedup sur id_web), puis avec liaison_dedup triée sur product_id.
+# Il vérifie que chaque variante produit les mêmes lignes que le moteur standard et
+# journalise les plans.
+#
+#     BENCH_ROWS=1000000,10000000   ➝ tailles testées (nombre de produits ERP)
+#     BENCH_WEB_FACTOR=4            ➝ SKU web par produit (1 seul est lié)
+#     BENCH_EXPLAIN=1               ➝ affiche les plans EXPLAIN ANALYZE
+#     DUCKDB_BENCH_MEMORY_LIMIT, DUCKDB_BENCH_THREADS, DUCKDB_BENCH_TEMP_DIRECTORY
+
+import os
+import sys
+import time
+import tempfile
+from pathlib import Path
+from loguru import logger
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "bench_09_fusion.log"
+
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+# ==============================================================================
+# 📦 Chargement des requêtes de fusion et des réglages DuckDB
+# ==============================================================================
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+from fusion_engine import CLUSTER_KEYS, fusion_query  # noqa: E402
+from duckdb_settings import connect_duckdb, describe_settings  # noqa: E402
+
+BENCH_ROWS = [int(n) for n in os.getenv("BENCH_ROWS", "1000000,10000000").split(",")]
+BENCH_WEB_FACTOR = int(os.getenv("BENCH_WEB_FACTOR", "4"))
+BENCH_EXPLAIN = os.getenv("BENCH_EXPLAIN", "0") == "1"
+
+# (moteur, libellé du tri, colonnes de tri par table ; None = ordre aléatoire)
+VARIANTS = [
+    ("standard", "aucun", None),
+    ("optimized", "aucun", None),
+    ("optimized", "CLUSTER_KEYS", CLUSTER_KEYS),
+    ("optimized", "liaison/product_id", {**CLUSTER_KEYS, "liaison_dedup": ["product_id"]}),
+]
+
+# ==============================================================================
+# 🧪 Tables dédoublonnées synthétiques (ordre physique aléatoire)
+# ==============================================================================
+def build_tables(con, n: int):
+    con.execute(f"""
+        CREATE OR REPLACE TABLE erp_dedup_src AS
+        SELECT
+            i                                                    AS product_id,
+            i % 2                                                AS onsale_web,
+            (i % 400) + 9.9                                      AS price,
+            i % 25                                               AS stock_quantity,
+            CASE WHEN i % 3 = 0 THEN 'outofstock' ELSE 'instock' END AS stock_status
+        FROM range(0, {n}) t(i)
+        ORDER BY hash(i)
+    """)
+    # Un produit sur dix n'a pas de liaison
+    con.execute(f"""
+        CREATE OR REPLACE TABLE liaison_dedup_src AS
+        SELECT i AS product_id, 'sku_' || (i * {BENCH_WEB_FACTOR}) AS id_web
+        FROM range(0, {n}) t(i)
+        WHERE i % 10 <> 0
+        ORDER BY hash(i + 1)
+    """)
+    # Seul un SKU web sur BENCH_WEB_FACTOR est référencé par la liaison
+    con.execute(f"""
+        CREATE OR REPLACE TABLE web_dedup_src AS
+        SELECT
+            'sku_' || s                                          AS sku,
+            'Vin ' || s || ' — ' || repeat('cuvée ', 8)          AS post_title,
+            repeat('Notes de dégustation ' || s || '. ', 6)      AS post_excerpt,
+            'publish'                                            AS post_status,
+            'product'                                            AS post_type,
+            (s % 5) * 1.0                                        AS average_rating,
+            s % 17                                               AS total_sales
+        FROM range(0, {n * BENCH_WEB_FACTOR}) t(s)
+        ORDER BY hash(s + 2)
+    """)
+
+
+def materialize(con, cluster: dict):
+    """Copie les tables sources vers erp_dedup / liaison_dedup / web_dedup, triées ou non."""
+    for table in CLUSTER_KEYS:
+        order_by = f" ORDER BY {', '.join(cluster[table])}" if cluster else ""
+        con.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM {table}_src{order_by}")
+
+# ==============================================================================
+# ⏱️ Mesure d'une variante
+# ==============================================================================
+def run_variant(con, engine: str, label: str) -> tuple:
+    sql = fusion_query(engine)
+    start = time.perf_counter()
+    con.execute(f"CREATE OR REPLACE TABLE fusion_{engine} AS {sql}")
+    elapsed = time.perf_counter() - start
+
+    nb_rows = con.execute(f"SELECT COUNT(*) FROM fusion_{engine}").fetchone()[0]
+    if BENCH_EXPLAIN:
+        plan = con.execute(f"EXPLAIN ANALYZE {sql}").fetchall()
+        logger.info(f"📋 Plan {engine} (tri : {label}) :\n{plan[0][1]}")
+    return elapsed, nb_rows
+
+
+def same_rows(con, table_a: str, table_b: str) -> bool:
+    diff = con.execute(f"""
+        SELECT COUNT(*) FROM (
+            (SELECT * FROM {table_a} EXCEPT ALL SELECT * FROM {table_b})
+            UNION ALL
+            (SELECT * FROM {table_b} EXCEPT ALL SELECT * FROM {table_a})
+        )
+    """).fetchone()[0]
+    return diff == 0
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            con = connect_duckdb(Path(tmp) / "bench.duckdb", stage="bench")
+            logger.info(f"🧪 Base de benchmark : {tmp} ({describe_settings(con)})")
+        except Exception as e:
+            logger.error(f"❌ Initialisation échouée : {e}")
+            sys.exit(1)
+
+        try:
+            for n in BENCH_ROWS:
+                build_tables(con, n)
+                logger.info(f"📦 {n:,} produits, {n * BENCH_WEB_FACTOR:,} SKU web générés.")
+
+                timings = {}
+                for engine, label, cluster in VARIANTS:
+                    materialize(con, cluster)
+                    elapsed, nb_rows = run_variant(con, engine, label)
+                    timings[(engine, label)] = elapsed
+                    logger.info(f"⏱️ {engine:<9} | tri : {label:<18} | {elapsed:7.2f} s | {nb_rows:,} lignes")
+                    if engine != "standard":
+                        assert same_rows(con, "fusion_standard", f"fusion_{engine}"), \
+                            f"❌ {n:,} produits : {engine} (tri : {label}) diverge du moteur standard"
+
+                baseline = timings[("standard", "aucun")]
+                best = timings[("optimized", "CLUSTER_KEYS")]
+                logger.success(f"✅ {n:,} produits : résultats identiques, gain {baseline / best:.2f}x (standard ➝ optimized triées)")
+
+            logger.success("🎯 Benchmark de fusion terminé.")
+        except Exception as e:
+            logger.error(f"❌ Erreur pendant le benchmark : {e}")
+            sys.exit(1)
+        finally:
+            con.close()
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# === Script de test 00 - Reprise du téléchargement en streaming (Range / If-Range) ===
+# Ce script démarre un serveur HTTP local qui gère Range et If-Range, et vérifie que
+# download_zip_stream :
+# - reprend un '.part' laissé par un run précédent quand l'archive n'a pas changé,
+# - repart de zéro si l'archive a changé entre-temps, si le '.part' n'a pas de
+#   validateur, sur une réponse 416 ou sur un Content-Range inattendu,
+# - reprend après une coupure réseau en cours de téléchargement.
+
+import os
+import sys
+import hashlib
+import tempfile
+import threading
+import importlib.util
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from loguru import logger
+import warnings
+
+warnings.filterwarnings("ignore")
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_00_download_resume.log"
+
+# ==============================================================================
+# 📦 Chargement du script 00 (nom de fichier non importable directement)
+# ==============================================================================
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+spec = importlib.util.spec_from_file_location("download_and_extract", SCRIPTS_PATH / "00_download_and_extract.py")
+download_and_extract = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(download_and_extract)
+
+from fetch_cache import write_json_atomic  # noqa: E402
+
+# Le script 00 reconfigure loguru à l'import : on rétablit les sorties du test
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+# ==============================================================================
+# 🌐 Serveur HTTP local : Range, If-Range, 416, coupure et Content-Range faussé
+# ==============================================================================
+class RangeServer:
+    def __init__(self):
+        self.archive = b""
+        self.requests = []
+        self.truncate_next = False
+        self.wrong_content_range = False
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                etag = '"' + hashlib.md5(server.archive).hexdigest() + '"'
+                range_header = self.headers.get("Range")
+                if_range = self.headers.get("If-Range")
+                server.requests.append({"range": range_header, "if_range": if_range})
+
+                body, status = server.archive, 200
+                if range_header and (if_range is None or if_range == etag):
+                    offset = int(range_header.split("=")[1].rstrip("-"))
+                    if offset >= len(server.archive):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(server.archive)}")
+                        self.end_headers()
+                        return
+                    start = 0 if server.wrong_content_range else offset
+                    server.wrong_content_range = False
+                    body, status = server.archive[start:], 206
+
+                self.send_response(status)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {len(server.archive) - len(body)}-{len(server.archive) - 1}/{len(server.archive)}")
+                self.end_headers()
+                if server.truncate_next:
+                    # Coupure réseau : la moitié du corps, puis fermeture de la connexion
+                    server.truncate_next = False
+                    self.wfile.write(body[: len(body) // 2])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/bottleneck.zip"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def etag(self, archive: bytes) -> str:
+        return '"' + hashlib.md5(archive).hexdigest() + '"'
+
+    def close(self):
+        self.httpd.shutdown()
+
+# ==============================================================================
+# 🧪 Fonction principale : scénarios de reprise
+# ==============================================================================
+def main():
+    server = RangeServer()
+    v1 = os.urandom(300_000)
+    v2 = os.urandom(300_000)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            dest = Path(tmp) / "bottleneck.zip"
+            part = dest.with_name("bottleneck.zip.part")
+            validator = dest.with_name("bottleneck.zip.part.json")
+
+            def leave_part(content: bytes, if_range: str = None):
+                dest.unlink(missing_ok=True)
+                part.write_bytes(content)
+                if if_range:
+                    write_json_atomic(validator, {"if_range": if_range})
+                else:
+                    validator.unlink(missing_ok=True)
+                server.requests.clear()
+
+            def download() -> bytes:
+                path, _ = download_and_extract.download_zip_stream(server.url, dest, chunk_size=65536, max_retries=2)
+                assert not part.exists() and not validator.exists(), "❌ Fichier partiel ou validateur laissé en place"
+                return path.read_bytes()
+
+            # 1️⃣ '.part' d'un run précédent, archive inchangée : reprise avec If-Range
+            server.archive = v1
+            leave_part(v1[:100_000], server.etag(v1))
+            assert download() == v1
+            assert server.requests == [{"range": "bytes=100000-", "if_range": server.etag(v1)}], server.requests
+            logger.success("✅ Archive inchangée : reprise à l'octet 100000 (Range + If-Range).")
+
+            # 2️⃣ Archive modifiée depuis le '.part' : If-Range ne correspond plus ➝ nouvelle version complète
+            server.archive = v2
+            leave_part(v1[:100_000], server.etag(v1))
+            assert download() == v2, "❌ Archive mélangeant deux versions"
+            assert len(server.requests) == 1
+            logger.success("✅ Archive modifiée : If-Range ➝ 200, nouvelle version téléchargée en entier.")
+
+            # 3️⃣ '.part' sans validateur : version inconnue, aucune reprise
+            leave_part(v1[:100_000])
+            assert download() == v2
+            assert server.requests == [{"range": None, "if_range": None}], server.requests
+            logger.success("✅ '.part' sans validateur : supprimé, téléchargement complet.")
+
+            # 4️⃣ 416 : le '.part' n'est pas tenu pour complet, on repart de zéro
+            leave_part(v2 + b"reste", server.etag(v2))
+            assert download() == v2
+            assert [r["range"] for r in server.requests] == ["bytes=300005-", None], server.requests
+            logger.success("✅ 416 : '.part' supprimé, téléchargement complet.")
+
+            # 5️⃣ Content-Range qui ne commence pas à l'octet demandé : pas d'ajout au '.part'
+            leave_part(v2[:100_000], server.etag(v2))
+            server.wrong_content_range = True
+            assert download() == v2, "❌ Content-Range inattendu ajouté au '.part'"
+            assert [r["range"] for r in server.requests] == ["bytes=100000-", None], server.requests
+            logger.success("✅ Content-Range inattendu : '.part' supprimé, téléchargement complet.")
+
+            # 6️⃣ Coupure en cours de téléchargement : reprise validée par l'ETag de la première réponse
+            dest.unlink(missing_ok=True)
+            server.requests.clear()
+            server.truncate_next = True
+            assert download() == v2
+            assert server.requests[0] == {"range": None, "if_range": None}
+            assert server.requests[-1]["if_range"] == server.etag(v2) and server.requests[-1]["range"] != "bytes=0-"
+            logger.success("✅ Coupure réseau : reprise avec If-Range sur l'ETag de la réponse initiale.")
+
+        logger.success("🎯 Test de la reprise du téléchargement terminé avec succès.")
+
+    except Exception as e:
+        logger.error(f"❌ Échec du test de reprise du téléchargement : {e}")
+        sys.exit(1)
+    finally:
+        server.close()
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# === Script de test 00 - Validation du cache de téléchargement conditionnel ===
+# Ce script démarre un serveur HTTP local qui simule la source de l'archive ZIP
+# (ETag, Last-Modified, réponses 304) et vérifie que le script 00 :
+# - télécharge et extrait l'archive au premier passage,
+# - ignore l'extraction sur une réponse 304 ou une empreinte SHA-256 identique,
+# - ré-extrait dès que le contenu de l'archive ou des fichiers locaux change,
+# - ne complète jamais un '.part' d'une ancienne version avec la nouvelle archive,
+#   même au premier run ou sans cache (FETCH_CACHE=0).
+
+import os
+import sys
+import io
+import hashlib
+import tempfile
+import threading
+import importlib.util
+from zipfile import ZipFile
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from loguru import logger
+import warnings
+
+warnings.filterwarnings("ignore")
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_00_fetch_cache.log"
+
+# ==============================================================================
+# 📦 Chargement du script 00 (nom de fichier non importable directement)
+# ==============================================================================
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+spec = importlib.util.spec_from_file_location("download_and_extract", SCRIPTS_PATH / "00_download_and_extract.py")
+download_and_extract = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(download_and_extract)
+
+from fetch_cache import FetchCache, write_json_atomic  # noqa: E402
+
+# Le script 00 reconfigure loguru à l'import : on rétablit les sorties du test
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+# ==============================================================================
+# 🌐 Serveur HTTP local simulant la source de l'archive
+# ==============================================================================
+def build_archive(payload: bytes) -> bytes:
+    buffer = io.BytesIO()
+    with ZipFile(buffer, "w") as zf:
+        for name in download_and_extract.EXPECTED_FILES:
+            zf.writestr(f"bottleneck/{name}", payload + name.encode())
+    return buffer.getvalue()
+
+
+class ArchiveServer:
+    def __init__(self):
+        self.archive = b""
+        self.honor_conditionals = True
+        self.statuses = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                etag = '"' + hashlib.md5(server.archive).hexdigest() + '"'
+                range_header = self.headers.get("Range")
+                if range_header and self.headers.get("If-Range") in (None, etag):
+                    # Reprise acceptée : seulement si le '.part' vient de la même version
+                    offset = int(range_header.split("=")[1].rstrip("-"))
+                    server.statuses.append(206)
+                    self.send_response(206)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Range", f"bytes {offset}-{len(server.archive) - 1}/{len(server.archive)}")
+                    self.send_header("Content-Length", str(len(server.archive) - offset))
+                    self.end_headers()
+                    self.wfile.write(server.archive[offset:])
+                    return
+                if server.honor_conditionals and self.headers.get("If-None-Match") == etag:
+                    server.statuses.append(304)
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                server.statuses.append(200)
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", "Wed, 15 Jan 2025 09:00:00 GMT")
+                self.send_header("Content-Length", str(len(server.archive)))
+                self.end_headers()
+                self.wfile.write(server.archive)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/bottleneck.zip"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+
+# ==============================================================================
+# 🧪 Fonction principale : scénarios du cache conditionnel
+# ==============================================================================
+def main():
+    server = ArchiveServer()
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            inputs_dir = tmp / "inputs"
+            inputs_dir.mkdir()
+            cache_path = tmp / "fetch_cache.json"
+            sample = inputs_dir / "Fichier_erp.xlsx"
+
+            def fetch():
+                return download_and_extract.fetch_inputs(
+                    server.url, inputs_dir, FetchCache(cache_path), download_dir=tmp / "dl"
+                )
+
+            # 1️⃣ Premier passage : téléchargement complet et extraction
+            server.archive = build_archive(b"v1")
+            files, changed, _ = fetch()
+            assert changed, "❌ Le premier téléchargement devrait signaler des entrées modifiées"
+            assert sorted(files) == sorted(download_and_extract.EXPECTED_FILES), f"❌ Fichiers extraits : {files}"
+            logger.success("✅ Premier passage : archive téléchargée et extraite.")
+
+            # 2️⃣ Archive inchangée : requête conditionnelle ➔ 304, aucune réécriture
+            mtime = sample.stat().st_mtime_ns
+            files, changed, reason = fetch()
+            assert server.statuses[-1] == 304, f"❌ Réponse attendue 304, obtenue {server.statuses[-1]}"
+            assert not changed, f"❌ Entrées signalées modifiées après un 304 ({reason})"
+            assert sample.stat().st_mtime_ns == mtime, "❌ Fichier réécrit malgré un 304"
+            logger.success("✅ 304 Not Modified : extraction ignorée.")
+
+            # 3️⃣ Serveur sans requêtes conditionnelles : l'empreinte SHA-256 évite l'extraction
+            server.honor_conditionals = False
+            files, changed, reason = fetch()
+            assert server.statuses[-1] == 200, "❌ Le serveur aurait dû renvoyer l'archive complète"
+            assert not changed, f"❌ Entrées signalées modifiées malgré une archive identique ({reason})"
+            assert sample.stat().st_mtime_ns == mtime, "❌ Fichier réécrit malgré une empreinte identique"
+            logger.success("✅ Empreinte SHA-256 identique : extraction ignorée.")
+
+            # 4️⃣ Nouvelle archive : ré-extraction et contenu mis à jour
+            server.honor_conditionals = True
+            server.archive = build_archive(b"v2")
+            files, changed, _ = fetch()
+            assert changed, "❌ Une nouvelle archive devrait signaler des entrées modifiées"
+            assert sample.read_bytes().startswith(b"v2"), "❌ Contenu du fichier non mis à jour"
+            logger.success("✅ Archive modifiée : fichiers ré-extraits.")
+
+            # 5️⃣ Fichier local altéré : pas de requête conditionnelle, fichier restauré
+            sample.write_bytes(b"corrompu")
+            files, changed, _ = fetch()
+            assert server.statuses[-1] == 200, "❌ Requête conditionnelle envoyée malgré un fichier local altéré"
+            assert sample.read_bytes().startswith(b"v2"), "❌ Fichier local altéré non restauré"
+            logger.success("✅ Fichier local altéré : archive re-téléchargée et fichier restauré.")
+
+            # 6️⃣ '.part' d'une ancienne version, premier run (cache vide) puis FETCH_CACHE=0 :
+            #    son propre If-Range refuse la reprise, aucune archive mélangée
+            def leave_stale_part():
+                old = build_archive(b"v1")
+                part = tmp / "dl" / "bottleneck.zip.part"
+                part.write_bytes(old[: len(old) // 2])
+                write_json_atomic(part.with_name("bottleneck.zip.part.json"), {"if_range": '"' + hashlib.md5(old).hexdigest() + '"'})
+
+            server.archive = build_archive(b"v3")
+            leave_stale_part()
+            files, changed, _ = download_and_extract.fetch_inputs(
+                server.url, inputs_dir, FetchCache(tmp / "cache_vide.json"), download_dir=tmp / "dl"
+            )
+            assert server.statuses[-1] == 200, "❌ Reprise d'un '.part' d'une autre version"
+            assert sample.read_bytes().startswith(b"v3"), "❌ Archive mélangée au premier run"
+
+            leave_stale_part()
+            zip_path, _ = download_and_extract.download_zip_stream(server.url, tmp / "dl" / "bottleneck.zip")
+            assert server.statuses[-1] == 200 and zip_path.read_bytes() == server.archive, "❌ Archive mélangée sans cache"
+            logger.success("✅ '.part' d'une ancienne version : archive re-téléchargée, avec ou sans cache.")
+
+        logger.success("🎯 Test du cache de téléchargement conditionnel terminé avec succès.")
+
+    except Exception as e:
+        logger.error(f"❌ Échec du test du cache de téléchargement : {e}")
+        sys.exit(1)
+    finally:
+        server.close()
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
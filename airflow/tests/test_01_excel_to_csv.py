@@ -0,0 +1,171 @@
+# === Script de test 01 - Conversion Excel ➔ CSV par moteur de lecture ===
+# Ce script crée des classeurs temporaires (lignes et colonnes vides, entiers incomplets,
+# dates, en-têtes manquants) et vérifie que :
+# - le moteur par défaut reste pd.read_excel : CSV identique à la conversion d'origine,
+# - en lecture seule, l'écriture en flux produit le même CSV que le passage par DataFrame,
+#   sans garder la feuille en mémoire,
+# - la conversion n'est ignorée que si les classeurs sont ceux de la dernière conversion
+#   réussie : un classeur modifié est reconverti, même si le script 00 a depuis déclaré
+#   les entrées inchangées (304 après un échec de 01), et un échec force la conversion suivante.
+
+import os
+import sys
+import tempfile
+import tracemalloc
+import importlib.util
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+from loguru import logger
+import warnings
+
+warnings.filterwarnings("ignore")
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_01_excel_to_csv.log"
+
+# ==============================================================================
+# 📦 Chargement du script 01 (nom de fichier non importable directement)
+# ==============================================================================
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+spec = importlib.util.spec_from_file_location("excel_to_csv", SCRIPTS_PATH / "01_excel_to_csv.py")
+excel_to_csv = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(excel_to_csv)
+
+# Le script 01 reconfigure loguru à l'import : on rétablit les sorties du test
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+# ==============================================================================
+# 🧪 Classeurs synthétiques
+# ==============================================================================
+def write_workbook(path: Path, nb_rows: int):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["product_id", "stock_quantity", "price", None, "vide", "post_date", "libelle"])
+    for i in range(nb_rows):
+        if i % 50 == 7:
+            sheet.append([None] * 7)
+            continue
+        sheet.append([
+            i,
+            None if i % 3 == 0 else i % 25,
+            (i % 40) + 9.9,
+            f"note {i}" if i % 4 == 0 else None,
+            None,
+            datetime(2023, 6, 1, i % 24),
+            "" if i % 5 == 0 else f"produit, n°{i}",
+        ])
+    workbook.save(path)
+
+
+def dataframe_csv(df: pd.DataFrame, path: Path) -> bytes:
+    excel_to_csv.clean_dataframe(df).to_csv(path, index=False)
+    return path.read_bytes()
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        try:
+            small = tmp / "Fichier_erp.xlsx"
+            write_workbook(small, 300)
+            excel_to_csv.INPUTS_PATH = excel_to_csv.OUTPUTS_PATH = tmp
+
+            # 1️⃣ Moteur par défaut : pd.read_excel, rendu inchangé ("1.0" dans une colonne incomplète)
+            assert os.getenv("EXCEL_ENGINE") or excel_to_csv.EXCEL_ENGINE == "openpyxl"
+            assert excel_to_csv.resolve_engine(excel_to_csv.EXCEL_ENGINE) == "openpyxl"
+            timing = excel_to_csv.convert_workbook(small.name, "erp.csv", "openpyxl")
+            expected = dataframe_csv(pd.read_excel(small), tmp / "reference.csv")
+            assert (tmp / "erp.csv").read_bytes() == expected
+            assert "\n1.0,1.0," in expected.decode() and timing["rows"] == 294
+            logger.success("✅ Moteur par défaut : CSV identique à pd.read_excel")
+
+            # 2️⃣ Lecture seule en flux : même CSV que le passage par DataFrame
+            timing = excel_to_csv.convert_workbook(small.name, "erp.csv", "openpyxl_readonly")
+            rows = list(excel_to_csv.iter_openpyxl_readonly(small))
+            expected = dataframe_csv(excel_to_csv.rows_to_dataframe(rows), tmp / "reference.csv")
+            streamed = (tmp / "erp.csv").read_bytes()
+            assert streamed == expected, (streamed[:300], expected[:300])
+            assert timing["rows"] == 294 and "\n1,1," in streamed.decode() and "vide" not in streamed.decode().splitlines()[0]
+            assert "Unnamed: 3" in streamed.decode().splitlines()[0]
+            assert not list(tmp.glob(".*.tmp"))
+            logger.success("✅ Lecture seule : écriture en flux identique, colonne vide retirée")
+
+            # 3️⃣ Mémoire : la feuille n'est jamais chargée en entier (seules les chaînes partagées
+            #    du classeur restent en mémoire pendant la lecture)
+            large = tmp / "Fichier_web.xlsx"
+            write_workbook(large, 10000)
+            peaks = {}
+            for mode in ("flux", "DataFrame"):
+                tracemalloc.start()
+                if mode == "flux":
+                    excel_to_csv.stream_rows_to_csv(excel_to_csv.iter_openpyxl_readonly(large), tmp / "web.csv")
+                else:
+                    excel_to_csv.clean_dataframe(excel_to_csv.read_with_openpyxl_readonly(large)).to_csv(
+                        tmp / "web_df.csv", index=False)
+                peaks[mode] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            assert (tmp / "web.csv").read_bytes() == (tmp / "web_df.csv").read_bytes()
+            assert peaks["flux"] * 2 < peaks["DataFrame"], peaks
+            logger.success(
+                f"✅ Pic mémoire sur 10 000 lignes : {peaks['flux'] / 1e6:.1f} Mo en flux, "
+                f"{peaks['DataFrame'] / 1e6:.1f} Mo via DataFrame"
+            )
+
+            # 4️⃣ Registre des conversions : saut seulement pour les classeurs déjà convertis
+            workbooks = tmp / "registre"
+            workbooks.mkdir()
+            excel_to_csv.INPUTS_PATH = excel_to_csv.OUTPUTS_PATH = workbooks
+            excel_to_csv.CONVERSION_MODE = "sequential"
+            for nb_rows, excel_file in enumerate(excel_to_csv.FILES_MAPPING, start=20):
+                write_workbook(workbooks / excel_file, nb_rows)
+            record = workbooks / excel_to_csv.CONVERSION_RECORD
+            excel_to_csv.main()
+            assert record.exists()
+            converted = {f: (workbooks / f).stat().st_mtime_ns for f in ("erp.csv", "web.csv", "liaison.csv")}
+            excel_to_csv.main()
+            assert {f: (workbooks / f).stat().st_mtime_ns for f in converted} == converted
+            logger.success("✅ Classeurs déjà convertis : conversion ignorée")
+
+            # Nouvelle archive extraite par 00, puis 01 en échec : le registre est retiré
+            write_workbook(workbooks / "Fichier_erp.xlsx", 40)
+            original = excel_to_csv.convert_workbook
+            excel_to_csv.convert_workbook = lambda *args: (_ for _ in ()).throw(ValueError("échec simulé"))
+            try:
+                excel_to_csv.main()
+                raise AssertionError("échec de conversion non propagé")
+            except SystemExit:
+                pass
+            finally:
+                excel_to_csv.convert_workbook = original
+            assert not record.exists()
+            # Relance (00 a répondu 304 : entrées « inchangées ») : 01 reconvertit quand même
+            excel_to_csv.main()
+            assert record.exists()
+            assert pd.read_csv(workbooks / "erp.csv")["product_id"].max() == 39
+            logger.success("✅ Classeur modifié après un échec : reconverti malgré un 304 du script 00")
+
+            logger.success("🎯 Conversion Excel ➔ CSV validée avec succès.")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du test de conversion Excel : {e}")
+            sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# === Script de test 05c - Compteurs d'exclusion et resume_exclusions.csv ===
+# Ce script nettoie des sources synthétiques avec les règles du dépôt et vérifie que :
+# - '<source>_clean' contient exactement les lignes ne violant aucune règle, avec les
+#   seules colonnes de la source,
+# - resume_stats.csv et resume_exclusions.csv reprennent, règle par règle, les mêmes
+#   nombres qu'un comptage indépendant sur la source (une ligne peut violer plusieurs règles),
+# - une source dont toutes les lignes sont rejetées garde des compteurs exacts.
+# Les compteurs viennent d'une seule agrégation ; la table est écrite par un CTAS filtré.
+
+import os
+import sys
+import csv
+import tempfile
+import importlib.util
+from pathlib import Path
+import duckdb
+from loguru import logger
+import warnings
+
+warnings.filterwarnings("ignore")
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_05_exclusions.log"
+
+# ==============================================================================
+# 📦 Chargement du script 05 (nom de fichier non importable directement)
+# ==============================================================================
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+spec = importlib.util.spec_from_file_location("clean_data", SCRIPTS_PATH / "05_clean_data.py")
+clean_data = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(clean_data)
+
+from rules_engine import load_all_rules  # noqa: E402
+
+# Le script 05 reconfigure loguru à l'import : on rétablit les sorties du test
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+# ==============================================================================
+# 🧪 Sources brutes synthétiques : NULL, prix nuls ou négatifs, lignes vides
+# ==============================================================================
+SOURCES_SQL = {
+    "erp": """
+        SELECT
+            CASE WHEN i % 97 = 0 THEN NULL ELSE i END                          AS product_id,
+            CASE WHEN i % 11 = 0 OR i % 97 = 0 THEN NULL ELSE i % 2 END        AS onsale_web,
+            CASE WHEN i % 97 = 0 THEN NULL WHEN i % 13 = 0 THEN -1.0
+                 WHEN i % 17 = 0 THEN 0.0 ELSE (i % 40) + 9.9 END               AS price,
+            CASE WHEN i % 19 = 0 OR i % 97 = 0 THEN NULL ELSE i % 25 END       AS stock_quantity,
+            CASE WHEN i % 97 = 0 THEN NULL ELSE 'instock' END                  AS stock_status
+        FROM range(1, 2000) t(i)
+    """,
+    "web": """
+        SELECT
+            CASE WHEN n % 7 = 0 THEN NULL ELSE 'sku_' || n END AS sku,
+            TIMESTAMP '2023-06-01' + INTERVAL (n) HOUR       AS post_date,
+            'product'                                         AS post_type
+        FROM range(0, 500) t(n)
+    """,
+    # Toutes les lignes rejetées : table nettoyée vide
+    "liaison": """
+        SELECT NULL::BIGINT AS product_id, CASE WHEN i % 2 = 0 THEN NULL ELSE 'sku_' || i END AS id_web
+        FROM range(0, 50) t(i)
+    """,
+}
+
+
+def read_csv_rows(path: Path) -> list:
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        try:
+            all_rules = load_all_rules()
+            con = duckdb.connect(str(tmp / "bottleneck.duckdb"))
+            stats, expected_stats, expected_exclusions = [], [], []
+            for source, sql in SOURCES_SQL.items():
+                raw = tmp / f"{source}.csv"
+                con.execute(f"COPY ({sql}) TO '{raw}' (HEADER)")
+                rules = all_rules[source]
+
+                # 🔎 Comptage de référence, règle par règle, directement sur le fichier brut
+                rows = f"read_csv_auto('{raw}')"
+                columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {rows}").fetchall()]
+                nb_initial = con.execute(f"SELECT COUNT(*) FROM {rows}").fetchone()[0]
+                nb_empty = con.execute(
+                    f"SELECT COUNT(*) FROM {rows} WHERE {' AND '.join(f'{c} IS NULL' for c in columns)}"
+                ).fetchone()[0]
+                rejected = " OR ".join(f"COALESCE({rule['reject_if']}, FALSE)" for rule in rules["clean"])
+                nb_excluded = con.execute(f"SELECT COUNT(*) FROM {rows} WHERE {rejected}").fetchone()[0]
+                expected_stats.append([source, str(nb_initial), str(nb_initial - nb_excluded), str(nb_excluded), str(nb_empty)])
+                for rule in rules["clean"]:
+                    count = con.execute(f"SELECT COUNT(*) FROM {rows} WHERE {rule['reject_if']}").fetchone()[0]
+                    expected_exclusions.append([source, rule["name"], str(count)])
+
+                s = clean_data.clean_source(con, source, raw, rules)
+                stats.append(s)
+
+                # 🧼 Table nettoyée : lignes conservées seulement, colonnes de la source
+                table = f"{source}_clean"
+                assert [row[0] for row in con.execute(f"DESCRIBE {table}").fetchall()] == columns
+                assert con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == nb_initial - nb_excluded
+                assert con.execute(f"""
+                    SELECT COUNT(*) FROM (
+                        SELECT * FROM {rows} WHERE NOT ({rejected})
+                        EXCEPT ALL SELECT * FROM {table}
+                    )
+                """).fetchone()[0] == 0
+                logger.success(f"✅ {table} : {nb_initial - nb_excluded}/{nb_initial} lignes conservées")
+
+            assert stats[-1]["nb_apres_nettoyage"] == 0 and stats[-1]["nb_lignes_initiales"] == 50
+            logger.success("✅ Source entièrement rejetée : compteurs exacts sans ligne conservée")
+
+            # 📊 Résumés écrits : mêmes nombres que le comptage de référence
+            outputs = tmp / "outputs"
+            outputs.mkdir()
+            clean_data.write_summaries(stats, outputs)
+            summary = read_csv_rows(outputs / "resume_stats.csv")
+            assert summary[0] == ["source", "nb_lignes_initiales", "nb_apres_nettoyage", "nb_exclues", "nb_lignes_vides"]
+            assert summary[1:] == expected_stats, summary
+            exclusions = read_csv_rows(outputs / "resume_exclusions.csv")
+            assert exclusions[0] == ["source", "regle", "nb_lignes_rejetees"]
+            assert exclusions[1:] == expected_exclusions, exclusions
+            assert any(row[2] != "0" for row in exclusions[1:] if row[0] == "erp")
+            logger.success(f"✅ resume_exclusions.csv : {len(exclusions) - 1} règles, comptes identiques à la référence")
+
+            con.close()
+            logger.success("🎯 Compteurs d'exclusion validés avec succès.")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du test des compteurs d'exclusion : {e}")
+            sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
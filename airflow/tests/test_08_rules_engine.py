@@ -0,0 +1,175 @@
+# === Script de test 08c - Validation du moteur de règles déclaratives ===
+# Ce script vérifie, sur un petit jeu de données synthétique en mémoire, que :
+# - chaque fichier rules/<source>.json se charge et se compile,
+# - la requête fusionnée (nettoyage + dédoublonnage) donne exactement le même
+#   résultat que les requêtes SQL historiques des scripts 05 et 08,
+# - le plan EXPLAIN de chaque requête fusionnée ne parcourt la source qu'une fois.
+
+import os
+import re
+import sys
+import tempfile
+import duckdb
+from pathlib import Path
+from loguru import logger
+import warnings
+
+warnings.filterwarnings("ignore")
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_08_rules_engine.log"
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+from rules_engine import SOURCES, load_all_rules, compile_dedup, explain  # noqa: E402
+from data_formats import source_reader  # noqa: E402
+
+# ==============================================================================
+# 🧾 Requêtes historiques (référence) des scripts 05 et 08
+# ==============================================================================
+# Les sources sont lues depuis des fichiers Parquet, comme dans le pipeline.
+LEGACY_QUERIES = {
+    "erp": """
+        SELECT product_id, MAX(onsale_web) AS onsale_web, MAX(price) AS price,
+               MAX(stock_quantity) AS stock_quantity, MAX(stock_status) AS stock_status
+        FROM {erp}
+        WHERE product_id IS NOT NULL AND onsale_web IS NOT NULL
+          AND price IS NOT NULL AND price > 0
+          AND stock_quantity IS NOT NULL AND stock_status IS NOT NULL
+        GROUP BY product_id
+    """,
+    "liaison": """
+        SELECT product_id, MIN(id_web) AS id_web
+        FROM {liaison}
+        WHERE product_id IS NOT NULL AND id_web IS NOT NULL
+        GROUP BY product_id
+    """,
+    "web": """
+        SELECT * EXCLUDE (rn) FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY sku ORDER BY post_date DESC) AS rn
+            FROM {web}
+            WHERE sku IS NOT NULL AND post_type = 'product'
+        ) WHERE rn = 1
+    """,
+}
+
+# ==============================================================================
+# 🧪 Jeu de données synthétique (nulls, prix négatifs, doublons, pièces jointes)
+# ==============================================================================
+def create_fixtures(con, fixtures_path: Path) -> dict:
+    """Écrit erp/web/liaison en Parquet et retourne la relation de lecture de chacun."""
+    con.execute("""
+        CREATE TABLE erp_raw AS
+        SELECT
+            CASE WHEN i % 97 = 0 THEN NULL ELSE i % 400 END       AS product_id,
+            CASE WHEN i % 89 = 0 THEN NULL ELSE i % 2 END         AS onsale_web,
+            CASE WHEN i % 53 = 0 THEN NULL
+                 WHEN i % 61 = 0 THEN -5.0 ELSE (i % 50) + 0.5 END AS price,
+            CASE WHEN i % 71 = 0 THEN NULL ELSE i % 30 END        AS stock_quantity,
+            CASE WHEN i % 83 = 0 THEN NULL
+                 WHEN i % 3 = 0 THEN 'outofstock' ELSE 'instock' END AS stock_status
+        FROM range(1000) t(i)
+    """)
+    con.execute("""
+        CREATE TABLE web_raw AS
+        SELECT
+            CASE WHEN i % 79 = 0 THEN NULL ELSE 'sku_' || (i % 300) END AS sku,
+            CASE WHEN i % 37 = 0 THEN NULL
+                 ELSE TIMESTAMP '2024-01-01' + INTERVAL (i) MINUTE END  AS post_date,
+            CASE WHEN i % 4 = 0 THEN 'attachment' ELSE 'product' END    AS post_type,
+            'titre ' || i                                               AS post_title,
+            'extrait ' || i                                             AS post_excerpt,
+            'publish'                                                   AS post_status,
+            (i % 5) * 1.0                                               AS average_rating,
+            i % 17                                                      AS total_sales
+        FROM range(1000) t(i)
+    """)
+    con.execute("""
+        CREATE TABLE liaison_raw AS
+        SELECT
+            CASE WHEN i % 101 = 0 THEN NULL ELSE i % 350 END            AS product_id,
+            CASE WHEN i % 7 = 0 THEN NULL ELSE 'sku_' || (i % 300) END  AS id_web
+        FROM range(800) t(i)
+    """)
+
+    relations = {}
+    for source in SOURCES:
+        path = fixtures_path / f"{source}.parquet"
+        con.execute(f"COPY {source}_raw TO '{path}' (FORMAT PARQUET)")
+        relations[source] = source_reader(path)
+    return relations
+
+
+def count_scans(plan: str) -> int:
+    """Nombre d'opérateurs de lecture dans un plan EXPLAIN (toutes versions de DuckDB).
+
+    Les versions récentes répètent le nom de la fonction de table sous une ligne
+    'Function:' à l'intérieur du même bloc : ces répétitions ne sont pas comptées.
+    """
+    lines = plan.splitlines()
+    nb_scans = 0
+    for i, line in enumerate(lines):
+        for match in re.finditer(r"\b(?:SEQ_SCAN|TABLE_SCAN|PARQUET_SCAN|READ_PARQUET)\b", line):
+            above = lines[i - 1][max(match.start() - 8, 0):match.end() + 8] if i else ""
+            if "Function:" not in above:
+                nb_scans += 1
+    return nb_scans
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    try:
+        all_rules = load_all_rules()
+        assert set(all_rules) == set(SOURCES), f"❌ Sources de règles inattendues : {list(all_rules)}"
+        logger.success(f"✅ Règles chargées : {', '.join(all_rules)}")
+    except Exception as e:
+        logger.error(f"❌ Chargement des règles échoué : {e}")
+        sys.exit(1)
+
+    try:
+        con = duckdb.connect()
+        fixtures_dir = tempfile.TemporaryDirectory()
+        relations = create_fixtures(con, Path(fixtures_dir.name))
+
+        for source, rules in all_rules.items():
+            sql = compile_dedup(rules, relations[source])
+            legacy = LEGACY_QUERIES[source].format(**relations)
+
+            # 🔁 Équivalence avec les requêtes historiques (dans les deux sens)
+            diff = con.execute(f"""
+                SELECT
+                    (SELECT COUNT(*) FROM (({sql}) EXCEPT ALL ({legacy}))),
+                    (SELECT COUNT(*) FROM (({legacy}) EXCEPT ALL ({sql})))
+            """).fetchone()
+            assert diff == (0, 0), f"❌ {source} : résultat différent de la référence {diff}"
+
+            # 🔎 Un seul parcours de la source dans le plan fusionné
+            plan = explain(con, sql)
+            nb_scans = count_scans(plan)
+            assert nb_scans == 1, f"❌ {source} : {nb_scans} parcours de la source dans le plan"
+
+            nb_rows = con.execute(f"SELECT COUNT(*) FROM ({sql})").fetchone()[0]
+            logger.success(f"✅ {source} : {nb_rows} lignes identiques à la référence, plan à un seul parcours")
+
+        fixtures_dir.cleanup()
+        logger.success("🎯 Moteur de règles validé avec succès.")
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de la validation du moteur de règles : {e}")
+        sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# === Script de test 09b - Équivalence incrémental / reconstruction complète ===
+# Ce script simule plusieurs exécutions mensuelles sur des données synthétiques
+# (produits ajoutés, modifiés, supprimés, SKU web republiés, liaisons changées) et vérifie
+# qu'après chaque mois les tables erp_dedup, web_dedup, liaison_dedup et fusion mises à jour
+# en incrémental sont identiques à celles obtenues par une reconstruction complète.
+# Les deux côtés utilisent des moteurs de fusion différents (optimized / standard).
+# Une source sans détection de changement ('full', le défaut) est reconstruite à chaque
+# exécution et impose une fusion complète.
+
+import os
+import sys
+import duckdb
+from pathlib import Path
+from loguru import logger
+import warnings
+
+warnings.filterwarnings("ignore")
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_09_incremental.log"
+
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+# ==============================================================================
+# 📦 Chargement du moteur incrémental et des requêtes de fusion
+# ==============================================================================
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+from rules_engine import load_all_rules  # noqa: E402
+from incremental import refresh_dedup, refresh_fusion  # noqa: E402
+from fusion_engine import FUSION_AFFECTED_KEYS, DELTA_TABLES, cluster_keys, fusion_query  # noqa: E402
+
+MONTHS = 4
+COMPARED_TABLES = ["erp_dedup", "web_dedup", "liaison_dedup", "fusion"]
+
+# ==============================================================================
+# 🧪 Sources nettoyées synthétiques du mois m
+# ==============================================================================
+def load_month(con, m: int):
+    # ERP : catalogue qui grandit, quelques suppressions et changements de prix, doublons
+    con.execute(f"""
+        CREATE OR REPLACE TABLE erp_clean AS
+        SELECT
+            i                                            AS product_id,
+            i % 2                                        AS onsale_web,
+            (i % 40) + 9.9 + CASE WHEN i % 7 = {m} THEN {m} ELSE 0 END AS price,
+            (i * 3 + d) % 25                             AS stock_quantity,
+            CASE WHEN (i + d) % 3 = 0 THEN 'outofstock' ELSE 'instock' END AS stock_status
+        FROM range(0, {300 + 20 * m}) t(i), range(0, 2) u(d)
+        WHERE i % 50 <> {m} AND (d = 0 OR i % 4 = 0)
+    """)
+    # Liaison : correspondance produit ➝ SKU, quelques liaisons réaffectées chaque mois
+    con.execute(f"""
+        CREATE OR REPLACE TABLE liaison_clean AS
+        SELECT
+            i AS product_id,
+            'sku_' || CASE WHEN i % 11 = {m} THEN (i + 1) % 280 ELSE i % 280 END AS id_web
+        FROM range(0, {320 + 15 * m}) t(i)
+        WHERE i % 60 <> {m}
+    """)
+    # Web : publications d'origine, republications datées des mois suivants, pièces jointes,
+    # SKU retirés du site
+    con.execute(f"""
+        CREATE OR REPLACE TABLE web_clean AS
+        SELECT * FROM (
+            SELECT
+                'sku_' || n                                          AS sku,
+                TIMESTAMP '2023-06-01' + INTERVAL (n) HOUR           AS post_date,
+                CASE WHEN n % 9 = 0 THEN 'attachment' ELSE 'product' END AS post_type,
+                'titre ' || n                                        AS post_title,
+                'extrait ' || n                                      AS post_excerpt,
+                'publish'                                            AS post_status,
+                (n % 5) * 1.0                                        AS average_rating,
+                n % 17                                               AS total_sales
+            FROM range(0, {280 + 10 * m}) t(n)
+            UNION ALL
+            SELECT
+                'sku_' || n,
+                TIMESTAMP '2024-01-01' + INTERVAL (k) MONTH,
+                'product',
+                'titre ' || n || ' v' || k,
+                'extrait ' || n || ' v' || k,
+                'publish',
+                ((n + k) % 5) * 1.0,
+                (n + k) % 17
+            FROM range(0, 280) t(n), range(1, {m + 1}) u(k)
+            WHERE n % 13 = k
+        )
+        WHERE NOT (sku IN ('sku_' || {m * 7 + 3}, 'sku_' || {m * 7 + 4}) AND {m} > 0)
+    """)
+
+# ==============================================================================
+# 🔁 Une exécution du pipeline 08 + 09 sur la connexion donnée
+# ==============================================================================
+def run_pipeline(con, all_rules: dict, full: bool, engine: str) -> dict:
+    results = {}
+    for source, rules in all_rules.items():
+        results[source] = refresh_dedup(con, rules, f"{source}_clean", full=full,
+                                        cluster_by=cluster_keys(f"{source}_dedup", engine))
+    results["fusion"] = refresh_fusion(
+        con, fusion_query(engine), key="product_id",
+        affected_sql=FUSION_AFFECTED_KEYS, delta_tables=DELTA_TABLES, full=full,
+    )
+    return results
+
+
+def table_diff(con_a, con_b, table: str) -> int:
+    """Nombre de lignes présentes dans un seul des deux côtés (multi-ensembles)."""
+    rows_a = sorted(con_a.execute(f"SELECT * FROM {table}").fetchall(), key=repr)
+    rows_b = sorted(con_b.execute(f"SELECT * FROM {table}").fetchall(), key=repr)
+    return 0 if rows_a == rows_b else max(len(set(rows_a) ^ set(rows_b)), 1)
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    try:
+        all_rules = load_all_rules()
+        con_inc = duckdb.connect()
+        con_full = duckdb.connect()
+        logger.info("🧪 Deux bases en mémoire : incrémentale et reconstruction complète.")
+    except Exception as e:
+        logger.error(f"❌ Initialisation échouée : {e}")
+        sys.exit(1)
+
+    try:
+        for m in range(MONTHS):
+            load_month(con_inc, m)
+            load_month(con_full, m)
+            # Incrémental avec le moteur optimisé, reconstruction avec le moteur standard
+            inc = run_pipeline(con_inc, all_rules, full=False, engine="optimized")
+            run_pipeline(con_full, all_rules, full=True, engine="standard")
+
+            # 🔎 Après le premier mois, chaque table doit suivre le chemin incrémental
+            if m > 0:
+                for name, result in inc.items():
+                    assert result["mode"] == "incrémental", f"❌ Mois {m} : {name} reconstruit ({result['raison']})"
+                    assert result["cles_modifiees"] < result["lignes"], \
+                        f"❌ Mois {m} : {name} a réécrit toutes ses lignes"
+
+            for table in COMPARED_TABLES:
+                diff = table_diff(con_inc, con_full, table)
+                assert diff == 0, f"❌ Mois {m} : {table} diffère de la reconstruction complète ({diff} lignes)"
+
+            summary = ", ".join(f"{name}={r['cles_modifiees']}/{r['lignes']}" for name, r in inc.items())
+            logger.success(f"✅ Mois {m} : tables identiques (clés écrites/lignes : {summary})")
+
+        # 🔁 Source sans détection de changement : reconstruite à chaque exécution
+        erp_rules = {**all_rules["erp"], "incremental": {"change_detection": "full"}}
+        result = refresh_dedup(con_inc, erp_rules, "erp_clean")
+        assert result["mode"] == "complet" and result["raison"] == "pas de détection de changement", result
+        fusion = refresh_fusion(con_inc, fusion_query("optimized"), key="product_id",
+                                affected_sql=FUSION_AFFECTED_KEYS, delta_tables=DELTA_TABLES)
+        assert fusion["mode"] == "complet", fusion
+        assert table_diff(con_inc, con_full, "fusion") == 0
+        logger.success("✅ Détection 'full' : table et fusion reconstruites, résultat identique")
+
+        logger.success("🎯 Incrémental et reconstruction complète donnent des tables identiques.")
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de la comparaison incrémental / complet : {e}")
+        sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
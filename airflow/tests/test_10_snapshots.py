@@ -0,0 +1,133 @@
+# === Script de test 10 - Snapshots incrémentaux et rétention ===
+# Ce script vérifie sur une base temporaire que :
+# - un second snapshot Parquet ne réexporte que les tables modifiées (les autres sont liées),
+# - une table marquée par les étapes (incremental.mark_tables) est comparée par son marqueur
+#   de version, sans être relue ; les tables sans marqueur sont comparées par hash,
+# - chaque snapshot restauré par IMPORT DATABASE est identique à la base au moment du snapshot,
+# - la rétention ne garde que les N snapshots les plus récents et 'latest' pointe sur le dernier.
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+import duckdb
+from loguru import logger
+import warnings
+
+warnings.filterwarnings("ignore")
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_10_snapshots.log"
+
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+import snapshot_store  # noqa: E402
+from snapshot_store import create_snapshot, apply_retention, list_snapshots, LATEST_LINK  # noqa: E402
+from incremental import mark_tables  # noqa: E402
+
+# ==============================================================================
+# 🔎 Outils de comparaison
+# ==============================================================================
+def dump(con) -> dict:
+    tables = [r[0] for r in con.execute(
+        "SELECT table_name FROM duckdb_tables() WHERE NOT temporary ORDER BY table_name"
+    ).fetchall()]
+    return {t: sorted(con.execute(f"SELECT * FROM {t}").fetchall(), key=repr) for t in tables}
+
+
+def restore(snapshot: Path) -> dict:
+    con = duckdb.connect()
+    con.execute(f"IMPORT DATABASE '{snapshot}'")
+    return dump(con)
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bottleneck.duckdb"
+        snapshot_dir = Path(tmp) / "snapshots"
+        con = duckdb.connect(str(db_path))
+        con.execute("CREATE TABLE fusion AS SELECT i AS product_id, 'titre ' || i AS post_title FROM range(0, 500) t(i)")
+        con.execute("CREATE TABLE ca_total AS SELECT 1234.5 AS ca_total")
+        mark_tables(con, ["fusion"])
+
+        # Horodatages simulés : un snapshot par « jour »
+        base = datetime(2024, 1, 1)
+        original_name = snapshot_store.new_snapshot_name
+        day = {"n": 0}
+        snapshot_store.new_snapshot_name = lambda d: original_name(d, base + timedelta(days=day["n"]))
+
+        try:
+            # 📸 Premier snapshot : tout est exporté
+            first = create_snapshot(db_path, snapshot_dir, "parquet", con=con)
+            expected_first = dump(con)
+            assert sorted(first["tables_exportees"]) == ["ca_total", "fusion", "pipeline_state"], first
+            logger.success("✅ Premier snapshot : toutes les tables exportées.")
+
+            # 📸 Second snapshot : seule ca_total (sans marqueur, comparée par hash) a changé
+            day["n"] = 1
+            con.execute("UPDATE ca_total SET ca_total = 999.9")
+            second = create_snapshot(db_path, snapshot_dir, "parquet", con=con)
+            expected_second = dump(con)
+            assert second["tables_exportees"] == ["ca_total"], second
+            assert second["tables_liees"] == ["fusion", "pipeline_state"], second
+            inode = lambda p: os.stat(p / "fusion.parquet").st_ino  # noqa: E731
+            assert inode(first["path"]) == inode(second["path"]), "❌ fusion.parquet devrait être lié"
+            logger.success("✅ Second snapshot : seule la table modifiée est réexportée.")
+
+            # 🏷️ Table marquée : jugée sur son marqueur, jamais relue
+            day["n"] = 2
+            con.execute("INSERT INTO fusion VALUES (999, 'hors étape')")
+            third = create_snapshot(db_path, snapshot_dir, "parquet", con=con)
+            assert "fusion" in third["tables_liees"], "❌ fusion relue malgré un marqueur inchangé"
+            mark_tables(con, ["fusion"])
+            fourth = create_snapshot(db_path, snapshot_dir, "parquet", con=con)
+            assert sorted(fourth["tables_exportees"]) == ["fusion", "pipeline_state"], fourth
+            logger.success("✅ Table marquée : réexportée seulement quand son marqueur change.")
+
+            # 🔁 Restauration de chaque snapshot
+            assert restore(first["path"]) == expected_first, "❌ Restauration du premier snapshot incorrecte"
+            assert restore(second["path"]) == expected_second, "❌ Restauration du second snapshot incorrecte"
+            assert restore(fourth["path"]) == dump(con), "❌ Restauration du quatrième snapshot incorrecte"
+            logger.success("✅ IMPORT DATABASE restaure chaque snapshot à l'identique.")
+
+            # 🧹 Rétention : 6 snapshots créés, 2 conservés
+            for n in (3, 4):
+                day["n"] = n
+                con.execute(f"INSERT INTO fusion VALUES ({1000 + n}, 'nouveau')")
+                mark_tables(con, ["fusion"])
+                create_snapshot(db_path, snapshot_dir, "parquet", con=con)
+            removed = apply_retention(snapshot_dir, keep=2, max_age_days=0)
+            remaining = [p.name for p in list_snapshots(snapshot_dir)]
+            assert removed == [r["path"].name for r in (first, second, third, fourth)], removed
+            assert len(remaining) == 2, remaining
+            assert os.readlink(snapshot_dir / LATEST_LINK) == remaining[-1]
+            assert restore(snapshot_dir / LATEST_LINK) == dump(con), "❌ 'latest' ne restaure pas l'état courant"
+            logger.success(f"✅ Rétention appliquée : {', '.join(remaining)}")
+
+            logger.success("🎯 Snapshots incrémentaux validés avec succès.")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du test des snapshots : {e}")
+            sys.exit(1)
+        finally:
+            snapshot_store.new_snapshot_name = original_name
+            con.close()
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
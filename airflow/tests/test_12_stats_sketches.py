@@ -0,0 +1,131 @@
+# === Script de test 12b - Statistiques en flux et fusionnables ===
+# Ce script compare les profils de stats_sketches.py aux valeurs exactes numpy sur une
+# distribution asymétrique avec anomalies :
+# - moyenne / écart-type (Welford) exacts, par lots comme par partitions fusionnées,
+# - quantiles, médiane et MAD du t-digest à moins de 0,5 % en rang,
+# - état sérialisé puis fusionné identique, lecture par lots DuckDB en parallèle,
+# - Z-score en flux du script 12 sur une table 'fusion' de 0 ou 1 prix : Z-scores
+#   NULL, comme le moteur sql, sans erreur de requête ni de journalisation.
+
+import os
+import sys
+import json
+import importlib.util
+from pathlib import Path
+import duckdb
+import numpy as np
+from loguru import logger
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_12_stats_sketches.log"
+
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+from stats_sketches import ColumnProfile, outlier_flags, profile_query, profile_partitions  # noqa: E402
+
+spec = importlib.util.spec_from_file_location("calcul_zscore", SCRIPTS_PATH / "12_calcul_zscore_upload.py")
+calcul_zscore = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(calcul_zscore)
+
+# Le script 12 reconfigure loguru à l'import : on rétablit les sorties du test
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+RANK_TOLERANCE = 0.005
+NB_PARTITIONS = 8
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    rng = np.random.default_rng(42)
+    values = np.r_[rng.lognormal(3, 0.6, 500000), rng.normal(400, 5, 300)]
+    rng.shuffle(values)
+
+    try:
+        # 📐 Profil par lots, puis par partitions sérialisées et fusionnées
+        batched = ColumnProfile()
+        for chunk in np.array_split(values, 37):
+            batched.update(chunk)
+
+        states = [json.dumps(ColumnProfile().update(p).to_dict()) for p in np.array_split(values, NB_PARTITIONS)]
+        merged = profile_partitions(states, json.loads)
+
+        for name, profile in [("lots", batched), ("partitions", merged)]:
+            summary = profile.summary()
+            assert summary["count"] == values.size
+            assert abs(summary["mean"] - values.mean()) < 1e-9 * values.mean()
+            assert abs(summary["std"] - values.std(ddof=1)) < 1e-9 * values.std()
+
+            for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+                rank = (values <= profile.digest.quantile(q)).mean()
+                assert abs(rank - q) < RANK_TOLERANCE, f"❌ {name} : quantile {q} au rang {rank:.4f}"
+
+            median = np.median(values)
+            mad = np.median(np.abs(values - median))
+            rank_mad = (np.abs(values - median) <= summary["mad"]).mean()
+            assert abs(rank_mad - 0.5) < RANK_TOLERANCE, f"❌ {name} : MAD {summary['mad']} (exacte {mad})"
+            logger.success(
+                f"✅ Profil par {name} : moyenne/écart-type exacts, médiane {summary['median']:.3f} "
+                f"(exacte {median:.3f}), MAD {summary['mad']:.3f} (exacte {mad:.3f})"
+            )
+
+        # 🚩 Les anomalies injectées sont signalées par le Z-score robuste
+        flags = outlier_flags(values, merged.summary())
+        assert flags["outlier_robust"][values > 350].all(), "❌ Anomalies non détectées"
+        assert flags["outlier_robust"].mean() < 0.05, "❌ Trop de faux positifs"
+        logger.success(f"✅ Anomalies robustes : {int(flags['outlier_robust'].sum())} signalées")
+
+        # 🦆 Lecture par lots depuis DuckDB, partitions profilées en parallèle
+        con = duckdb.connect()
+        con.execute("CREATE TABLE prix AS SELECT * FROM (SELECT unnest(?) AS price) t(price)", [values.tolist()])
+        whole = profile_query(con, "SELECT price FROM prix", batch_rows=50000).summary()
+
+        def profile_partition(i):
+            return profile_query(con.cursor(), f"SELECT price FROM prix WHERE hash(rowid) % {NB_PARTITIONS} = {i}")
+
+        parts = profile_partitions(list(range(NB_PARTITIONS)), profile_partition).summary()
+        assert whole["count"] == parts["count"] == values.size
+        assert abs(whole["mean"] - parts["mean"]) < 1e-9 * whole["mean"]
+        assert abs(whole["std"] - parts["std"]) < 1e-9 * whole["std"]
+        logger.success("✅ DuckDB : profil global et profil par partitions parallèles identiques")
+
+        # 🍷 Z-score en flux (script 12) sur 0 et 1 prix : NULL, comme le moteur sql
+        for nb_rows in (0, 1):
+            con.execute(f"""
+                CREATE OR REPLACE TABLE fusion AS
+                SELECT range AS product_id, 'vin ' || range AS post_title, 12.5 AS price FROM range({nb_rows})
+            """)
+            summary = profile_query(con, "SELECT price FROM fusion WHERE price IS NOT NULL").summary()
+            assert calcul_zscore.format_stat(summary["std"]) == "n/d"
+            con.execute(f"CREATE OR REPLACE TABLE zscore_vins AS {calcul_zscore.streaming_zscore_query()}",
+                        calcul_zscore.profile_parameters(summary))
+            streaming = con.execute("SELECT * FROM zscore_vins").fetchall()
+            sql = con.execute(calcul_zscore.zscore_query(groups=[])).fetchall()
+            assert len(streaming) == len(sql) == nb_rows
+            assert all(row[3] is None and row[4] is None and row[5] == "ordinaire" for row in streaming), streaming
+            assert all(row[3] is None for row in sql), sql
+        logger.success("✅ Z-score en flux sur 0 et 1 prix : Z-scores NULL, comme le moteur sql")
+
+        logger.success("🎯 Statistiques en flux validées avec succès.")
+    except Exception as e:
+        logger.error(f"❌ Erreur lors du test des statistiques en flux : {e}")
+        sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
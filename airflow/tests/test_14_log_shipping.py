@@ -0,0 +1,108 @@
+# === Script de test 14 - Expédition incrémentale des logs ===
+# Ce script simule plusieurs exécutions sur un répertoire de logs temporaire
+# (ajouts, ligne incomplète, rotation loguru par renommage, troncature) et vérifie que :
+# - seuls les octets nouveaux sont envoyés à chaque exécution, sous 'logs/<run_id>/',
+# - chaque tranche contient exactement les octets [début, fin) de son fichier.
+# Les envois MinIO sont redirigés vers un répertoire local.
+
+import os
+import sys
+import gzip
+import shutil
+import tempfile
+from pathlib import Path
+from loguru import logger
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_14_log_shipping.log"
+
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+import log_shipping  # noqa: E402
+
+# ==============================================================================
+# 🔎 Outils
+# ==============================================================================
+def shipped(bucket: Path) -> dict:
+    """{clé relative : contenu décompressé} de toutes les tranches envoyées."""
+    return {
+        obj.relative_to(bucket).as_posix(): gzip.decompress(obj.read_bytes())
+        for obj in bucket.rglob("*.gz")
+    }
+
+
+def append(path: Path, text: str):
+    with open(path, "a") as f:
+        f.write(text)
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        logs = Path(tmp) / "logs"
+        bucket = Path(tmp) / "bucket"
+        logs.mkdir()
+        log_shipping.upload_file = lambda local, key, bucket_name=None, **_: (
+            (bucket / key).parent.mkdir(parents=True, exist_ok=True) or shutil.copy(local, bucket / key)
+        )
+
+        try:
+            # 1️⃣ Premier envoi : les lignes terminées (la ligne en cours d'écriture attend)
+            append(logs / "fusion.log", "ligne 1\nligne 2\n")
+            append(logs / "calcul_ca.log", "ca 1\nca partiel")
+            first = log_shipping.ship_logs(logs, "run_1", compression="gzip")
+            assert first["octets_lus"] == len("ligne 1\nligne 2\n") + len("ca 1\n"), first
+            assert (bucket / "logs" / "run_1").is_dir(), "❌ Clés non préfixées par le run_id"
+            logger.success(f"✅ Exécution 1 : {first['octets_lus']} octets envoyés")
+
+            # 2️⃣ Sans nouveau contenu : rien n'est envoyé
+            assert log_shipping.ship_logs(logs, "run_2", compression="gzip")["tranches"] == 0
+            logger.success("✅ Exécution 2 : aucun envoi sans nouveau contenu")
+
+            # 3️⃣ Ajouts puis rotation : le fichier renommé garde son offset (même inode)
+            append(logs / "calcul_ca.log", " fin\n")
+            append(logs / "fusion.log", "ligne 3\n")
+            (logs / "fusion.log").rename(logs / "fusion.2024-01-01_00-00-00_000000.log")
+            append(logs / "fusion.log", "nouvelle 1\n")
+            third = log_shipping.ship_logs(logs, "run_3", compression="gzip")
+            expected = len("ca partiel fin\n") + len("ligne 3\n") + len("nouvelle 1\n")
+            assert third["octets_lus"] == expected, third
+            logger.success(f"✅ Exécution 3 : {third['octets_lus']} octets (ajouts + rotation)")
+
+            # 4️⃣ Troncature : le fichier est renvoyé depuis le début
+            (logs / "calcul_ca.log").write_text("recommencé\n")
+            log_shipping.ship_logs(logs, "run_4", compression="gzip")
+
+            # 🔁 Chaque tranche porte exactement les octets [début, fin) de son fichier
+            assert shipped(bucket) == {
+                "logs/run_1/fusion.log.0-16.gz": b"ligne 1\nligne 2\n",
+                "logs/run_1/calcul_ca.log.0-5.gz": b"ca 1\n",
+                "logs/run_3/calcul_ca.log.5-20.gz": b"ca partiel fin\n",
+                "logs/run_3/fusion.2024-01-01_00-00-00_000000.log.16-24.gz": b"ligne 3\n",
+                "logs/run_3/fusion.log.0-11.gz": b"nouvelle 1\n",
+                "logs/run_4/calcul_ca.log.0-12.gz": "recommencé\n".encode(),
+            }, sorted(shipped(bucket))
+            logger.success("✅ Tranches exactes, rotation et troncature comprises")
+
+            logger.success("🎯 Expédition incrémentale des logs validée avec succès.")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du test d'expédition des logs : {e}")
+            sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
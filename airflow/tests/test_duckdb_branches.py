@@ -0,0 +1,140 @@
+# === Script de test - Bases de sortie des branches parallèles (duckdb_branches.py) ===
+# Ce script crée une base de pipeline temporaire et vérifie que :
+# - deux branches écrivent en même temps, dans des processus distincts, pendant qu'un
+#   lecteur garde la base ouverte en lecture seule (aucun conflit de verrou),
+# - les tables du pipeline sont lisibles sans qualification depuis une branche,
+# - la fusion recopie les tables, les métriques et les marqueurs de version (la ligne
+#   la plus récente l'emporte), puis supprime les branches ; deux branches produisant
+#   la même table sont refusées.
+
+import os
+import sys
+import subprocess
+import tempfile
+from pathlib import Path
+import duckdb
+from loguru import logger
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_duckdb_branches.log"
+
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+from duckdb_branches import branch_path, connect_branch, merge_branches  # noqa: E402
+from run_metrics import load_metrics, record_metrics  # noqa: E402
+from incremental import mark_tables, table_versions  # noqa: E402
+
+# Étape factice d'une branche : lit 'fusion', écrit sa table et ses métriques,
+# garde la base ouverte une seconde pour que les deux branches se chevauchent
+BRANCH_STAGE = """
+import sys, time
+sys.path.insert(0, {scripts!r})
+from duckdb_settings import connect_duckdb
+from run_metrics import record_metrics
+from incremental import mark_tables
+con = connect_duckdb({db!r}, stage=sys.argv[1])
+con.execute(f"CREATE OR REPLACE TABLE resultat_{{sys.argv[1]}} AS SELECT SUM(id) AS total FROM fusion")
+mark_tables(con, [f"resultat_{{sys.argv[1]}}"])
+record_metrics(con, sys.argv[1], {{sys.argv[1] + ".lignes": 10}}, run_id="run_2")
+time.sleep(1)
+con.close()
+"""
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        db_path = tmp / "bottleneck.duckdb"
+        branches_path = tmp / "branches"
+
+        con = duckdb.connect(str(db_path))
+        con.execute("CREATE TABLE fusion AS SELECT range AS id FROM range(10)")
+        record_metrics(con, "fusion", {"fusion.lignes": 10}, run_id="run_1")
+        record_metrics(con, "ca", {"ca.lignes": 3}, run_id="run_1")
+        mark_tables(con, ["fusion"])
+        fusion_version = table_versions(con)["fusion"]
+        con.close()
+
+        try:
+            # 1️⃣ Deux branches en écriture et un lecteur, en parallèle
+            reader = duckdb.connect(str(db_path), read_only=True)
+            script = BRANCH_STAGE.format(scripts=str(SCRIPTS_PATH), db=str(db_path))
+            env = {**os.environ, "DUCKDB_BRANCHES_PATH": str(branches_path)}
+            processes = [
+                subprocess.Popen([sys.executable, "-c", script, branch], env={**env, "DUCKDB_BRANCH": branch},
+                                 stderr=subprocess.PIPE, text=True)
+                for branch in ("ca", "zscore")
+            ]
+            for process in processes:
+                _, stderr = process.communicate(timeout=60)
+                assert process.returncode == 0, f"❌ Branche en échec : {stderr}"
+            assert reader.execute("SELECT COUNT(*) FROM fusion").fetchone()[0] == 10
+            reader.close()
+            logger.success("✅ Deux branches en écriture et un lecteur sans conflit de verrou")
+
+            # 2️⃣ Depuis une branche : tables du pipeline visibles, historique des métriques repris
+            con = connect_branch(db_path, "ca", branches_path=branches_path)
+            assert con.execute("SELECT total FROM resultat_ca").fetchone()[0] == 45
+            assert con.execute("SELECT COUNT(*) FROM fusion").fetchone()[0] == 10
+            assert load_metrics(con, "run_1") == {"fusion.lignes": 10, "ca.lignes": 3}
+            assert table_versions(con)["fusion"] == fusion_version
+            con.close()
+            con = connect_branch(db_path, "absente", read_only=True, branches_path=branches_path)
+            assert con.execute("SELECT COUNT(*) FROM fusion").fetchone()[0] == 10
+            con.close()
+            logger.success("✅ Tables et métriques du pipeline lisibles depuis une branche")
+
+            # 3️⃣ Fusion : tables recopiées, métriques ajoutées, historique intact, branches supprimées
+            con = duckdb.connect(str(db_path))
+            record_metrics(con, "ca", {"ca.lignes": 4}, run_id="run_1")
+            merged = merge_branches(con, ["ca", "zscore", "absente"], branches_path=branches_path)
+            assert merged == {
+                branch: ["pipeline_state", f"resultat_{branch}", "run_metrics"] for branch in ("ca", "zscore")
+            }, merged
+            versions = table_versions(con)
+            assert versions["fusion"] == fusion_version and {"resultat_ca", "resultat_zscore"} <= set(versions), versions
+            assert con.execute("SELECT total FROM resultat_zscore").fetchone()[0] == 45
+            assert load_metrics(con, "run_2") == {"ca.lignes": 10, "zscore.lignes": 10}
+            assert load_metrics(con, "run_1")["ca.lignes"] == 4
+            assert not any(branch_path(b, branches_path).exists() for b in ("ca", "zscore"))
+            con.close()
+            logger.success("✅ Branches fusionnées puis supprimées, métriques et marqueurs les plus récents conservés")
+
+            # 🚫 Même table produite par deux branches : refusé avant écriture
+            for branch in ("ca", "zscore"):
+                branch_con = connect_branch(db_path, branch, branches_path=branches_path)
+                branch_con.execute("CREATE TABLE doublon AS SELECT 1 AS x")
+                branch_con.close()
+            con = duckdb.connect(str(db_path))
+            try:
+                merge_branches(con, ["ca", "zscore"], branches_path=branches_path)
+                raise AssertionError("conflit de tables non détecté")
+            except ValueError as e:
+                assert "doublon" in str(e)
+            assert "doublon" not in [row[0] for row in con.execute("SHOW TABLES").fetchall()]
+            con.close()
+            logger.success("✅ Conflit de tables entre branches refusé")
+
+            logger.success("🎯 Bases de branche validées avec succès.")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du test des bases de branche : {e}")
+            sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# === Script de test - Synchronisation et manifeste MinIO (minio_storage.py) ===
+# Ce script remplace le client S3 par un bucket en mémoire et vérifie que :
+# - l'ETag local suit le calcul S3 (MD5 en envoi simple, MD5 des MD5 de blocs en multipart),
+# - la synchronisation n'envoie que les fichiers modifiés : ETag identique, ou ETag différent
+#   mais SHA-256 des métadonnées identique ; ces HEAD sont envoyés en parallèle,
+# - la vérification du manifeste détecte les objets absents, de taille ou de contenu différents.
+
+import os
+import sys
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from botocore.exceptions import ClientError
+from loguru import logger
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_minio_storage.log"
+
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+import minio_storage  # noqa: E402
+from minio_storage import (  # noqa: E402
+    SHA256_METADATA_KEY, local_fingerprint, read_manifest, upload_many, verify_manifest,
+)
+
+BUCKET = "bucket-test"
+MB = 1024 * 1024
+
+
+class MemoryS3:
+    """Client S3 minimal en mémoire : listing paginé, HEAD, envois et objets JSON.
+
+    Les envois sont stockés en une fois (ETag = MD5 du contenu) : un fichier local
+    multipart a donc un ETag différent de l'objet, comme après un autre découpage.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = []
+        self.heads = []
+        self.head_delay = 0.0
+        self.active_heads = 0
+        self.max_active_heads = 0
+        self.lock = threading.Lock()
+
+    def put(self, key: str, body: bytes, sha256: str = None, etag: str = None):
+        metadata = {SHA256_METADATA_KEY: sha256} if sha256 else {}
+        self.objects[key] = {"body": body, "etag": etag or hashlib.md5(body).hexdigest(), "metadata": metadata}
+
+    def get_paginator(self, name):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                contents = [
+                    {"Key": key, "Size": len(obj["body"]), "ETag": f'"{obj["etag"]}"'}
+                    for key, obj in sorted(client.objects.items()) if key.startswith(Prefix)
+                ]
+                # Deux pages pour parcourir la pagination
+                half = len(contents) // 2
+                return [{"Contents": contents[:half]}, {"Contents": contents[half:]}]
+
+        return Paginator()
+
+    def head_object(self, Bucket, Key):
+        with self.lock:
+            self.heads.append(Key)
+            self.active_heads += 1
+            self.max_active_heads = max(self.max_active_heads, self.active_heads)
+        time.sleep(self.head_delay)
+        with self.lock:
+            self.active_heads -= 1
+        obj = self.objects[Key]
+        return {"ETag": f'"{obj["etag"]}"', "ContentLength": len(obj["body"]), "Metadata": obj["metadata"]}
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None, Config=None):
+        with self.lock:
+            self.uploads.append(key)
+        self.put(key, Path(filename).read_bytes(), (ExtraArgs or {}).get("Metadata", {}).get(SHA256_METADATA_KEY))
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.put(Key, Body)
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        body = self.objects[Key]["body"]
+
+        class Body:
+            def read(self):
+                return body
+
+        return {"Body": Body()}
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    client = MemoryS3()
+    previous = (minio_storage._client, minio_storage.MULTIPART_THRESHOLD_MB, minio_storage.MULTIPART_CHUNK_MB)
+    minio_storage._client = client
+    minio_storage.MULTIPART_THRESHOLD_MB = minio_storage.MULTIPART_CHUNK_MB = 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        try:
+            # 1️⃣ ETag local : MD5 en envoi simple, MD5 des MD5 de blocs + '-<nb_blocs>' en multipart
+            small = tmp / "petit.csv"
+            small.write_bytes(b"product_id,price\n1,10.5\n")
+            large = tmp / "gros.csv"
+            large.write_bytes(os.urandom(2 * MB + MB // 2))
+            assert local_fingerprint(small)["etag"] == hashlib.md5(small.read_bytes()).hexdigest()
+            data = large.read_bytes()
+            parts = [hashlib.md5(data[i:i + MB]).digest() for i in range(0, len(data), MB)]
+            fingerprint = local_fingerprint(large)
+            assert fingerprint["etag"] == f"{hashlib.md5(b''.join(parts)).hexdigest()}-3", fingerprint
+            assert fingerprint["sha256"] == hashlib.sha256(data).hexdigest() and fingerprint["size"] == len(data)
+            logger.success(f"✅ ETag multipart local : {fingerprint['etag']}")
+
+            # 2️⃣ Synchronisation : seuls les fichiers modifiés sont envoyés
+            files = {}
+            for name in ("identique", "multipart_identique", "multipart_modifie", "taille", "absent"):
+                path = tmp / f"{name}.bin"
+                path.write_bytes(os.urandom(MB + 1000) if name.startswith("multipart") else name.encode() * 100)
+                files[name] = (path, f"data/outputs/{name}.bin")
+            body = lambda name: files[name][0].read_bytes()  # noqa: E731
+            sha = lambda name: hashlib.sha256(body(name)).hexdigest()  # noqa: E731
+            client.put(files["identique"][1], body("identique"))
+            client.put(files["multipart_identique"][1], body("multipart_identique"), sha256=sha("multipart_identique"))
+            client.put(files["multipart_modifie"][1], body("multipart_modifie"), sha256="0" * 64)
+            client.put(files["taille"][1], body("taille") + b"!")
+
+            client.head_delay = 0.2
+            uploaded = upload_many(list(files.values()), bucket=BUCKET, sync=True)
+            assert sorted(key for _, key in uploaded) == sorted(
+                files[name][1] for name in ("multipart_modifie", "taille", "absent")
+            ), uploaded
+            assert sorted(client.heads) == sorted(files[name][1] for name in ("multipart_identique", "multipart_modifie"))
+            assert client.max_active_heads == 2, client.max_active_heads
+            logger.success("✅ Synchronisation : ETag ou SHA-256 identiques ignorés, HEAD en parallèle")
+
+            # Relance : plus rien à envoyer (les objets envoyés portent leur SHA-256)
+            client.uploads.clear()
+            assert upload_many(list(files.values()), bucket=BUCKET, sync=True) == [] and client.uploads == []
+            logger.success("✅ Relance de la synchronisation : aucun envoi")
+
+            # 3️⃣ Manifeste : écart de présence, de taille ou de contenu détecté sans téléchargement
+            manifest_key = "data/outputs/_manifest.json"
+            upload_many(list(files.values()), bucket=BUCKET, sync=False, manifest_key=manifest_key)
+            manifest = read_manifest(manifest_key, bucket=BUCKET)
+            assert set(manifest["objects"]) == {key for _, key in files.values()}
+            assert sorted(verify_manifest(manifest, bucket=BUCKET)["ok"]) == sorted(manifest["objects"])
+
+            del client.objects[files["absent"][1]]
+            client.put(files["taille"][1], body("taille")[:-1])
+            client.put(files["identique"][1], body("identique")[::-1])
+            client.put(files["multipart_modifie"][1], os.urandom(MB + 1000), sha256="1" * 64)
+            client.put(files["multipart_identique"][1], body("multipart_identique"),
+                       sha256=sha("multipart_identique"), etag="autre-decoupage-2")
+            report = {status: sorted(keys) for status, keys in verify_manifest(manifest, bucket=BUCKET).items()}
+            assert report == {
+                "ok": [files["multipart_identique"][1]],
+                "missing": [files["absent"][1]],
+                "size_mismatch": [files["taille"][1]],
+                "checksum_mismatch": sorted(files[name][1] for name in ("identique", "multipart_modifie")),
+            }, report
+            assert read_manifest("data/outputs/absent.json", bucket=BUCKET) is None
+            logger.success("✅ Manifeste : objet absent, taille et contenu modifiés détectés")
+
+            logger.success("🎯 Synchronisation MinIO validée avec succès.")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du test de synchronisation MinIO : {e}")
+            sys.exit(1)
+        finally:
+            minio_storage._client, minio_storage.MULTIPART_THRESHOLD_MB, minio_storage.MULTIPART_CHUNK_MB = previous
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
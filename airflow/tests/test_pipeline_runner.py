@@ -0,0 +1,128 @@
+# === Script de test - Runner un processus (pipeline_runner.py) ===
+# Ce script exécute des étapes factices dans un seul processus et vérifie que :
+# - toutes les étapes et leurs tests partagent la même base ouverte une seule fois
+#   (un test qui ouvre la base directement et une lecture read_only réussissent),
+# - les réglages DuckDB propres à une étape ne fuient pas vers la suivante,
+# - un sys.exit(1) arrête la suite, sauf pour les étapes toujours exécutées (logs).
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+import duckdb
+from loguru import logger
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_pipeline_runner.log"
+
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+import pipeline_runner  # noqa: E402
+from duckdb_settings import share_connection, shared_open_time, close_shared_connection  # noqa: E402
+
+# ==============================================================================
+# 🧩 Étapes factices
+# ==============================================================================
+STAGES = {
+    "05_ecriture.py": """
+from duckdb_settings import connect_duckdb
+def main():
+    con = connect_duckdb(DB, stage="ecriture")
+    assert con.execute("SELECT current_setting('threads')").fetchone()[0] == THREADS + 1
+    con.execute("CREATE TABLE produits AS SELECT range AS product_id FROM range(100)")
+    con.close()
+""",
+    "test_05_ecriture.py": """
+import duckdb
+def main():
+    con = duckdb.connect(DB)
+    assert con.execute("SELECT COUNT(*) FROM produits").fetchone()[0] == 100
+""",
+    "06_lecture.py": """
+from duckdb_settings import connect_duckdb
+def main():
+    con = connect_duckdb(DB, stage="lecture", read_only=True)
+    assert con.execute("SELECT current_setting('threads')").fetchone()[0] == THREADS
+    assert con.execute("SELECT SUM(product_id) FROM produits").fetchone()[0] == 4950
+    con.close()
+""",
+    "08_echec.py": """
+import sys
+def main():
+    sys.exit(1)
+""",
+    "09_ignoree.py": """
+def main():
+    raise AssertionError("étape exécutée après un échec")
+""",
+    "14_logs.py": """
+def main():
+    pass
+""",
+}
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bottleneck.duckdb"
+        threads = duckdb.connect().execute("SELECT current_setting('threads')").fetchone()[0]
+        paths = []
+        for name, body in STAGES.items():
+            path = Path(tmp) / name
+            path.write_text(f"DB = {str(db_path)!r}\nTHREADS = {threads}\n{body}")
+            paths.append(path)
+
+        os.environ["DUCKDB_ECRITURE_THREADS"] = str(threads + 1)
+        try:
+            share_connection(db_path)
+            results = pipeline_runner.run_stages(paths, always_run={"14_logs"})
+            open_time = shared_open_time()
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de l'exécution du runner : {e}")
+            sys.exit(1)
+        finally:
+            close_shared_connection()
+            del os.environ["DUCKDB_ECRITURE_THREADS"]
+
+        # Les étapes remplacent les sinks loguru : ceux du test sont rétablis
+        logger.remove()
+        logger.add(sys.stdout, level="INFO")
+        logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+        try:
+            codes = {r["etape"]: r["code"] for r in results}
+            assert codes == {
+                "05_ecriture": 0, "test_05_ecriture": 0, "06_lecture": 0, "08_echec": 1, "14_logs": 0,
+            }, codes
+            logger.success("✅ Base partagée : écriture, test direct et lecture read_only dans le même processus")
+            logger.success("✅ Réglages de l'étape rétablis pour la suivante")
+            logger.success("✅ Échec : étape suivante ignorée, étape des logs exécutée")
+
+            assert open_time > 0, "❌ Connexion partagée jamais ouverte"
+            report = pipeline_runner.overhead_report({"duckdb": 0.1}, open_time, results, 1.0)
+            assert len(report) == len(results) + 3, report
+            logger.success("✅ Bilan démarrage / exécution produit")
+
+            logger.success("🎯 Runner un processus validé avec succès.")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du test du runner : {e}")
+            sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
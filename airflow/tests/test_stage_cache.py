@@ -0,0 +1,236 @@
+# === Script de test - Cache des étapes par empreinte (stage_cache.py) ===
+# Ce script déclare une étape factice sur une base et des répertoires temporaires
+# (registre DuckDB) et vérifie que :
+# - l'étape est ignorée quand ses entrées sont inchangées, ses métriques reprises,
+# - un fichier de sortie supprimé est restauré depuis le cache,
+# - un changement de fichier, de table, de variable ou de sortie force l'exécution,
+# - une table marquée (incremental.mark_tables) est comparée par son marqueur de version,
+# - une étape ignorée qui envoie ses fichiers dans MinIO les re-synchronise, et s'exécute
+#   si l'envoi échoue ; les journaux vidés par 09 ne font pas partie des sorties de 08,
+# - 09, qui vide et re-marque les journaux '<source>_dedup_delta', est ignoré dès la
+#   relance suivante, et le code de chaque étape couvre les modules qu'elle importe,
+# - l'éviction ne garde que les empreintes les plus récentes, registre injoignable toléré.
+
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+import duckdb
+from loguru import logger
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_stage_cache.log"
+
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+import stage_cache  # noqa: E402
+from stage_cache import CACHED_STAGES, DEDUP_TABLES, DuckDBStore, evict, run_cached  # noqa: E402
+from storage_backend import OUTPUTS_PREFIX  # noqa: E402
+from fusion_engine import DELTA_TABLES  # noqa: E402
+from incremental import mark_tables  # noqa: E402
+from run_metrics import load_metrics, record_metrics  # noqa: E402
+
+STAGE = "99_etape_factice"
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        db_path = tmp / "bottleneck.duckdb"
+        outputs = tmp / "outputs"
+        cache_dir = tmp / "stages"
+        input_file = tmp / "parametres.json"
+        input_file.write_text('{"seuil": 10}')
+
+        con = duckdb.connect(str(db_path))
+        con.execute("CREATE TABLE source AS SELECT range AS id FROM range(1000)")
+        con.close()
+
+        CACHED_STAGES[STAGE] = {
+            "code": [],
+            "files": [input_file],
+            "tables": ["source"],
+            "env": ["ETAPE_FACTICE_SEUIL"],
+            "outputs": {"tables": ["cible"], "files": ["cible.csv"]},
+            "metrics": "factice",
+        }
+        store = DuckDBStore(tmp / "stage_cache.duckdb")
+        upload_many = stage_cache.upload_many
+        executions = []
+
+        def run(run_id: str, store=store) -> int:
+            def execute() -> int:
+                executions.append(run_id)
+                con = duckdb.connect(str(db_path))
+                con.execute("CREATE OR REPLACE TABLE cible AS SELECT id * 2 AS id FROM source")
+                outputs.mkdir(exist_ok=True)
+                con.execute(f"COPY cible TO '{outputs / 'cible.csv'}' (HEADER)")
+                record_metrics(con, "factice", {"factice.lignes": 1000}, run_id=run_id)
+                con.close()
+                return 0
+
+            return run_cached(STAGE, execute, lambda: duckdb.connect(str(db_path)), run_id=run_id,
+                              store=store, outputs_path=outputs, cache_dir=cache_dir)
+
+        def metrics(run_id: str) -> dict:
+            con = duckdb.connect(str(db_path))
+            try:
+                return load_metrics(con, run_id)
+            finally:
+                con.close()
+
+        try:
+            # 1️⃣ Première exécution, puis saut avec reprise des métriques
+            assert run("run_1") == 0 and run("run_2") == 0
+            assert executions == ["run_1"], executions
+            assert metrics("run_2") == {"factice.lignes": 1000}, metrics("run_2")
+            logger.success("✅ Entrées inchangées : étape ignorée, métriques reprises")
+
+            # 2️⃣ Fichier de sortie supprimé : restauré sans exécution
+            expected = (outputs / "cible.csv").read_bytes()
+            (outputs / "cible.csv").unlink()
+            run("run_3")
+            assert executions == ["run_1"] and (outputs / "cible.csv").read_bytes() == expected
+            logger.success("✅ Fichier de sortie restauré depuis le cache")
+
+            # 3️⃣ Changements qui invalident l'empreinte ou la sortie
+            input_file.write_text('{"seuil": 20}')
+            run("run_4")
+            con = duckdb.connect(str(db_path))
+            con.execute("INSERT INTO source VALUES (1000)")
+            con.close()
+            run("run_5")
+            os.environ["ETAPE_FACTICE_SEUIL"] = "5"
+            run("run_6")
+            con = duckdb.connect(str(db_path))
+            con.execute("DELETE FROM cible WHERE id = 0")
+            con.close()
+            run("run_7")
+            assert executions == ["run_1", "run_4", "run_5", "run_6", "run_7"], executions
+            logger.success("✅ Fichier, table, variable ou sortie modifiés : étape exécutée")
+
+            # 🧹 Éviction : seules les empreintes les plus récentes sont conservées
+            assert len(store.entries(STAGE)) == 4
+            removed = evict(store, [STAGE], max_entries=2, cache_dir=cache_dir)
+            assert len(removed) == 2 and len(store.entries(STAGE)) == 2
+            assert sorted(p.name for p in (cache_dir / STAGE).iterdir()) == sorted(fp for fp, _ in store.entries(STAGE))
+            logger.success("✅ Éviction : 2 empreintes et leurs copies supprimées")
+
+            # ⚠️ Registre injoignable : l'étape s'exécute normalement
+            class UnavailableStore(DuckDBStore):
+                def get(self, stage, fingerprint):
+                    raise ConnectionError("registre injoignable")
+
+            assert run("run_8", store=UnavailableStore(tmp / "stage_cache.duckdb")) == 0
+            assert executions[-1] == "run_8"
+            logger.success("✅ Registre injoignable : exécution normale")
+
+            # 🏷️ Table marquée : comparée par son marqueur, sans relecture des lignes
+            con = duckdb.connect(str(db_path))
+            mark_tables(con, ["source"])
+            con.close()
+            run("run_9")
+            con = duckdb.connect(str(db_path))
+            con.execute("UPDATE source SET id = id + 1 WHERE id = 1000")
+            con.close()
+            run("run_10")
+            con = duckdb.connect(str(db_path))
+            mark_tables(con, ["source"])
+            con.close()
+            run("run_11")
+            assert executions[-2:] == ["run_9", "run_11"], executions
+            logger.success("✅ Table marquée : nouvelle version détectée par son seul marqueur")
+
+            # ☁️ Étape ignorée qui envoie ses fichiers : re-synchronisation, exécution si l'envoi échoue
+            uploads = []
+
+            def recorder(files, sync=False):
+                uploads.append((files, sync))
+                return []
+
+            def failing(files, sync=False):
+                raise RuntimeError("MinIO injoignable")
+
+            CACHED_STAGES[STAGE]["upload"] = True
+            stage_cache.upload_many = recorder
+            run("run_12")
+            assert executions[-1] == "run_11"
+            assert uploads == [([(outputs / "cible.csv", f"{OUTPUTS_PREFIX}cible.csv")], True)], uploads
+            stage_cache.upload_many = failing
+            run("run_13")
+            assert executions[-1] == "run_13"
+            assert not set(DELTA_TABLES) & set(CACHED_STAGES["08_dedoublonnage"]["outputs"]["tables"])
+            logger.success("✅ Étape ignorée : fichiers re-synchronisés dans MinIO, exécutée si l'envoi échoue")
+
+            # 🔗 09 consomme les journaux de 08 : ignoré dès la relance suivante
+            con = duckdb.connect(str(db_path))
+            for table in DEDUP_TABLES + DELTA_TABLES:
+                con.execute(f"CREATE TABLE {table} AS SELECT range AS product_id FROM range(10)")
+            mark_tables(con, DEDUP_TABLES + DELTA_TABLES)
+            con.close()
+
+            def run_fusion(run_id: str) -> int:
+                def execute() -> int:
+                    executions.append(run_id)
+                    con = duckdb.connect(str(db_path))
+                    con.execute("CREATE OR REPLACE TABLE fusion AS SELECT * FROM erp_dedup")
+                    con.execute(f"COPY fusion TO '{outputs / 'fusion.csv'}' (HEADER)")
+                    for table in DELTA_TABLES:
+                        con.execute(f"DELETE FROM {table}")
+                    mark_tables(con, ["fusion"] + DELTA_TABLES)
+                    record_metrics(con, "fusion", {"fusion.lignes": 10}, run_id=run_id)
+                    con.close()
+                    return 0
+
+                return run_cached("09_fusion", execute, lambda: duckdb.connect(str(db_path)), run_id=run_id,
+                                  store=store, outputs_path=outputs, cache_dir=cache_dir)
+
+            run_fusion("run_14")
+            run_fusion("run_15")
+            assert executions[-1] == "run_14", executions
+            con = duckdb.connect(str(db_path))
+            con.execute("INSERT INTO erp_dedup_delta VALUES (3)")
+            mark_tables(con, ["erp_dedup", "erp_dedup_delta"])
+            con.close()
+            run_fusion("run_16")
+            assert executions[-1] == "run_16", executions
+            logger.success("✅ 09 ignoré dès la relance qui suit sa consommation des journaux, relancé après 08")
+
+            # 📜 Code des étapes : chaque module du dossier scripts importé par le script est déclaré
+            for stage, spec in CACHED_STAGES.items():
+                if stage == STAGE:
+                    continue
+                source = (SCRIPTS_PATH / spec["code"][0]).read_text(encoding="utf-8")
+                imported = {f"{name}.py" for name in re.findall(r"^(?:from|import) (\w+)", source, re.MULTILINE)}
+                missing = {name for name in imported if (SCRIPTS_PATH / name).exists()} - set(spec["code"])
+                assert not missing, f"{stage} : {sorted(missing)} absents de 'code'"
+            logger.success("✅ Modules importés par chaque étape inclus dans son empreinte")
+
+            logger.success("🎯 Cache des étapes validé avec succès.")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du test du cache des étapes : {e}")
+            sys.exit(1)
+        finally:
+            stage_cache.upload_many = upload_many
+            os.environ.pop("ETAPE_FACTICE_SEUIL", None)
+            del CACHED_STAGES[STAGE]
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
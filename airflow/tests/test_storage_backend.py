@@ -0,0 +1,144 @@
+# === Script de test - Lecture des fichiers d'échange locale ou MinIO (storage_backend.py) ===
+# Ce script remplace le client S3 par un bucket en mémoire et vérifie que :
+# - en mode local, les étapes lisent les fichiers du disque, comme auparavant,
+# - en mode s3, DuckDB reçoit une URL s3:// et le secret httpfs pointe sur MinIO,
+# - le cache en lecture ne télécharge un objet qu'une fois par ETag, remplace la copie
+#   quand l'objet change, et fournit au cache des étapes l'ETag comme empreinte,
+# - seul un objet absent (HEAD ➝ 404) est traité comme tel : une autre erreur S3
+#   (droits, MinIO indisponible) remonte au lieu de passer pour un fichier manquant.
+
+import os
+import sys
+import hashlib
+import tempfile
+from pathlib import Path
+import duckdb
+from botocore.exceptions import ClientError
+from loguru import logger
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_storage_backend.log"
+
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+import storage_backend  # noqa: E402
+import stage_cache  # noqa: E402
+from data_formats import source_reader  # noqa: E402
+from storage_backend import (  # noqa: E402
+    cached_object, httpfs_secret_sql, s3_url, source_etag, source_exists, source_path,
+)
+
+KEY = "data/inputs/erp.csv"
+
+
+class MemoryBucket:
+    """Client S3 minimal : head_object et download_file sur des objets en mémoire."""
+
+    def __init__(self):
+        self.objects = {}
+        self.downloads = 0
+        self.error_code = None
+
+    def put(self, key: str, body: bytes):
+        self.objects[key] = body
+
+    def head_object(self, Bucket, Key):
+        if self.error_code:
+            raise ClientError({"Error": {"Code": self.error_code}}, "HeadObject")
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        body = self.objects[Key]
+        return {"ETag": f'"{hashlib.md5(body).hexdigest()}"', "ContentLength": len(body)}
+
+    def download_file(self, bucket, key, path, ExtraArgs=None, Config=None):
+        body = self.objects[key]
+        if ExtraArgs and ExtraArgs.get("IfMatch") != hashlib.md5(body).hexdigest():
+            raise RuntimeError("PreconditionFailed")
+        self.downloads += 1
+        Path(path).write_bytes(body)
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        local_file = tmp / "erp.csv"
+        local_file.write_text("product_id,price\n1,10.5\n2,20.0\n")
+        bucket = MemoryBucket()
+        bucket.put(KEY, local_file.read_bytes())
+
+        try:
+            # 1️⃣ Mode local : chemin du disque, comme avant
+            assert storage_backend.STORAGE_BACKEND == "local"
+            assert source_path(KEY, local_file) == str(local_file)
+            logger.success("✅ Mode local : lecture du disque inchangée")
+
+            # 2️⃣ Mode s3 : URL lue par httpfs, secret construit depuis MINIO_*
+            storage_backend.STORAGE_BACKEND = "s3"
+            assert source_path(KEY, local_file) == f"s3://{storage_backend.BUCKET_NAME}/{KEY}"
+            secret = httpfs_secret_sql()
+            assert "TYPE S3" in secret and "URL_STYLE 'path'" in secret
+            assert f"ENDPOINT '{storage_backend.MINIO_ENDPOINT.split('://')[-1]}'" in secret
+            logger.success(f"✅ Mode s3 : DuckDB lit {s3_url(KEY)} (secret httpfs vers MinIO)")
+
+            # 3️⃣ Cache en lecture : un téléchargement par ETag
+            cache_dir = tmp / "cache"
+            first = cached_object(KEY, cache_dir=cache_dir, client=bucket)
+            again = cached_object(KEY, cache_dir=cache_dir, client=bucket)
+            assert first == again and bucket.downloads == 1
+            con = duckdb.connect()
+            assert con.execute(f"SELECT SUM(price) FROM {source_reader(str(first))}").fetchone()[0] == 30.5
+
+            bucket.put(KEY, b"product_id,price\n1,10.5\n")
+            changed = cached_object(KEY, cache_dir=cache_dir, client=bucket)
+            assert changed != first and bucket.downloads == 2
+            assert [p.name for p in changed.parent.iterdir()] == [changed.name]
+            assert con.execute(f"SELECT COUNT(*) FROM {source_reader(str(changed))}").fetchone()[0] == 1
+            logger.success("✅ Cache en lecture : téléchargé une fois par ETag, ancienne copie supprimée")
+
+            # 4️⃣ Cache des étapes : l'ETag sert d'empreinte aux fichiers lus dans MinIO
+            storage_backend.get_s3_client = lambda: bucket
+            files = stage_cache.exchange_files("data/inputs/", tmp, ["erp.csv"])
+            assert files == [s3_url(KEY)]
+            digest = stage_cache._file_digest(files[0])
+            bucket.put(KEY, b"product_id,price\n3,1.0\n")
+            assert digest.startswith("etag:") and stage_cache._file_digest(files[0]) != digest
+            assert stage_cache._file_digest(s3_url("data/inputs/absent.csv")) is None
+            logger.success("✅ Empreinte des fichiers MinIO par ETag, sans téléchargement")
+
+            # 5️⃣ Objet absent (404) : False / None ; autre erreur S3 : remontée telle quelle
+            assert source_exists(KEY, tmp / "absent.csv") is True
+            assert source_exists("data/inputs/absent.csv", local_file) is False
+            assert source_etag("data/inputs/absent.csv") is None
+            bucket.error_code = "AccessDenied"
+            for check in (lambda: source_exists(KEY, local_file), lambda: source_etag(KEY)):
+                try:
+                    check()
+                    raise AssertionError("erreur S3 masquée en objet absent")
+                except ClientError as e:
+                    assert e.response["Error"]["Code"] == "AccessDenied"
+            bucket.error_code = None
+            logger.success("✅ Objet absent distingué des erreurs d'accès à MinIO")
+
+            logger.success("🎯 Backend de stockage validé avec succès.")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du test du backend de stockage : {e}")
+            sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# === Script de test - Export réparti en une passe (table_export.export_partitioned) ===
+# Ce script exporte une table de plusieurs millions de lignes en deux CSV (un par type)
+# et vérifie que :
+# - chaque CSV contient exactement les lignes de son type, triées par product_id,
+#   même quand DuckDB écrit une partition en plusieurs fichiers (data_0 … data_10 …),
+# - le moteur arrow produit les mêmes lignes dans le même ordre,
+# - un type sans ligne donne un fichier réduit à l'en-tête.
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+import duckdb
+from loguru import logger
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_table_export.log"
+
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from table_export import _part_number, export_partitioned  # noqa: E402
+
+NB_ROWS = 3_000_000
+
+
+def read_ids(con, path: Path) -> list:
+    return [row[0] for row in con.execute(
+        f"SELECT product_id FROM read_csv('{path}', header = true, columns = {{'product_id': 'BIGINT', "
+        f"'post_title': 'VARCHAR', 'price': 'DOUBLE', 'type': 'VARCHAR'}})"
+    ).fetchall()]
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        con = duckdb.connect()
+        # Plusieurs threads et (DuckDB ≥ 1.1) un seul fichier ouvert à la fois :
+        # chaque partition est écrite en plusieurs fichiers, dans le désordre sans correctif
+        con.execute("SET threads = 8")
+        try:
+            con.execute("SET partitioned_write_max_open_files = 1")
+        except duckdb.Error:
+            pass
+        # Table stockée dans un ordre différent de product_id
+        con.execute(f"""
+            CREATE TABLE zscore_vins AS
+            SELECT (range * 7919) % {NB_ROWS} AS product_id, 'vin ' || range AS post_title,
+                   range / 100.0 AS price,
+                   CASE WHEN range % 2 = 0 THEN 'millésimé' ELSE 'ordinaire' END AS type
+            FROM range({NB_ROWS})
+        """)
+
+        try:
+            # 🔢 Fichiers de partition triés par numéro, pas par nom
+            names = [Path(f"data_{i}.csv") for i in (10, 2, 0, 1)]
+            assert [p.name for p in sorted(names, key=_part_number)] == ["data_0.csv", "data_1.csv", "data_2.csv", "data_10.csv"]
+
+            results = {}
+            for engine in ("copy", "arrow"):
+                paths = {"millésimé": tmp / f"{engine}_millesimes.csv", "ordinaire": tmp / f"{engine}_ordinaires.csv"}
+                export_partitioned(con, "SELECT * FROM zscore_vins", "type", paths, order_by="product_id", engine=engine)
+                results[engine] = {value: read_ids(con, path) for value, path in paths.items()}
+
+                # 1️⃣ Lignes du bon type, triées par product_id
+                for value, ids in results[engine].items():
+                    expected = [row[0] for row in con.execute(
+                        "SELECT product_id FROM zscore_vins WHERE type = ? ORDER BY product_id", [value]
+                    ).fetchall()]
+                    assert ids == expected, f"{engine}/{value} : ordre ou contenu différent"
+                logger.success(f"✅ Moteur {engine} : {NB_ROWS} lignes réparties et triées par product_id")
+                assert con.execute("SELECT current_setting('threads')").fetchone()[0] == 8
+
+            # 2️⃣ Les deux moteurs produisent les mêmes lignes dans le même ordre
+            assert results["copy"] == results["arrow"]
+            logger.success("✅ Moteurs copy et arrow identiques")
+
+            # 3️⃣ Type absent : fichier réduit à l'en-tête
+            empty = tmp / "vide.csv"
+            export_partitioned(con, "SELECT * FROM zscore_vins WHERE type = 'ordinaire'", "type",
+                               {"millésimé": empty}, order_by="product_id", engine="copy")
+            assert empty.read_text(encoding="utf-8").strip() == "product_id,post_title,price,type"
+            logger.success("✅ Type sans ligne : en-tête seul")
+
+            logger.success("🎯 Export réparti validé avec succès.")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du test de l'export réparti : {e}")
+            sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# === Script de test - Moteur de validation (validation_engine.py) ===
+# Ce script construit des tables volontairement défectueuses (NULL, doublons, montants
+# négatifs, NaN / infini, colonne absente) et vérifie que :
+# - les contrôles déclarés dans checks/*.json se chargent et se compilent,
+# - chaque valeur calculée est identique à la requête historique équivalente des tests
+#   (les scripts test_05/08/09/11/12 que lançait le DAG, remplacés par checks/*.json),
+# - chaque table n'est parcourue qu'une fois, quel que soit le nombre de contrôles,
+# - en mode approché, échecs évidents et succès sont estimés, les cas proches du seuil escaladés.
+
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+import duckdb
+from loguru import logger
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_validation_engine.log"
+
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+from validation_engine import (  # noqa: E402
+    APPROX, VALIDATION_STAGES, compile_checks, hll_estimate, hll_precision, hll_registers_sql, load_checks, validate,
+)
+
+# Requêtes historiques des tests (une par contrôle), pour comparaison
+SPEC = {
+    "not_null": ["product_id", "price"],
+    "finite": ["price"],
+    "unique": [["product_id"], ["product_id", "sku"]],
+    "ranges": {"chiffre_affaires": {"min": 0}},
+    "expressions": [{"name": "ca", "sql": "ROUND(SUM(chiffre_affaires), 2)", "min": 0}],
+    "non_empty": True,
+    "columns": ["product_id", "colonne_absente"],
+}
+LEGACY = {
+    ("not_null", "product_id"): "SELECT COUNT(*) FROM produits WHERE product_id IS NULL",
+    ("not_null", "price"): "SELECT COUNT(*) FROM produits WHERE price IS NULL",
+    ("finite", "price"): "SELECT COUNT(*) FROM produits WHERE isnan(price) OR isinf(price)",
+    ("unique", "product_id"): "SELECT COUNT(*) - COUNT(DISTINCT product_id) FROM produits",
+    ("unique", "product_id, sku"): "SELECT COUNT(*) - (SELECT COUNT(*) FROM (SELECT DISTINCT product_id, sku FROM produits)) FROM produits",
+    ("ranges", "chiffre_affaires"): "SELECT COUNT(*) FROM produits WHERE chiffre_affaires < 0",
+    ("expressions", "ca"): "SELECT ROUND(SUM(chiffre_affaires), 2) FROM produits",
+    ("non_empty", "produits"): "SELECT COUNT(*) FROM produits",
+}
+
+# Mode approché réduit à l'échelle du test (300 000 lignes)
+APPROX_TEST = {**APPROX, "min_rows": 100_000, "sample_tolerance": 1e-3, "distinct_tolerance": 0.01, "hll_error": 0.003}
+APPROX_SPEC = {
+    "non_empty": True,
+    "not_null": ["montant", "remise"],
+    "unique": [["id"], ["groupe"], ["presque"]],
+    "expressions": [{"name": "total", "sql": "SUM(montant)", "min": 0}],
+}
+
+
+def count_scans(plan: str) -> int:
+    return len(re.findall(r"\b(?:SEQ_SCAN|TABLE_SCAN)\b", plan))
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    try:
+        for stage in VALIDATION_STAGES:
+            checks = load_checks(stage)
+            for table, spec in checks["tables"].items():
+                compile_checks(spec, table)
+        logger.success(f"✅ Contrôles déclarés chargés et compilés : {', '.join(VALIDATION_STAGES)}")
+    except Exception as e:
+        logger.error(f"❌ Chargement des contrôles échoué : {e}")
+        sys.exit(1)
+
+    try:
+        con = duckdb.connect()
+        con.execute("""
+            CREATE TABLE produits AS
+            SELECT
+                CASE WHEN i % 97 = 0 THEN NULL ELSE i % 900 END                    AS product_id,
+                'sku_' || (i % 450)                                                AS sku,
+                CASE WHEN i % 53 = 0 THEN NULL WHEN i % 89 = 0 THEN 'nan'::DOUBLE
+                     WHEN i % 131 = 0 THEN 'inf'::DOUBLE ELSE i / 10 END            AS price,
+                CASE WHEN i % 61 = 0 THEN -1.5 ELSE i * 2.5 END                    AS chiffre_affaires
+            FROM range(1000) t(i)
+        """)
+
+        report = validate(con, {"stage": "test", "tables": {"produits": SPEC}}, Path(tempfile.gettempdir()))
+        results = {(r["check"], r["cible"]): r for r in report["resultats"]}
+
+        for key, sql in LEGACY.items():
+            expected = con.execute(sql).fetchone()[0]
+            value = results[key]["valeur"]
+            assert value == expected, f"❌ {key} : {value} (référence : {expected})"
+        assert results[("columns", "product_id")]["ok"] and not results[("columns", "colonne_absente")]["ok"]
+        assert report["echecs"] == 7, f"❌ {report['echecs']} échec(s) (attendu : 7)"
+        logger.success(f"✅ {report['controles']} contrôles identiques aux requêtes historiques, {report['echecs']} échecs détectés")
+
+        # 🔎 Un seul parcours de la table pour tous les contrôles
+        sql, checks = compile_checks(SPEC, "produits")
+        plan = "\n".join(row[1] for row in con.execute(f"EXPLAIN {sql}").fetchall())
+        assert count_scans(plan) == 1, f"❌ {count_scans(plan)} parcours dans le plan"
+        logger.success(f"✅ {len(checks) + 1} agrégats en un seul parcours de la table")
+
+        # 🚫 Table absente : échec signalé sans interrompre les autres tables
+        report = validate(con, {"stage": "test", "tables": {"absente": {"non_empty": True}, "produits": {"non_empty": True}}}, Path("."))
+        assert [r["ok"] for r in report["resultats"]] == [False, True], report["resultats"]
+        logger.success("✅ Table absente signalée, tables suivantes validées")
+
+        # 🎲 Mode approché : HyperLogLog, échantillon, escalade près du seuil
+        con.execute("""
+            CREATE TABLE ventes AS
+            SELECT
+                i                                              AS id,        -- unique
+                i % 200000                                     AS groupe,    -- 33 % de doublons
+                CASE WHEN i < 1500 THEN 0 ELSE i END           AS presque,   -- 0,5 % : proche du seuil
+                i * 1.5                                        AS montant,   -- sans NULL
+                CASE WHEN i % 100 = 0 THEN NULL ELSE 0.1 END   AS remise     -- 1 % de NULL
+            FROM range(300000) t(i)
+        """)
+        precision = hll_precision(APPROX_TEST["hll_error"])
+        ranks = [rank for _, rank in con.execute(hll_registers_sql("ventes", ["id"], precision)).fetchall()]
+        estimate = hll_estimate(ranks, precision)
+        assert abs(estimate - 300000) / 300000 < 0.01, f"❌ Estimation HyperLogLog : {estimate:.0f}"
+
+        report = validate(con, {"stage": "test", "tables": {"ventes": APPROX_SPEC}}, Path("."), APPROX_TEST)
+        results = {(r["check"], r["cible"]): r for r in report["resultats"]}
+        modes = {key: (r["mode"], r["ok"]) for key, r in results.items()}
+        assert modes == {
+            ("non_empty", "ventes"): ("exact", True),
+            ("expressions", "total"): ("exact", True),
+            ("not_null", "montant"): ("echantillon", True),
+            ("not_null", "remise"): ("echantillon", False),
+            ("unique", "id"): ("hll", True),
+            ("unique", "groupe"): ("hll", False),
+            ("unique", "presque"): ("escalade", False),
+        }, modes
+        assert results[("unique", "presque")]["valeur"] == 1499
+        assert results[("not_null", "montant")]["borne"] <= APPROX_TEST["sample_tolerance"]
+        assert report["confiance"] == APPROX_TEST["confidence"] and report["escalades"] == 1
+        logger.success(f"✅ Mode approché : {report['controles']} contrôles, 1 escalade, confiance {report['confiance']:.0%}")
+
+        # ⬆️ Échantillon insuffisant pour la tolérance demandée : escalade exacte
+        strict = {**APPROX_TEST, "sample_tolerance": 1e-7, "sample_method": "reservoir"}
+        report = validate(con, {"stage": "test", "tables": {"ventes": {"not_null": ["montant"]}}}, Path("."), strict)
+        assert [(r["mode"], r["ok"], r["valeur"]) for r in report["resultats"]] == [("escalade", True, 0)], report["resultats"]
+
+        # 📏 Table sous le seuil de volume : contrôles exacts
+        report = validate(con, {"stage": "test", "tables": {"produits": SPEC}}, Path("."), APPROX_TEST)
+        assert report["echecs"] == 7 and {r["mode"] for r in report["resultats"]} == {"exact"}
+        logger.success("✅ Escalade si l'échantillon ne suffit pas, exact sous le seuil de volume")
+
+        logger.success("🎯 Moteur de validation validé avec succès.")
+    except Exception as e:
+        logger.error(f"❌ Erreur lors du test du moteur de validation : {e}")
+        sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# === Script de test - Export XLSX en flux et génération à la demande (xlsx_export.py) ===
+# Ce script écrit une petite table DuckDB en XLSX puis la relit avec openpyxl et vérifie que :
+# - l'export par lots Arrow (openpyxl write_only) restitue l'en-tête en gras et toutes les
+#   valeurs (entiers, décimaux, textes accentués, NULL, booléens, dates), lot après lot,
+# - une feuille au-delà de la limite Excel est refusée sans laisser de fichier, ni le
+#   fichier temporaire d'openpyxl, ni d'erreur au ramassage du classeur abandonné,
+# - la génération à la demande (EXCEL_EXPORT=lazy, python xlsx_export.py [artefact…])
+#   produit les artefacts demandés depuis la base et les transmet à l'upload MinIO.
+
+import gc
+import os
+import sys
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+import duckdb
+from openpyxl import load_workbook
+from openpyxl.worksheet._writer import ALL_TEMP_FILES
+from loguru import logger
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_xlsx_export.log"
+
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+
+import minio_storage  # noqa: E402
+import xlsx_export  # noqa: E402
+from xlsx_export import export_query_xlsx, export_table_xlsx  # noqa: E402
+
+NB_ROWS = 40
+COLUMNS = ["product_id", "ca", "libelle", "en_vente", "post_date", "maj"]
+
+# Table synthétique : une valeur NULL par colonne toutes les 9 lignes (décalées)
+TABLE_SQL = f"""
+    SELECT
+        CASE WHEN i % 9 = 1 THEN NULL ELSE i END                            AS product_id,
+        CASE WHEN i % 9 = 2 THEN NULL ELSE i * 12.5 END                     AS ca,
+        CASE WHEN i % 9 = 3 THEN NULL ELSE 'Thé vert n°' || i END           AS libelle,
+        CASE WHEN i % 9 = 4 THEN NULL ELSE i % 2 = 0 END                    AS en_vente,
+        CASE WHEN i % 9 = 5 THEN NULL ELSE DATE '2023-06-01' + i::INTEGER END AS post_date,
+        TIMESTAMP '2023-06-01 08:30:00' + INTERVAL (i) HOUR                 AS maj
+    FROM range({NB_ROWS}) t(i)
+"""
+
+
+def expected_row(i: int) -> tuple:
+    return (
+        None if i % 9 == 1 else i,
+        None if i % 9 == 2 else i * 12.5,
+        None if i % 9 == 3 else f"Thé vert n°{i}",
+        None if i % 9 == 4 else i % 2 == 0,
+        None if i % 9 == 5 else datetime(2023, 6, 1) + timedelta(days=i),
+        datetime(2023, 6, 1, 8, 30) + timedelta(hours=i),
+    )
+
+
+def read_xlsx(path: Path, sheet_name: str = "Sheet1") -> tuple:
+    """Relit le classeur : (en-tête, en-tête en gras ?, lignes de valeurs)."""
+    sheet = load_workbook(path)[sheet_name]
+    rows = list(sheet.iter_rows(values_only=True))
+    bold = all(cell.font.bold for cell in sheet[1])
+    return list(rows[0]), bold, rows[1:]
+
+# ==============================================================================
+# 🧪 Fonction principale
+# ==============================================================================
+def main():
+    previous = (xlsx_export.XLSX_BATCH_ROWS, xlsx_export.XLSX_MAX_ROWS, xlsx_export.DUCKDB_PATH,
+                xlsx_export.OUTPUTS_PATH, minio_storage.upload_many)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        try:
+            db_path = tmp / "bottleneck.duckdb"
+            con = duckdb.connect(str(db_path))
+            con.execute(f"CREATE TABLE export_test AS {TABLE_SQL}")
+
+            # 1️⃣ Aller-retour openpyxl : en-tête en gras et valeurs identiques, sur plusieurs lots
+            xlsx_export.XLSX_BATCH_ROWS = 7
+            nb_batches = -(-NB_ROWS // xlsx_export.XLSX_BATCH_ROWS)
+            path = tmp / "export_test.xlsx"
+            assert export_query_xlsx(con, "SELECT * FROM export_test ORDER BY maj", path,
+                                     sheet_name="CA") == NB_ROWS
+            header, bold, rows = read_xlsx(path, "CA")
+            expected = [expected_row(i) for i in range(NB_ROWS)]
+            assert header == COLUMNS and bold, header
+            assert rows == expected, [(r, e) for r, e in zip(rows, expected) if r != e][:3]
+            assert not list(tmp.glob(".*.tmp"))
+            logger.success(f"✅ Aller-retour XLSX : {NB_ROWS} lignes en {nb_batches} lots Arrow, valeurs et en-tête identiques")
+
+            # Table vide : en-tête seul
+            assert export_table_xlsx(con, "(SELECT * FROM export_test WHERE FALSE)", tmp / "vide.xlsx") == 0
+            header, _, rows = read_xlsx(tmp / "vide.xlsx")
+            assert header == COLUMNS and rows == []
+            logger.success("✅ Table vide : en-tête seul")
+
+            # 2️⃣ Limite d'une feuille Excel : refus, ni fichier ni temporaire laissés
+            xlsx_export.XLSX_MAX_ROWS = NB_ROWS
+            unraisable, hook = [], sys.unraisablehook
+            sys.unraisablehook = unraisable.append
+            nb_temp_files = len(ALL_TEMP_FILES)
+            try:
+                export_table_xlsx(con, "export_test", tmp / "trop_grand.xlsx")
+                raise AssertionError("limite de feuille non détectée")
+            except ValueError as e:
+                assert "limite" in str(e)
+            finally:
+                gc.collect()
+                sys.unraisablehook = hook
+            assert not (tmp / "trop_grand.xlsx").exists() and not list(tmp.glob(".*.tmp"))
+            assert len(ALL_TEMP_FILES) > nb_temp_files
+            assert not any(os.path.exists(f) for f in ALL_TEMP_FILES[nb_temp_files:])
+            assert not unraisable, [u.exc_value for u in unraisable]
+            xlsx_export.XLSX_MAX_ROWS = previous[1]
+            logger.success("✅ Limite de feuille Excel : export refusé sans fichier partiel")
+
+            # 3️⃣ Génération à la demande : artefacts lus dans la base, puis uploadés
+            con.execute("CREATE TABLE ca_par_produit AS SELECT product_id, ca FROM export_test WHERE product_id IS NOT NULL")
+            con.execute("CREATE TABLE rapport_final AS SELECT 'ca_total' AS indicateur, SUM(ca) AS valeur FROM export_test")
+            con.close()
+
+            uploads = []
+            minio_storage.upload_many = lambda files, **kwargs: uploads.append(files) or files
+            xlsx_export.DUCKDB_PATH = db_path
+            xlsx_export.OUTPUTS_PATH = tmp / "outputs"
+            prefix = xlsx_export.DESTINATION_PREFIX
+
+            xlsx_export.main(["rapport_final.xlsx"])
+            assert [p.name for p in xlsx_export.OUTPUTS_PATH.iterdir()] == ["rapport_final.xlsx"]
+            assert uploads == [[(xlsx_export.OUTPUTS_PATH / "rapport_final.xlsx", f"{prefix}rapport_final.xlsx")]]
+            header, _, rows = read_xlsx(xlsx_export.OUTPUTS_PATH / "rapport_final.xlsx")
+            assert header == ["indicateur", "valeur"]
+            assert rows == [("ca_total", sum(r[1] for r in expected if r[1] is not None))], rows
+
+            uploads.clear()
+            xlsx_export.main([])
+            assert sorted(key for _, key in uploads[0]) == sorted(f"{prefix}{name}" for name in xlsx_export.EXCEL_ARTIFACTS)
+            header, _, rows = read_xlsx(xlsx_export.OUTPUTS_PATH / "ca_par_produit.xlsx")
+            assert header == ["product_id", "ca"] and len(rows) == NB_ROWS - len(range(1, NB_ROWS, 9))
+            logger.success("✅ Génération à la demande : artefacts demandés produits puis uploadés")
+
+            # Artefact inconnu : refusé par la ligne de commande, avant toute connexion
+            result = subprocess.run(
+                [sys.executable, str(SCRIPTS_PATH / "xlsx_export.py"), "inconnu.xlsx"],
+                env={**os.environ, "EXCEL_EXPORT": "lazy"}, capture_output=True, text=True, timeout=60,
+            )
+            assert result.returncode == 1 and "inconnu.xlsx" in result.stderr + result.stdout, result
+            logger.success("✅ Ligne de commande : artefact inconnu refusé")
+
+            logger.success("🎯 Export XLSX validé avec succès.")
+        except (Exception, SystemExit) as e:
+            logger.error(f"❌ Erreur lors du test de l'export XLSX : {e!r}")
+            sys.exit(1)
+        finally:
+            (xlsx_export.XLSX_BATCH_ROWS, xlsx_export.XLSX_MAX_ROWS, xlsx_export.DUCKDB_PATH,
+             xlsx_export.OUTPUTS_PATH, minio_storage.upload_many) = previous
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()